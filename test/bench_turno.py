@@ -0,0 +1,159 @@
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import threading
+import time
+
+from cache_respuestas import CacheRespuestas
+from fakes import ConexionRobotLocal, ModeloGeminiFalso, RobotFalso, TTSFalso
+from gemini_pool import PoolGemini
+from servidor_audio import AlmacenAudio, ServidorAudioHTTP
+from supervisor_conexion import SupervisorConexion
+from trazas import Trazador, informe, imprimir_informe, percentil
+from tts_cache import CacheTTS
+
+# Banco de pruebas de un turno de chat completo sin robot, sin clave de Gemini y sin
+# internet: se ejecutan las funciones de turno de servlocal.py tal cual, con Gemini,
+# gTTS y el robot sustituidos por los de fakes.py, y el audio viaja de verdad por
+# ServidorAudioHTTP en 127.0.0.1.
+
+FRASES = ("Hola, soy Alpha Mini.", "Puedo bailar, hablar y reconocer caras.",
+          "También puedo medir distancias con mi sensor de infrarrojos.",
+          "¿Quieres que te enseñe alguno de mis movimientos?")
+
+
+def respuesta_turno(mensaje: str) -> str:
+    """
+    Respuesta del Gemini falso: las frases llevan el número de pregunta para que la
+    caché TTS no se salte la síntesis en los turnos siguientes
+    """
+    numero = mensaje.split(":")[0]
+    return " ".join(f"{frase[:-1]}, {numero}{frase[-1]}" for frase in FRASES)
+
+
+class BancoTurno:
+    """
+    Monta los sustitutos, el servidor de audio y el supervisor y los pone en servlocal
+
+    Dentro de "async with" las variables globales de servlocal (pool de Gemini, cachés,
+    almacén y servidor de audio, supervisor) apuntan a los sustitutos, así que los turnos
+    pasan por GenerarReproducirSecuencial y GenerarReproducirStreaming de verdad.
+    """
+
+    def __init__(self, latencia_gemini: float = 0.3, latencia_fragmento: float = 0.02,
+                 latencia_tts: float = 0.1, latencia_tts_caracter: float = 0.0005,
+                 tamano_audio: int = 24 * 1024, factor_reproduccion: float = 0.05,
+                 ruta_trazas: str = None):
+        self.modelo = ModeloGeminiFalso(latencia=latencia_gemini, latencia_fragmento=latencia_fragmento,
+                                        respuesta=respuesta_turno)
+        self.pool = PoolGemini(fabrica_modelo=lambda nombre_modelo: self.modelo)
+        self.tts = TTSFalso(tamano_audio, latencia_tts, latencia_tts_caracter)
+        self.robot = RobotFalso(factor_reproduccion=factor_reproduccion)
+        self.almacen = AlmacenAudio()
+        directorio = tempfile.mkdtemp(prefix="bench_turno_")
+        self.cache_tts = CacheTTS(os.path.join(directorio, "tts"), sintetizar=self.tts)
+        self.cache_respuestas = CacheRespuestas()
+        self.ruta_trazas = ruta_trazas or os.path.join(directorio, "trazas.jsonl")
+        self.trazador = Trazador(self.ruta_trazas)
+        self.supervisor = SupervisorConexion(ConexionRobotLocal(self.robot))
+        self.servidor = None
+        self._originales = {}
+
+    async def __aenter__(self):
+        import servlocal
+        self.servidor = ServidorAudioHTTP(("127.0.0.1", 0), self.almacen)
+        threading.Thread(target=self.servidor.serve_forever, daemon=True).start()
+        self.pool.calentar()
+        await self.supervisor.iniciar()
+        sustitutos = {
+            "obtener_pool": lambda: self.pool,
+            "obtener_cache": lambda: self.cache_tts,
+            "obtener_cache_respuestas": lambda: self.cache_respuestas,
+            "almacen_audio": self.almacen,
+            "http_server": self.servidor,
+            "local_ip": "127.0.0.1",
+            "SERVER_PORT": self.servidor.server_address[1],
+            "supervisor": self.supervisor,
+            "interrupcion": None,
+        }
+        for nombre, valor in sustitutos.items():
+            self._originales[nombre] = getattr(servlocal, nombre)
+            setattr(servlocal, nombre, valor)
+        return self
+
+    async def __aexit__(self, *exc):
+        import servlocal
+        for nombre, valor in self._originales.items():
+            setattr(servlocal, nombre, valor)
+        await self.supervisor.detener()
+        self.servidor.shutdown()
+        self.servidor.server_close()
+
+    async def ejecutar_turnos(self, modo: str, turnos: int) -> float:
+        """
+        Ejecuta los turnos de un modo ("secuencial" o "streaming") y devuelve turnos/s
+        """
+        import servlocal
+        turno_modo = servlocal.GenerarReproducirStreaming if modo == "streaming" \
+            else servlocal.GenerarReproducirSecuencial
+        inicio = time.perf_counter()
+        for i in range(turnos):
+            with self.trazador.turno(f"bench_{modo}", turno=i) as turno:
+                await turno_modo(f"Pregunta {modo} {i}: ¿qué sabes hacer?", turno)
+        return turnos / (time.perf_counter() - inicio)
+
+
+async def _benchmark(turnos: int, modos: list, **opciones) -> dict:
+    resultados = {}
+    async with BancoTurno(**opciones) as banco:
+        for modo in modos:
+            resultados[modo] = {"turnos_s": await banco.ejecutar_turnos(modo, turnos)}
+        reproducidos = len(banco.robot.reproducidos)
+    datos = informe(banco.ruta_trazas)
+    for modo in modos:
+        etapas = datos[f"bench_{modo}"]
+        resultados[modo].update({etapa: {p: percentil(d, p) for p in (50, 95, 99)} for etapa, d in etapas.items()})
+    for modo in modos:
+        print(f"{modo}: {resultados[modo]['turnos_s']:.2f} turnos/s")
+    print(f"Audios reproducidos por el robot: {reproducidos}, síntesis: {banco.tts.llamadas}")
+    imprimir_informe(banco.ruta_trazas)
+    return resultados
+
+
+def benchmark(turnos: int = 20, modos=("secuencial", "streaming"), **opciones) -> dict:
+    """
+    Turnos por segundo y percentiles por etapa para cada modo, a partir de las trazas
+
+    Devuelve {modo: {"turnos_s": ..., etapa: {50: s, 95: s, 99: s}}}.
+    """
+    return asyncio.run(_benchmark(turnos, list(modos), **opciones))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de un turno de chat completo con sustitutos locales")
+    parser.add_argument("--turnos", type=int, default=20)
+    parser.add_argument("--modo", choices=["secuencial", "streaming", "ambos"], default="ambos")
+    parser.add_argument("--latencia-gemini", type=float, default=0.3)
+    parser.add_argument("--latencia-tts", type=float, default=0.1)
+    parser.add_argument("--tamano-audio", type=int, default=24 * 1024)
+    parser.add_argument("--trazas", help="archivo JSONL donde guardar las trazas (por defecto uno temporal)")
+    parser.add_argument("--limite-p95-ms", type=float,
+                        help="termina con error si el p95 del turno de algún modo supera este valor")
+    args = parser.parse_args()
+
+    modos = ["secuencial", "streaming"] if args.modo == "ambos" else [args.modo]
+    resultados = benchmark(args.turnos, modos, latencia_gemini=args.latencia_gemini, latencia_tts=args.latencia_tts,
+                           tamano_audio=args.tamano_audio, ruta_trazas=args.trazas)
+
+    if args.limite_p95_ms is not None:
+        for modo in modos:
+            p95 = resultados[modo]["turno"][95] * 1000
+            if p95 > args.limite_p95_ms:
+                print(f"Regresión: p95 del turno {modo} = {p95:.1f} ms > {args.limite_p95_ms:.1f} ms")
+                sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -2,14 +2,18 @@ import asyncio
 import os
 import threading
 import time
-import uuid
-from http.server import SimpleHTTPRequestHandler, HTTPServer
-from gtts import gTTS
 import google.generativeai as genai
 import mini.mini_sdk as MiniSdk
 from mini.apis.api_sound import PlayAudio
 from mini import AudioStorageType, MiniApiResultType
 from dotenv import load_dotenv
+from gemini_pool import obtener_pool
+from cache_respuestas import obtener_cache_respuestas
+from ejecutor_async import ejecutar, leer_entrada, MonitorLag, TIMEOUT_GEMINI, TIMEOUT_TTS
+from tts_cache import obtener_cache
+from cache_dispositivos import obtener_cache_dispositivos
+from servidor_audio import AlmacenAudio, ServidorAudioHTTP, url_audio
+from trazas import Trazador, TURNO_NULO
 import subprocess
 import platform
 
@@ -28,16 +32,10 @@ http_server = None
 local_ip = None
 bluetooth_device = None
 USAR_BLUETOOTH = False  # Usar Bluetooth (True) o el robot (False)
-
-
-# Handler clase HTTP
-class AudioHandler(SimpleHTTPRequestHandler):
-    def __init__(self, *args, **kwargs):
-        super().__init__(*args, directory=os.getcwd(), **kwargs)
-
-    def log_message(self, format, *args):
-        # Silenciar mensajes de log del servidor
-        pass
+# Audios servidos al robot desde memoria (no se expone ningún directorio)
+almacen_audio = AlmacenAudio()
+# Tiempos de cada etapa por turno (python trazas.py para ver los percentiles)
+trazador = Trazador()
 
 
 def ObtenerRespuestaChatbot(mensaje: str) -> str:
@@ -45,17 +43,9 @@ def ObtenerRespuestaChatbot(mensaje: str) -> str:
     Obtiene una respuesta del chatbot
     """
     try:
-        # Configurar el modelo
-        model = genai.GenerativeModel('gemini-2.0-flash')
-
-        # Crear el chat
-        chat = model.start_chat(history=[])
-
-        # Obtener respuesta
-        response = chat.send_message(mensaje)
-
-        # Extraer texto de la respuesta
-        return response.text
+        # Las preguntas repetidas se responden desde la caché sin llamar a Gemini
+        return obtener_cache_respuestas().obtener_o_calcular(
+            mensaje, lambda: obtener_pool().enviar(mensaje).text)
 
     except Exception as e:
         print(f"Error al comunicarse con Gemini: {e}")
@@ -86,7 +76,8 @@ def StartHTTPServer():
     global http_server, server_thread
 
     try:
-        http_server = HTTPServer((SERVER_HOST, SERVER_PORT), AudioHandler)
+        # Un hilo por conexión, HTTP/1.1 persistente, Range y ETag
+        http_server = ServidorAudioHTTP((SERVER_HOST, SERVER_PORT), almacen_audio)
         server_thread = threading.Thread(target=http_server.serve_forever)
         server_thread.daemon = True
         server_thread.start()
@@ -280,67 +271,67 @@ def ReproducirAudioBluetooth(audio_path):
         return False
 
 
-async def GenerarReproducirTTS(texto: str):
+async def GenerarReproducirTTS(texto: str, turno=TURNO_NULO):
     """
     Genera un archivo de audio TTS y lo reproduce en el robot o por Bluetooth.
     """
     try:
-        # Generar un nombre único para el archivo
-        unique_id = str(uuid.uuid4())[:8]
-        timestamp = int(time.time())
-        audio_filename = f"respuesta_{unique_id}_{timestamp}.mp3"
-
-        # Convertir texto a audio
-        tts = gTTS(text=texto, lang='es')
-        tts.save(audio_filename)
-
-        # Verificar si el archivo existe
-        if not os.path.exists(audio_filename):
-            raise FileNotFoundError(f"El archivo no fue generado en la ruta: {audio_filename}")
-        print(f"Archivo de audio generado exitosamente: {audio_filename}")
+        # Convertir texto a audio (si ya estaba en caché no se vuelve a sintetizar)
+        cache = obtener_cache()
+        with turno.etapa("tts"):
+            clave, audio = await ejecutar(cache.obtener_o_sintetizar, texto, timeout=TIMEOUT_TTS)
+        print(f"Audio generado exitosamente: {clave}")
 
         # Reproducir según la configuración
         if USAR_BLUETOOTH:
+            # El reproductor local necesita un archivo: se usa el de la caché en disco
+            audio_filename = cache.ruta(clave)
+            if not os.path.exists(audio_filename):
+                raise FileNotFoundError(f"El archivo no fue generado en la ruta: {audio_filename}")
+
             # Reproducir por Bluetooth
             print("Reproduciendo audio por Bluetooth...")
-            success = ReproducirAudioBluetooth(audio_filename)
+            with turno.etapa("reproduccion_bluetooth"):
+                success = await ejecutar(ReproducirAudioBluetooth, audio_filename)
             if success:
                 print("Audio reproducido exitosamente por Bluetooth")
             else:
                 print("Error al reproducir audio por Bluetooth")
         else:
-            # Reproducir en el robot
-            global local_ip
-            audio_url = f"http://{local_ip}:{SERVER_PORT}/{audio_filename}"
+            # Reproducir en el robot: el audio se sirve desde memoria con una clave temporal
+            with turno.etapa("publicacion"):
+                audio_clave = almacen_audio.guardar(audio)
+                audio_url = url_audio(local_ip, SERVER_PORT, audio_clave)
             print(f"URL del audio: {audio_url}")
 
-            # Reproducir el audio en el robot
-            for intento in range(1, 4):
-                print(f"Intento {intento} de reproducir audio en el robot...")
-
-                # Reproducir el archivo de audio en el robot
-                block = PlayAudio(
-                    url=audio_url,
-                    storage_type=AudioStorageType.NET_PUBLIC,
-                    volume=1.0
-                )
-                result_type, response = await block.execute()
-
-                if result_type == MiniApiResultType.Success and response.isSuccess:
-                    print("Audio reproducido exitosamente en el robot")
-                    break
-                else:
-                    print(f"Error al reproducir audio en el robot: {response.resultCode}")
-                    if intento < 3:
-                        print("Reintentando en 2 segundos...")
-                        await asyncio.sleep(2)
-
-        # Mantener el archivo por un tiempo antes de eliminarlo
-        await asyncio.sleep(5)
-
-        # Eliminar el archivo después de reproducirlo
-        if os.path.exists(audio_filename):
-            os.remove(audio_filename)
+            try:
+                # Reproducir el audio en el robot
+                for intento in range(1, 4):
+                    print(f"Intento {intento} de reproducir audio en el robot...")
+
+                    # Reproducir el archivo de audio en el robot
+                    block = PlayAudio(
+                        url=audio_url,
+                        storage_type=AudioStorageType.NET_PUBLIC,
+                        volume=1.0
+                    )
+                    with turno.etapa("play_audio"):
+                        result_type, response = await block.execute()
+
+                    if result_type == MiniApiResultType.Success and response.isSuccess:
+                        print("Audio reproducido exitosamente en el robot")
+                        break
+                    else:
+                        print(f"Error al reproducir audio en el robot: {response.resultCode}")
+                        if intento < 3:
+                            print("Reintentando en 2 segundos...")
+                            await asyncio.sleep(2)
+            finally:
+                # Lo que tardó el robot en descargar el audio, según el registro del servidor
+                if http_server:
+                    for peticion in http_server.tiempos_clave(audio_clave):
+                        turno.registrar("descarga_robot", peticion["duracion_s"])
+                almacen_audio.eliminar(audio_clave)
 
     except Exception as e:
         print(f"Error durante la generación o reproducción de TTS: {e}")
@@ -377,7 +368,7 @@ async def _run():
             StartHTTPServer()
 
             print("Buscando el robot...")
-            device = await MiniSdk.get_device_by_name("20256", 10)
+            device = await obtener_cache_dispositivos().buscar("20256", 10)
             if device:
                 print("Robot encontrado, conectando...")
                 is_connected = await MiniSdk.connect(device)
@@ -402,18 +393,39 @@ async def _run():
         await GenerarReproducirTTS(
             "Prueba de audio. Si escuchas este mensaje, la configuración está funcionando correctamente.")
 
+        # Crear el modelo antes del primer mensaje
+        await ejecutar(obtener_pool().calentar)
+
+        # Medir el retraso del loop durante la sesión
+        monitor_lag = MonitorLag()
+        monitor_lag.iniciar()
+
         print("Iniciando interacción con Gemini...")
         while True:
-            mensaje = input("Escribe un mensaje para Gemini (o 'salir' para terminar): ")
+            inicio_entrada = time.perf_counter()
+            mensaje = await leer_entrada("Escribe un mensaje para Gemini (o 'salir' para terminar): ")
             if mensaje.lower() == 'salir':
                 break
 
-            # Respuesta del chatbot
-            respuesta = ObtenerRespuestaChatbot(mensaje)
-            print(f"Respuesta de Gemini: {respuesta}")
+            with trazador.turno("bluetooth" if USAR_BLUETOOTH else "http_local") as turno:
+                turno.registrar("entrada", time.perf_counter() - inicio_entrada)
 
-            # Generar y reproducir TTS
-            await GenerarReproducirTTS(respuesta)
+                # Respuesta del chatbot (en un hilo: el loop del robot sigue atendido)
+                try:
+                    with turno.etapa("gemini"):
+                        respuesta = await ejecutar(ObtenerRespuestaChatbot, mensaje, timeout=TIMEOUT_GEMINI)
+                except asyncio.TimeoutError:
+                    print("Gemini no respondió a tiempo")
+                    turno.atributos["error"] = "timeout_gemini"
+                    continue
+                print(f"Respuesta de Gemini: {respuesta}")
+
+                # Generar y reproducir TTS
+                await GenerarReproducirTTS(respuesta, turno)
+
+        print(f"Caché de respuestas: {obtener_cache_respuestas().estadisticas()}")
+        await monitor_lag.detener()
+        print(f"Retraso del loop: {monitor_lag.informe()}")
 
         # Limpiar recursos
         if not USAR_BLUETOOTH:
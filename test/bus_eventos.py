@@ -0,0 +1,284 @@
+import asyncio
+import inspect
+import time
+from collections import deque
+
+from trazas import percentil
+
+# Políticas de cada consumidor cuando su cola está llena
+BLOQUEAR = "bloquear"  # sin pérdidas: lo que no cabe espera en la reserva propia del consumidor
+DESCARTAR_ANTIGUO = "descartar_antiguo"  # se tira el evento más antiguo de la cola
+ULTIMO = "ultimo"  # solo interesa el estado más reciente: la cola guarda un único evento
+
+# Observadores del SDK por tipo de evento (mini.apis.api_observe)
+OBSERVADORES = {
+    "voz": "ObserveSpeechRecognise",
+    "caras": "ObserveFaceDetect",
+    "reconocimiento_caras": "ObserveFaceRecognise",
+    "infrarrojo": "ObserveInfraredDistance",
+    "postura": "ObserveRobotPosture",
+    "cabeza": "ObserveHeadRacket",
+}
+
+
+def _crear_observador_sdk(tipo: str):
+    from mini.apis import api_observe
+    return getattr(api_observe, OBSERVADORES[tipo])()
+
+
+class Consumidor:
+    """
+    Cola acotada de un consumidor del bus con su política de desbordamiento
+
+    Si se le da un manejador (función o corrutina) el bus lo llama con cada evento en
+    una tarea propia; si no, los eventos se leen con obtener() o async for. Con BLOQUEAR
+    lo que no cabe en la cola espera en una reserva de este consumidor (de hasta reserva
+    eventos; solo si se llena se pierde lo más antiguo), así que un consumidor atascado
+    solo se retrasa a sí mismo y el reparto a los demás sigue.
+    """
+
+    def __init__(self, nombre: str, tipo: str, manejador=None, capacidad: int = 100,
+                 politica: str = DESCARTAR_ANTIGUO, reserva: int = 1000):
+        if politica not in (BLOQUEAR, DESCARTAR_ANTIGUO, ULTIMO):
+            raise ValueError(f"Política desconocida: {politica}")
+        self.nombre = nombre
+        self.tipo = tipo
+        self.manejador = manejador
+        self.politica = politica
+        self.capacidad = 1 if politica == ULTIMO else capacidad
+        self._cola = deque()
+        self._reserva = deque()
+        self.max_reserva = reserva
+        self._hay_eventos = asyncio.Event()
+        self._tarea = None
+        # Métricas
+        self.recibidos = 0
+        self.procesados = 0
+        self.descartados = 0
+        self.fusionados = 0
+        self.errores = 0
+        self.retrasos = deque(maxlen=10000)
+
+    def __len__(self):
+        return len(self._cola) + len(self._reserva)
+
+    def ofrecer(self, evento, publicado: float):
+        """
+        Entrega el evento sin esperar nunca: el reparto no se para por este consumidor
+        """
+        self.recibidos += 1
+        if len(self._cola) >= self.capacidad:
+            if self.politica == BLOQUEAR:
+                if len(self._reserva) >= self.max_reserva:
+                    self._reserva.popleft()
+                    self.descartados += 1
+                self._reserva.append((evento, publicado))
+                return
+            elif self.politica == ULTIMO:
+                self._cola.clear()
+                self.fusionados += 1
+            else:
+                self._cola.popleft()
+                self.descartados += 1
+        self._cola.append((evento, publicado))
+        self._hay_eventos.set()
+
+    async def obtener(self):
+        while not self._cola:
+            self._hay_eventos.clear()
+            await self._hay_eventos.wait()
+        evento, publicado = self._cola.popleft()
+        if self._reserva:
+            self._cola.append(self._reserva.popleft())
+        self.retrasos.append(time.perf_counter() - publicado)
+        return evento
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        return await self.obtener()
+
+    async def _consumir(self):
+        while True:
+            evento = await self.obtener()
+            try:
+                resultado = self.manejador(evento)
+                if inspect.isawaitable(resultado):
+                    await resultado
+            except Exception as e:
+                self.errores += 1
+                print(f"Error en el consumidor {self.nombre}: {e}")
+            self.procesados += 1
+
+    def metricas(self) -> dict:
+        retrasos = sorted(self.retrasos)
+        n = len(retrasos)
+        return {
+            "politica": self.politica,
+            "en_cola": len(self),
+            "recibidos": self.recibidos,
+            "procesados": self.procesados,
+            "descartados": self.descartados,
+            "fusionados": self.fusionados,
+            "errores": self.errores,
+            "retraso_p50_ms": round(percentil(retrasos, 50) * 1000, 2),
+            "retraso_p95_ms": round(percentil(retrasos, 95) * 1000, 2),
+            "retraso_max_ms": round(retrasos[-1] * 1000, 2) if n else 0.0,
+        }
+
+
+class BusEventos:
+    """
+    Un único observador del SDK por tipo de evento repartido a muchos consumidores
+
+    El handler que el SDK llama en línea al recibir un mensaje solo apunta el evento en
+    la cola de entrada de su tipo (acotada a max_entrada, descartando lo más antiguo) y
+    vuelve; una tarea por tipo lo reparte después a las colas de los consumidores sin
+    esperar a ninguno. Así un consumidor lento nunca frena la recepción del websocket ni
+    a los demás consumidores: cada uno aplica su política en su propia cola (los de
+    BLOQUEAR guardan hasta max_entrada eventos más en su reserva).
+    """
+
+    def __init__(self, fabrica_observador=None, max_entrada: int = 1000):
+        self._fabrica_observador = fabrica_observador or _crear_observador_sdk
+        self.max_entrada = max_entrada
+        self._observadores = {}
+        self._entradas = {}
+        self._repartidores = {}
+        self._consumidores = {}
+        self.descartados_entrada = 0
+
+    def _asegurar_tipo(self, tipo: str, observar: bool):
+        if tipo in self._entradas:
+            return
+        self._entradas[tipo] = asyncio.Queue(maxsize=self.max_entrada)
+        self._consumidores.setdefault(tipo, [])
+        self._repartidores[tipo] = asyncio.create_task(self._repartir(tipo))
+        if observar:
+            observador = self._fabrica_observador(tipo)
+            observador.set_handler(lambda mensaje: self._recibir(tipo, mensaje))
+            observador.start()
+            self._observadores[tipo] = observador
+
+    def _recibir(self, tipo: str, evento):
+        """
+        Handler del SDK: se ejecuta en el camino de recepción, así que no puede esperar
+        """
+        entrada = self._entradas[tipo]
+        if entrada.full():
+            entrada.get_nowait()
+            self.descartados_entrada += 1
+        entrada.put_nowait((evento, time.perf_counter()))
+
+    async def _repartir(self, tipo: str):
+        entrada = self._entradas[tipo]
+        while True:
+            evento, publicado = await entrada.get()
+            for consumidor in self._consumidores[tipo]:
+                consumidor.ofrecer(evento, publicado)
+
+    def suscribir(self, tipo: str, manejador=None, nombre: str = None, capacidad: int = 100,
+                  politica: str = DESCARTAR_ANTIGUO, observar: bool = True) -> Consumidor:
+        """
+        Añade un consumidor del tipo de evento; el primero arranca el observador del SDK
+
+        Con observar=False no se arranca ningún observador (eventos solo por publicar()).
+        """
+        self._asegurar_tipo(tipo, observar)
+        consumidor = Consumidor(nombre or f"{tipo}-{len(self._consumidores[tipo]) + 1}", tipo, manejador,
+                                capacidad, politica, reserva=self.max_entrada)
+        if manejador is not None:
+            consumidor._tarea = asyncio.create_task(consumidor._consumir())
+        self._consumidores[tipo].append(consumidor)
+        return consumidor
+
+    def cancelar_suscripcion(self, consumidor: Consumidor):
+        consumidores = self._consumidores.get(consumidor.tipo, [])
+        if consumidor in consumidores:
+            consumidores.remove(consumidor)
+        if consumidor._tarea:
+            consumidor._tarea.cancel()
+
+    async def publicar(self, tipo: str, evento):
+        """
+        Publica un evento que no viene del SDK (p.ej. una grabación reproducida)
+        """
+        self._asegurar_tipo(tipo, observar=False)
+        await self._entradas[tipo].put((evento, time.perf_counter()))
+
+    async def cerrar(self):
+        for observador in self._observadores.values():
+            observador.stop()
+        tareas = list(self._repartidores.values())
+        tareas += [c._tarea for consumidores in self._consumidores.values() for c in consumidores if c._tarea]
+        for tarea in tareas:
+            tarea.cancel()
+        await asyncio.gather(*tareas, return_exceptions=True)
+        self._observadores.clear()
+        self._repartidores.clear()
+        self._entradas.clear()
+        self._consumidores.clear()
+
+    def metricas(self) -> dict:
+        return {
+            "descartados_entrada": self.descartados_entrada,
+            "consumidores": {c.nombre: c.metricas() for consumidores in self._consumidores.values()
+                             for c in consumidores},
+        }
+
+
+async def _benchmark(eventos: int, intervalo: float):
+    from fakes import ObservadorFalso
+
+    def lectura(i):
+        return {"distance": 300 + i % 50, "i": i}
+
+    # Un manejador lento en línea (como con set_handler) frena cada recepción
+    observador = ObservadorFalso(lectura, intervalo, eventos)
+    observador.set_handler(lambda mensaje: time.sleep(0.002))
+    observador.start()
+    await observador.terminado()
+    en_linea = observador.tiempos_entrega
+
+    observadores = []
+
+    def fabrica(tipo):
+        observadores.append(ObservadorFalso(lectura, intervalo, eventos))
+        return observadores[-1]
+
+    bus = BusEventos(fabrica)
+    ultimos = []
+
+    async def lento(evento):
+        await asyncio.sleep(0.01)
+
+    async def bloqueante(evento):
+        await asyncio.sleep(0.0005)
+
+    bus.suscribir("infrarrojo", lambda e: None, "rapido")
+    bus.suscribir("infrarrojo", lento, "lento", capacidad=20)
+    bus.suscribir("infrarrojo", lambda e: ultimos.append(e["i"]), "estado", politica=ULTIMO)
+    bus.suscribir("infrarrojo", bloqueante, "sin_perdidas", capacidad=50, politica=BLOQUEAR)
+    # Atascado y sin pérdidas: no debe retrasar ni hacer perder eventos a los demás
+    bus.suscribir("infrarrojo", lento, "atascado", capacidad=10, politica=BLOQUEAR)
+    await observadores[0].terminado()
+    await asyncio.sleep(0.5)
+    con_bus = observadores[0].tiempos_entrega
+
+    print(f"{eventos} eventos cada {intervalo * 1000:.1f} ms")
+    print(f"Manejador lento en línea: recepción máx {max(en_linea) * 1000:.2f} ms, "
+          f"media {sum(en_linea) / len(en_linea) * 1000:.3f} ms")
+    print(f"Con el bus: recepción máx {max(con_bus) * 1000:.3f} ms, "
+          f"media {sum(con_bus) / len(con_bus) * 1000:.4f} ms")
+    for nombre, m in bus.metricas()["consumidores"].items():
+        print(f"  {nombre}: {m}")
+    await bus.cerrar()
+
+
+def benchmark(eventos: int = 1000, intervalo: float = 0.001):
+    asyncio.run(_benchmark(eventos, intervalo))
+
+
+if __name__ == '__main__':
+    benchmark()
@@ -0,0 +1,183 @@
+import asyncio
+import json
+import os
+import threading
+import time
+
+from mini.dns.dns_browser import WiFiDevice
+
+RUTA_CACHE_DISPOSITIVOS = "dispositivos.json"
+# El SDK se conecta siempre al websocket del robot en este puerto (mini.channels.websocket_client)
+PUERTO_WEBSOCKET = 8800
+
+
+async def escanear_sdk(sufijo: str, timeout: int):
+    import mini.mini_sdk as MiniSdk
+    return await MiniSdk.get_device_by_name(sufijo, timeout)
+
+
+async def sondear_tcp(direccion: str, puerto: int = PUERTO_WEBSOCKET, timeout: float = 0.5) -> bool:
+    """
+    Comprueba si hay algo escuchando en direccion:puerto sin pasar por mDNS
+    """
+    try:
+        _, escritor = await asyncio.wait_for(asyncio.open_connection(direccion, puerto), timeout)
+    except (OSError, asyncio.TimeoutError):
+        return False
+    escritor.close()
+    try:
+        await escritor.wait_closed()
+    except OSError:
+        pass
+    return True
+
+
+class CacheDispositivos:
+    """
+    Último WiFiDevice conocido de cada robot (por sufijo del número de serie) guardado en disco
+
+    buscar() prueba primero una conexión TCP directa a la dirección guardada y solo si
+    falla hace el escaneo mDNS completo (hasta timeout segundos), guardando el resultado.
+    También guarda lo que tardó el último escaneo para saber cuánto se ahorra.
+    """
+
+    def __init__(self, ruta: str = RUTA_CACHE_DISPOSITIVOS, escanear=None, sondear=None,
+                 puerto: int = PUERTO_WEBSOCKET, timeout_sondeo: float = 0.5):
+        self.ruta = ruta
+        self._escanear = escanear or escanear_sdk
+        self._sondear = sondear or sondear_tcp
+        self.puerto = puerto
+        self.timeout_sondeo = timeout_sondeo
+        self._lock = threading.Lock()
+        self._dispositivos = self._cargar()
+        self.aciertos = 0
+        self.fallos = 0
+        self.tiempo_ahorrado = 0.0
+
+    def _cargar(self) -> dict:
+        if not self.ruta or not os.path.exists(self.ruta):
+            return {}
+        try:
+            with open(self.ruta, encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"No se pudo leer la caché de dispositivos: {e}")
+            return {}
+
+    def _persistir(self):
+        if not self.ruta:
+            return
+        temporal = self.ruta + ".tmp"
+        with open(temporal, "w", encoding="utf-8") as f:
+            json.dump(self._dispositivos, f, ensure_ascii=False, indent=1)
+        os.replace(temporal, self.ruta)
+
+    def obtener(self, sufijo: str):
+        """
+        WiFiDevice guardado para el sufijo, o None
+        """
+        with self._lock:
+            entrada = self._dispositivos.get(sufijo)
+        if entrada is None:
+            return None
+        return WiFiDevice(entrada["name"], entrada["address"], entrada["port"], entrada["type"], entrada["server"])
+
+    def guardar(self, sufijo: str, dispositivo: WiFiDevice, escaneo_s: float = None):
+        with self._lock:
+            previo = self._dispositivos.get(sufijo, {})
+            self._dispositivos[sufijo] = {
+                "name": dispositivo.name,
+                "address": dispositivo.address,
+                "port": dispositivo.port,
+                "type": dispositivo.type,
+                "server": dispositivo.server,
+                "visto": time.time(),
+                "escaneo_s": escaneo_s if escaneo_s is not None else previo.get("escaneo_s"),
+            }
+            self._persistir()
+
+    def olvidar(self, sufijo: str):
+        with self._lock:
+            if self._dispositivos.pop(sufijo, None) is not None:
+                self._persistir()
+
+    async def buscar(self, sufijo: str, timeout: int = 10):
+        """
+        Igual que MiniSdk.get_device_by_name(sufijo, timeout), pero sin escanear si el
+        robot sigue en la dirección guardada
+        """
+        inicio = time.perf_counter()
+        dispositivo = self.obtener(sufijo)
+        if dispositivo is not None and await self._sondear(dispositivo.address, self.puerto, self.timeout_sondeo):
+            duracion = time.perf_counter() - inicio
+            escaneo = self._dispositivos.get(sufijo, {}).get("escaneo_s") or timeout
+            self.aciertos += 1
+            self.tiempo_ahorrado += max(escaneo - duracion, 0.0)
+            print(f"Robot {dispositivo.name} en {dispositivo.address} (caché, {duracion * 1000:.0f} ms; "
+                  f"escaneo ahorrado ~{escaneo:.1f}s)")
+            self.guardar(sufijo, dispositivo)
+            return dispositivo
+
+        self.fallos += 1
+        if dispositivo is not None:
+            print(f"El robot no responde en {dispositivo.address}, escaneando la red...")
+        dispositivo = await self._escanear(sufijo, timeout)
+        if dispositivo is not None:
+            self.guardar(sufijo, dispositivo, time.perf_counter() - inicio)
+        return dispositivo
+
+    def estadisticas(self) -> dict:
+        return {
+            "aciertos": self.aciertos,
+            "fallos": self.fallos,
+            "tiempo_ahorrado_s": round(self.tiempo_ahorrado, 3),
+            "dispositivos": len(self._dispositivos),
+        }
+
+
+_cache_dispositivos = None
+
+
+def obtener_cache_dispositivos() -> CacheDispositivos:
+    global _cache_dispositivos
+    if _cache_dispositivos is None:
+        _cache_dispositivos = CacheDispositivos()
+    return _cache_dispositivos
+
+
+async def _benchmark(latencia_escaneo: float):
+    import tempfile
+
+    # Un "robot" local: cualquier servidor TCP escuchando hace de websocket del robot
+    servidor = await asyncio.start_server(lambda lector, escritor: escritor.close(), "127.0.0.1", 0)
+    puerto = servidor.sockets[0].getsockname()[1]
+    robot = WiFiDevice("Mini_AA20256", "127.0.0.1", puerto, "_Dedu_mini_channel_server._tcp.local.", "mini.local.")
+
+    async def escanear_falso(sufijo, timeout):
+        # Lo que tarda el mDNS en ver al robot (hasta 10 s con el SDK)
+        await asyncio.sleep(min(latencia_escaneo, timeout))
+        return robot
+
+    ruta = os.path.join(tempfile.mkdtemp(prefix="cache_dispositivos_"), "dispositivos.json")
+    for arranque in ("en frío (sin caché)", "con caché"):
+        # Cada arranque es un proceso nuevo: la caché se vuelve a leer del disco
+        cache = CacheDispositivos(ruta, escanear=escanear_falso, puerto=puerto)
+        inicio = time.perf_counter()
+        await cache.buscar("20256")
+        print(f"Arranque {arranque}: {(time.perf_counter() - inicio) * 1000:.0f} ms {cache.estadisticas()}")
+
+    # Robot con otra IP: el sondeo falla rápido y se vuelve a escanear
+    servidor.close()
+    await servidor.wait_closed()
+    cache = CacheDispositivos(ruta, escanear=escanear_falso, puerto=puerto)
+    inicio = time.perf_counter()
+    await cache.buscar("20256")
+    print(f"Arranque con caché caducada: {(time.perf_counter() - inicio) * 1000:.0f} ms {cache.estadisticas()}")
+
+
+def benchmark(latencia_escaneo: float = 3.0):
+    asyncio.run(_benchmark(latencia_escaneo))
+
+
+if __name__ == '__main__':
+    benchmark()
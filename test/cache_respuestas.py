@@ -0,0 +1,132 @@
+import json
+import os
+import re
+import threading
+import time
+import unicodedata
+
+from cachetools import TLRUCache
+
+from gemini_pool import MODELO_GEMINI
+
+RUTA_CACHE_RESPUESTAS = "cache_respuestas.json"
+
+
+def normalizar_prompt(prompt: str) -> str:
+    """
+    Forma canónica de una pregunta: sin mayúsculas, espacios repetidos ni signos
+    alrededor ("¿Qué hora es?" y "qué hora es" comparten clave)
+    """
+    texto = unicodedata.normalize("NFC", prompt).casefold()
+    texto = re.sub(r"\s+", " ", texto)
+    return texto.strip(" ¿?¡!.,;:\"'")
+
+
+class CacheRespuestas:
+    """
+    Caché de respuestas de Gemini para preguntas sin contexto
+
+    La clave es (modelo, pregunta normalizada). Las entradas caducan a los ttl segundos
+    y, si se llena, se expulsa la usada hace más tiempo. Con ruta se persiste en JSON.
+    """
+
+    def __init__(self, modelo: str = MODELO_GEMINI, ttl: float = 3600, max_entradas: int = 256, ruta: str = None):
+        self.modelo = modelo
+        self.ttl = ttl
+        self.ruta = ruta
+        # Cada valor es (respuesta, expira, latencia original); se usa hora de pared para poder persistir
+        self._cache = TLRUCache(maxsize=max_entradas, ttu=lambda clave, valor, ahora: valor[1], timer=time.time)
+        self._lock = threading.Lock()
+        self.aciertos = 0
+        self.fallos = 0
+        self.omitidas = 0
+        self.latencia_ahorrada = 0.0
+
+        if ruta and os.path.exists(ruta):
+            self._cargar()
+
+    def _clave(self, prompt: str) -> str:
+        return f"{self.modelo}\x1f{normalizar_prompt(prompt)}"
+
+    def obtener(self, prompt: str):
+        """
+        Devuelve la respuesta cacheada o None
+        """
+        with self._lock:
+            valor = self._cache.get(self._clave(prompt))
+            if valor is None:
+                self.fallos += 1
+                return None
+            self.aciertos += 1
+            self.latencia_ahorrada += valor[2]
+            return valor[0]
+
+    def guardar(self, prompt: str, respuesta: str, latencia: float = 0.0):
+        with self._lock:
+            self._cache[self._clave(prompt)] = (respuesta, time.time() + self.ttl, latencia)
+            if self.ruta:
+                self._guardar_disco()
+
+    def obtener_o_calcular(self, prompt: str, calcular, usar_cache: bool = True) -> str:
+        """
+        Devuelve la respuesta cacheada o llama a calcular() y la guarda
+
+        Con usar_cache=False (p.ej. si hay historial de conversación) siempre se llama a Gemini.
+        Si calcular() lanza una excepción o devuelve una respuesta vacía no se cachea nada.
+        """
+        if not usar_cache:
+            self.omitidas += 1
+            return calcular()
+
+        respuesta = self.obtener(prompt)
+        if respuesta is not None:
+            return respuesta
+
+        inicio = time.perf_counter()
+        respuesta = calcular()
+        if respuesta and respuesta.strip():
+            self.guardar(prompt, respuesta, time.perf_counter() - inicio)
+        return respuesta
+
+    def estadisticas(self) -> dict:
+        consultas = self.aciertos + self.fallos
+        return {
+            "aciertos": self.aciertos,
+            "fallos": self.fallos,
+            "omitidas": self.omitidas,
+            "tasa_aciertos": self.aciertos / consultas if consultas else 0.0,
+            "latencia_ahorrada_s": self.latencia_ahorrada,
+            "entradas": len(self._cache),
+        }
+
+    def _guardar_disco(self):
+        datos = {clave: list(valor) for clave, valor in self._cache.items()}
+        temporal = f"{self.ruta}.tmp"
+        with open(temporal, "w", encoding="utf-8") as f:
+            json.dump(datos, f, ensure_ascii=False)
+        os.replace(temporal, self.ruta)
+
+    def _cargar(self):
+        try:
+            with open(self.ruta, encoding="utf-8") as f:
+                datos = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"No se pudo cargar la caché de respuestas: {e}")
+            return
+        ahora = time.time()
+        for clave, (respuesta, expira, latencia) in datos.items():
+            if expira > ahora:
+                self._cache[clave] = (respuesta, expira, latencia)
+
+
+_cache = None
+
+
+def obtener_cache_respuestas() -> CacheRespuestas:
+    """
+    Caché de respuestas compartida por los scripts de chat, persistida en disco
+    """
+    global _cache
+    if _cache is None:
+        _cache = CacheRespuestas(ruta=RUTA_CACHE_RESPUESTAS)
+    return _cache
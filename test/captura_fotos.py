@@ -0,0 +1,224 @@
+import asyncio
+import multiprocessing
+import time
+import urllib.request
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+# Con qué se decodifican las fotos: "cv2" (BGR, como usa OpenCV) o "pillow" (RGB)
+DECODIFICADOR = "cv2"
+
+
+async def disparar_sdk(tipo=None) -> str:
+    """
+    Hace una foto con TakePicture y devuelve su ruta en el robot
+    """
+    from mini.apis.api_sence import TakePicture, TakePictureType
+    from mini import MiniApiResultType
+    result_type, response = await TakePicture(take_picture_type=tipo or TakePictureType.IMMEDIATELY).execute()
+    if result_type != MiniApiResultType.Success or not response or not response.isSuccess:
+        raise RuntimeError(f"TakePicture falló: {result_type}")
+    return response.picPath
+
+
+def descargar_http(plantilla: str, timeout: float = 10):
+    """
+    Descargador de fotos por HTTP: plantilla es la URL con {ruta} (la picPath del robot)
+
+    El SDK no trae las fotos al ordenador; hace falta algo en el robot que sirva su
+    almacenamiento (p.ej. un servidor de ficheros), y aquí se dice dónde está.
+    """
+    def _descargar(ruta: str) -> bytes:
+        with urllib.request.urlopen(plantilla.format(ruta=ruta.lstrip("/")), timeout=timeout) as respuesta:
+            return respuesta.read()
+
+    async def descargar(ruta: str) -> bytes:
+        return await asyncio.get_running_loop().run_in_executor(None, _descargar, ruta)
+    return descargar
+
+
+def _decodificar(datos: bytes, decodificador: str) -> np.ndarray:
+    # Se ejecuta en los procesos del pool
+    if decodificador == "cv2":
+        import cv2
+        imagen = cv2.imdecode(np.frombuffer(datos, dtype=np.uint8), cv2.IMREAD_COLOR)
+        if imagen is None:
+            raise ValueError("No se pudo decodificar la imagen")
+        return imagen
+    import io
+    from PIL import Image
+    with Image.open(io.BytesIO(datos)) as imagen:
+        return np.asarray(imagen.convert("RGB"))
+
+
+class CapturaFotos:
+    """
+    Tubería de fotos del robot: disparo, descarga y decodificación en paralelo
+
+    Las fotos se disparan de una en una (la cámara es una), pero mientras se hace la
+    siguiente las anteriores se descargan (hasta max_descargas a la vez) y se decodifican
+    en un pool de procesos. capturar() las entrega en orden como arrays de NumPy. Entre
+    fotos en curso y ya decodificadas nunca hay más de max_buffer: si quien consume va
+    lento, se deja de disparar en lugar de llenar la memoria.
+    """
+
+    def __init__(self, descargar, disparar=None, decodificador: str = DECODIFICADOR, procesos: int = 2,
+                 max_descargas: int = 4, max_buffer: int = 8):
+        self._descargar = descargar
+        self._disparar = disparar or disparar_sdk
+        self.decodificador = decodificador
+        self.max_buffer = max_buffer
+        self._descargas = asyncio.Semaphore(max_descargas)
+        self._ejecutor = ProcessPoolExecutor(max_workers=procesos, mp_context=multiprocessing.get_context("spawn"))
+        # Métricas
+        self.fotos = 0
+        self.errores = 0
+        self.bytes_descargados = 0
+        self._bytes_en_buffer = 0
+        self.max_bytes_en_buffer = 0
+        self.tiempos = {"disparo": 0.0, "descarga": 0.0, "decodificacion": 0.0}
+        self._inicio = None
+
+    async def _procesar(self, ruta: str):
+        loop = asyncio.get_running_loop()
+        async with self._descargas:
+            inicio = time.perf_counter()
+            datos = await self._descargar(ruta)
+            self.tiempos["descarga"] += time.perf_counter() - inicio
+        self.bytes_descargados += len(datos)
+        inicio = time.perf_counter()
+        imagen = await loop.run_in_executor(self._ejecutor, _decodificar, datos, self.decodificador)
+        self.tiempos["decodificacion"] += time.perf_counter() - inicio
+        self._bytes_en_buffer += imagen.nbytes
+        self.max_bytes_en_buffer = max(self.max_bytes_en_buffer, self._bytes_en_buffer)
+        return imagen
+
+    async def _producir(self, cantidad: int, tipo, pendientes: asyncio.Queue, huecos: asyncio.Semaphore):
+        try:
+            for _ in range(cantidad):
+                # Espera si ya hay max_buffer fotos sin recoger
+                await huecos.acquire()
+                inicio = time.perf_counter()
+                try:
+                    ruta = await self._disparar(tipo)
+                except Exception as e:
+                    huecos.release()
+                    self.errores += 1
+                    print(f"Error al hacer la foto: {e}")
+                    continue
+                finally:
+                    self.tiempos["disparo"] += time.perf_counter() - inicio
+                pendientes.put_nowait(asyncio.ensure_future(self._procesar(ruta)))
+        finally:
+            pendientes.put_nowait(None)
+
+    async def capturar(self, cantidad: int, tipo=None):
+        """
+        Hace cantidad fotos (TakePictureType.IMMEDIATELY o FINDFACE) y las va entregando decodificadas
+        """
+        self._inicio = self._inicio or time.perf_counter()
+        pendientes = asyncio.Queue()
+        huecos = asyncio.Semaphore(self.max_buffer)
+        productor = asyncio.create_task(self._producir(cantidad, tipo, pendientes, huecos))
+        try:
+            while True:
+                futuro = await pendientes.get()
+                if futuro is None:
+                    break
+                try:
+                    imagen = await futuro
+                except Exception as e:
+                    self.errores += 1
+                    print(f"Error al descargar o decodificar la foto: {e}")
+                    continue
+                finally:
+                    huecos.release()
+                self._bytes_en_buffer -= imagen.nbytes
+                self.fotos += 1
+                yield imagen
+        finally:
+            productor.cancel()
+            while not pendientes.empty():
+                futuro = pendientes.get_nowait()
+                if futuro is not None:
+                    futuro.cancel()
+
+    def cerrar(self):
+        self._ejecutor.shutdown(wait=True, cancel_futures=True)
+
+    def metricas(self) -> dict:
+        duracion = time.perf_counter() - self._inicio if self._inicio else 0.0
+        return {
+            "fotos": self.fotos,
+            "errores": self.errores,
+            "fotos_s": round(self.fotos / duracion, 2) if duracion else 0.0,
+            "mb_descargados": round(self.bytes_descargados / 1e6, 1),
+            "max_mb_en_buffer": round(self.max_bytes_en_buffer / 1e6, 1),
+            "tiempo_s": {etapa: round(t, 2) for etapa, t in self.tiempos.items()},
+        }
+
+
+def _fotos_sinteticas(directorio: str, cantidad: int, ancho: int = 1280, alto: int = 720) -> list:
+    import os
+    import cv2
+    rng = np.random.default_rng(1)
+    rutas = []
+    for i in range(cantidad):
+        imagen = np.zeros((alto, ancho, 3), dtype=np.uint8)
+        imagen[:] = np.linspace(0, 255, ancho, dtype=np.uint8)[None, :, None]
+        imagen += rng.integers(0, 40, imagen.shape, dtype=np.uint8)
+        cv2.putText(imagen, f"foto {i}", (100, 360), cv2.FONT_HERSHEY_SIMPLEX, 4, (255, 255, 255), 8)
+        ruta = os.path.join(directorio, f"foto_{i}.jpg")
+        cv2.imwrite(ruta, imagen)
+        rutas.append(ruta)
+    return rutas
+
+
+async def _benchmark(cantidad: int, latencia_disparo: float, latencia_descarga: float):
+    import itertools
+    import tempfile
+    directorio = tempfile.mkdtemp(prefix="captura_fotos_")
+    rutas = itertools.cycle(_fotos_sinteticas(directorio, cantidad))
+
+    async def disparar(tipo):
+        await asyncio.sleep(latencia_disparo)
+        return next(rutas)
+
+    async def descargar(ruta):
+        await asyncio.sleep(latencia_descarga)
+        with open(ruta, "rb") as f:
+            return f.read()
+
+    # Una foto detrás de otra, decodificando en el loop
+    inicio = time.perf_counter()
+    for _ in range(cantidad):
+        _decodificar(await descargar(await disparar(None)), DECODIFICADOR)
+    secuencial = cantidad / (time.perf_counter() - inicio)
+    print(f"Una tras otra: {secuencial:.1f} fotos/s (disparo {latencia_disparo * 1000:.0f} ms, "
+          f"descarga {latencia_descarga * 1000:.0f} ms)")
+
+    captura = CapturaFotos(descargar, disparar)
+    # Arrancar los procesos del pool antes de medir
+    await asyncio.get_running_loop().run_in_executor(captura._ejecutor, _decodificar,
+                                                     open(next(rutas), "rb").read(), DECODIFICADOR)
+    forma = None
+    async for imagen in captura.capturar(cantidad // 2):
+        forma = imagen.shape
+    print(f"Tubería: {captura.metricas()} {forma}")
+
+    # Consumidor lento: el buffer acotado frena los disparos
+    lenta = CapturaFotos(descargar, disparar, max_buffer=4)
+    async for imagen in lenta.capturar(cantidad // 2):
+        await asyncio.sleep(0.2)
+    print(f"Consumidor lento (max_buffer=4): {lenta.metricas()}")
+    captura.cerrar()
+    lenta.cerrar()
+
+
+def benchmark(cantidad: int = 40, latencia_disparo: float = 0.05, latencia_descarga: float = 0.15):
+    asyncio.run(_benchmark(cantidad, latencia_disparo, latencia_descarga))
+
+
+if __name__ == '__main__':
+    benchmark()
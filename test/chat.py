@@ -1,13 +1,18 @@
 import asyncio
 import os
 import time
-from gtts import gTTS
 import git
 import google.generativeai as genai
 import mini.mini_sdk as MiniSdk
-from mini.apis.api_sound import PlayAudio
-from mini import AudioStorageType, MiniApiResultType
 from dotenv import load_dotenv
+from gemini_pool import obtener_pool
+from cache_respuestas import obtener_cache_respuestas
+from ejecutor_async import ejecutar, leer_entrada, MonitorLag, TIMEOUT_GEMINI, TIMEOUT_TTS
+from tts_cache import obtener_cache
+from codificador_audio import obtener_codificador
+from comandos_robot import play_audio, TIMEOUT_REPRODUCCION
+from supervisor_conexion import SupervisorConexion, ConexionMiniSdk
+from trazas import Trazador, TURNO_NULO
 
 # Cargar variables de entorno desde keys.env
 load_dotenv("keys.env")
@@ -19,32 +24,30 @@ GITHUB_TOKEN = os.getenv("GITHUB_TOKEN")
 # Configurar Google API
 genai.configure(api_key=GOOGLE_API_KEY)
 
+# Tiempos de cada etapa por turno (python trazas.py para ver los percentiles)
+trazador = Trazador()
+
+# Conexión con el robot vigilada (latido y reconexión automática)
+supervisor = None
+
 
 def obtener_respuesta_chatbot(mensaje: str) -> str:
     """
     Obtiene una respuesta del chatbot Gemini.
     """
     try:
-        # Configurar el modelo
-        model = genai.GenerativeModel('gemini-2.0-flash')
-
-        # Crear el chat
-        chat = model.start_chat(history=[])
-
-        # Obtener respuesta
-        response = chat.send_message(mensaje)
-
-        # Extraer texto de la respuesta
-        return response.text
+        # Las preguntas repetidas se responden desde la caché sin llamar a Gemini
+        return obtener_cache_respuestas().obtener_o_calcular(
+            mensaje, lambda: obtener_pool().enviar(mensaje).text)
 
     except Exception as e:
         print(f"Error al comunicarse con Gemini: {e}")
         return "Ha ocurrido un error al procesar tu mensaje."
 
 
-def copiarARepo(audio_path: str):
+def copiarARepo(audio_path: str, extension: str = "mp3"):
     """
-    Copia un archivo al repositorio Git y lo sube a GitHub.
+    Copia un archivo al repositorio Git y lo sube a GitHub como respuesta_chatbot.<extension>.
     """
     try:
         # Clona repositorio si no está clonado
@@ -53,21 +56,22 @@ def copiarARepo(audio_path: str):
             git.Repo.clone_from("https://github.com/pecec1to/audio.git", "audio_repo")
 
         # Elimina el archivo existente si existe
-        repo_audio_path = "audio_repo/respuesta_chatbot.mp3"
+        audio_filename = f"respuesta_chatbot.{extension}"
+        repo_audio_path = f"audio_repo/{audio_filename}"
         if os.path.exists(repo_audio_path):
             print(f"Eliminando archivo existente: {repo_audio_path}")
             os.remove(repo_audio_path)
 
         # Copia archivo al repositorio
         print(f"Copiando archivo {audio_path} al repositorio...")
-        os.system(f"copy {audio_path} audio_repo\\respuesta_chatbot.mp3")  # Para Windows
+        os.system(f"copy {audio_path} audio_repo\\{audio_filename}")  # Para Windows
 
         # Abre el repositorio
         repo = git.Repo("audio_repo")
 
         # Añade archivo al repositorio (incluso si no hay cambios)
         print("Añadiendo archivo al repositorio...")
-        repo.git.add("respuesta_chatbot.mp3")
+        repo.git.add(audio_filename)
 
         # Commit (forzado)
         print("Haciendo commit...")
@@ -84,82 +88,98 @@ def copiarARepo(audio_path: str):
         print(f"Error al subir el archivo a GitHub: {e}")
 
 
-async def generar_reproducir_tts(texto: str):
+async def generar_reproducir_tts(texto: str, turno=TURNO_NULO):
     """
     Genera un archivo de audio TTS, lo sube a GitHub y lo reproduce en el robot.
     """
     try:
-        # Convertir texto a audio
-        tts = gTTS(text=texto, lang='es')
-        audio_path = "respuesta_chatbot.mp3"
-        tts.save(audio_path)
+        # Convertir texto a audio (si ya estaba en caché no se vuelve a sintetizar)
+        with turno.etapa("tts"):
+            _, audio = await ejecutar(obtener_cache().obtener_o_sintetizar, texto, timeout=TIMEOUT_TTS)
+        # Versión para el robot (mono, 16 kHz): menos que subir y que descargar
+        with turno.etapa("codificacion"):
+            audio, extension = await ejecutar(obtener_codificador().codificar, audio, timeout=TIMEOUT_TTS)
+        audio_path = f"respuesta_chatbot.{extension}"
+        with open(audio_path, "wb") as f:
+            f.write(audio)
 
         # Verificar si el archivo existe
         if not os.path.exists(audio_path):
             raise FileNotFoundError(f"El archivo no fue generado en la ruta: {audio_path}")
         print(f"Archivo de audio generado exitosamente: {audio_path}")
 
-        # Subir el archivo al repositorio
-        copiarARepo(audio_path)
+        # Subir el archivo al repositorio (git bloquea: va en un hilo)
+        with turno.etapa("git_push"):
+            await ejecutar(copiarARepo, audio_path, extension)
 
         # URL pública del archivo en GitHub Pages con invalidación de caché
         timestamp = int(time.time())  # Genera un timestamp único
-        public_url = f"https://pecec1to.github.io/audio/respuesta_chatbot.mp3?cache_bust={timestamp}"
+        public_url = f"https://pecec1to.github.io/audio/{audio_path}?cache_bust={timestamp}"
 
-        # Reproducir el archivo de audio en el robot
-        block = PlayAudio(
-            url=public_url,
-            storage_type=AudioStorageType.NET_PUBLIC,
-            volume=1.0
-        )
-        result_type, response = await block.execute()
+        # Reproducir el archivo de audio en el robot (si la conexión cae, se repite al reconectar)
+        # La descarga desde GitHub Pages la hace el robot: queda dentro de play_audio
+        with turno.etapa("play_audio"):
+            exito, detalle = await supervisor.ejecutar(play_audio(public_url), idempotente=True,
+                                                       timeout=TIMEOUT_REPRODUCCION)
 
-        if result_type == MiniApiResultType.Success and response.isSuccess:
+        if exito:
             print("Audio reproducido exitosamente")
         else:
-            print(f"Error al reproducir audio: {response.resultCode}")
+            print(f"Error al reproducir audio: {detalle}")
 
     except Exception as e:
         print(f"Error durante la generación o reproducción de TTS: {e}")
 
 
 async def _run():
+    global supervisor
     try:
+        # Buscar el robot, conectar y entrar en modo programa; si la WiFi se cae durante
+        # la sesión, el supervisor lo detecta por el latido y repite todo esto solo
         print("Buscando el robot...")
-        device = await MiniSdk.get_device_by_name("20256", 10)
-        if device:
-            print("Robot encontrado, conectando...")
-            is_connected = await MiniSdk.connect(device)
-            if not is_connected:
-                print("No se pudo conectar al robot")
-                return
-
-            print("Entrando en modo programa...")
-            success = await MiniSdk.enter_program()
-            if not success:
-                print("No se pudo entrar en modo programa")
-                return
+        supervisor = SupervisorConexion(ConexionMiniSdk("20256", 10))
+        if await supervisor.iniciar():
+            print("Robot conectado y en modo programa")
+
+            # Crear el modelo antes del primer mensaje
+            await ejecutar(obtener_pool().calentar)
+
+            # Medir el retraso del loop durante la sesión
+            monitor_lag = MonitorLag()
+            monitor_lag.iniciar()
 
             print("Iniciando interacción con Gemini...")
             while True:
-                mensaje = input("Escribe un mensaje para Gemini (o 'salir' para terminar): ")
+                inicio_entrada = time.perf_counter()
+                mensaje = await leer_entrada("Escribe un mensaje para Gemini (o 'salir' para terminar): ")
                 if mensaje.lower() == 'salir':
                     break
 
-                # Respuesta del chatbot
-                respuesta = obtener_respuesta_chatbot(mensaje)
-                print(f"Respuesta de Gemini: {respuesta}")
-
-                # Generar y reproducir TTS
-                await generar_reproducir_tts(respuesta)
-
-            print("Saliendo del modo programa...")
-            await MiniSdk.quit_program()
-
-            print("Liberando recursos...")
-            await MiniSdk.release()
+                with trazador.turno("github_pages") as turno:
+                    turno.registrar("entrada", time.perf_counter() - inicio_entrada)
+
+                    # Respuesta del chatbot (en un hilo: el loop del robot sigue atendido)
+                    try:
+                        with turno.etapa("gemini"):
+                            respuesta = await ejecutar(obtener_respuesta_chatbot, mensaje, timeout=TIMEOUT_GEMINI)
+                    except asyncio.TimeoutError:
+                        print("Gemini no respondió a tiempo")
+                        turno.atributos["error"] = "timeout_gemini"
+                        continue
+                    print(f"Respuesta de Gemini: {respuesta}")
+
+                    # Generar y reproducir TTS
+                    await generar_reproducir_tts(respuesta, turno)
+
+            print(f"Caché de respuestas: {obtener_cache_respuestas().estadisticas()}")
+            await monitor_lag.detener()
+            print(f"Retraso del loop: {monitor_lag.informe()}")
+
+            print(f"Conexión: {supervisor.metricas()}")
+            print("Saliendo del modo programa y liberando recursos...")
+            await supervisor.detener()
         else:
-            print("No se encontró el robot")
+            print("No se pudo conectar con el robot")
     except Exception as e:
         print(f"Error en la ejecución: {e}")
 
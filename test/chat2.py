@@ -3,13 +3,20 @@ import os
 import time
 import uuid
 import shutil
-from gtts import gTTS
 import git
 import google.generativeai as genai
 import mini.mini_sdk as MiniSdk
 from mini.apis.api_sound import PlayAudio
 from mini import AudioStorageType, MiniApiResultType
 from dotenv import load_dotenv
+from gemini_pool import obtener_pool
+from cache_respuestas import obtener_cache_respuestas
+from ejecutor_async import ejecutar, leer_entrada, MonitorLag, TIMEOUT_GEMINI, TIMEOUT_TTS
+from tts_cache import obtener_cache
+from codificador_audio import obtener_codificador
+from cache_dispositivos import obtener_cache_dispositivos
+from memoria_conversacion import MemoriaConversacion
+from trazas import Trazador, TURNO_NULO
 
 # Cargar variables de entorno desde keys.env
 load_dotenv("keys.env")
@@ -21,81 +28,83 @@ GITHUB_TOKEN = os.getenv("GITHUB_TOKEN")
 # Configurar Google API
 genai.configure(api_key=GOOGLE_API_KEY)
 
-# Historial de chat para mantener contexto
-chat_history = []
+# Historial de chat para mantener contexto, acotado por tokens (lo antiguo se resume)
+chat_history = MemoriaConversacion()
+
+# Tiempos de cada etapa por turno (python trazas.py para ver los percentiles)
+trazador = Trazador()
+
+RESPUESTA_ERROR = "Ha ocurrido un error al procesar tu mensaje."
 
 
 def obtener_respuesta_chatbot(mensaje: str) -> str:
     """
     Obtiene una respuesta del chatbot Gemini.
     """
-    global chat_history
-
     try:
-        # Configurar el modelo
-        model = genai.GenerativeModel('gemini-2.0-flash')
-
-        # Crear el chat con historial
-        chat = model.start_chat(history=chat_history)
-
-        # Obtener respuesta
-        response = chat.send_message(mensaje)
+        # Obtener respuesta con el historial sobre el modelo ya calentado del pool.
+        # Solo se usa la caché sin historial: con contexto la respuesta depende de él
+        respuesta = obtener_cache_respuestas().obtener_o_calcular(
+            mensaje, lambda: obtener_pool().enviar(mensaje, historial=chat_history.historial()).text,
+            usar_cache=not chat_history)
 
-        # Actualizar historial
-        chat_history.append({"role": "user", "parts": [mensaje]})
-        chat_history.append({"role": "model", "parts": [response.text]})
-
-        # Limitar el historial a las últimas 10 interacciones (5 pares)
-        if len(chat_history) > 10:
-            chat_history = chat_history[-10:]
-
-        # Extraer texto de la respuesta
-        return response.text
+        # El historial se actualiza en el loop al volver (fuera del timeout de Gemini)
+        return respuesta
 
     except Exception as e:
         print(f"Error al comunicarse con Gemini: {e}")
-        return "Ha ocurrido un error al procesar tu mensaje."
+        return RESPUESTA_ERROR
 
 
-async def subir_y_reproducir_audio(audio_path: str, audio_filename: str):
+def subir_a_github(audio_path: str, audio_filename: str):
     """
-    Sube el audio a GitHub y lo reproduce en el robot.
+    Copia el audio al repositorio de GitHub Pages y hace push (bloqueante).
     """
-    try:
-        # Clona repositorio si no está clonado
-        if not os.path.exists("audio_repo"):
-            print("Clonando el repositorio...")
-            git.Repo.clone_from("https://github.com/pecec1to/audio.git", "audio_repo")
+    # Clona repositorio si no está clonado
+    if not os.path.exists("audio_repo"):
+        print("Clonando el repositorio...")
+        git.Repo.clone_from("https://github.com/pecec1to/audio.git", "audio_repo")
+
+    # Actualizar el repositorio para evitar conflictos
+    repo = git.Repo("audio_repo")
+    origin = repo.remote(name='origin')
+    origin.pull()
 
-        # Actualizar el repositorio para evitar conflictos
-        repo = git.Repo("audio_repo")
-        origin = repo.remote(name='origin')
-        origin.pull()
+    # Ruta del archivo en el repositorio
+    repo_audio_path = os.path.join("audio_repo", audio_filename)
 
-        # Ruta del archivo en el repositorio
-        repo_audio_path = os.path.join("audio_repo", audio_filename)
+    # Copia archivo al repositorio
+    print(f"Copiando archivo {audio_path} al repositorio como {audio_filename}...")
+    shutil.copy2(audio_path, repo_audio_path)
 
-        # Copia archivo al repositorio
-        print(f"Copiando archivo {audio_path} al repositorio como {audio_filename}...")
-        shutil.copy2(audio_path, repo_audio_path)
+    # Añade archivo al repositorio
+    print("Añadiendo archivo al repositorio...")
+    repo.git.add(audio_filename)
 
-        # Añade archivo al repositorio
-        print("Añadiendo archivo al repositorio...")
-        repo.git.add(audio_filename)
+    # Commit
+    print("Haciendo commit...")
+    repo.index.commit(f"Actualizar archivo de audio {audio_filename}")
 
-        # Commit
-        print("Haciendo commit...")
-        repo.index.commit(f"Actualizar archivo de audio {audio_filename}")
+    # Push
+    print("Subiendo cambios a GitHub...")
+    origin.push()
 
-        # Push
-        print("Subiendo cambios a GitHub...")
-        origin.push()
+
+async def subir_y_reproducir_audio(audio_path: str, audio_filename: str, turno=TURNO_NULO):
+    """
+    Sube el audio a GitHub y lo reproduce en el robot.
+    """
+    try:
+        # Las operaciones de git bloquean: van en un hilo
+        with turno.etapa("git_push"):
+            await ejecutar(subir_a_github, audio_path, audio_filename)
 
         print("Archivo subido a GitHub. Esperando a que esté disponible...")
 
         # Esperar a que el archivo esté disponible en GitHub Pages
         # Incrementamos el tiempo de espera a 5 segundos
-        await asyncio.sleep(5)
+        with turno.etapa("espera_pages"):
+            await asyncio.sleep(5)
 
         # URL pública del archivo en GitHub Pages con invalidación de caché
         timestamp = int(time.time())
@@ -109,7 +118,9 @@ async def subir_y_reproducir_audio(audio_path: str, audio_filename: str):
             storage_type=AudioStorageType.NET_PUBLIC,
             volume=1.0
         )
-        result_type, response = await block.execute()
+        # La descarga desde GitHub Pages la hace el robot: queda dentro de play_audio
+        with turno.etapa("play_audio"):
+            result_type, response = await block.execute()
 
         if result_type == MiniApiResultType.Success and response.isSuccess:
             print("Audio reproducido exitosamente")
@@ -123,7 +134,7 @@ async def subir_y_reproducir_audio(audio_path: str, audio_filename: str):
         return False
 
 
-async def generar_reproducir_tts(texto: str):
+async def generar_reproducir_tts(texto: str, turno=TURNO_NULO):
     """
     Genera un archivo de audio TTS, lo sube a GitHub y lo reproduce en el robot.
     """
@@ -131,15 +142,20 @@ async def generar_reproducir_tts(texto: str):
         # Obtener directorio actual
         current_dir = os.getcwd()
 
-        # Generar un nombre único para el archivo
+        # Convertir texto a audio (si ya estaba en caché no se vuelve a sintetizar)
+        with turno.etapa("tts"):
+            _, audio = await ejecutar(obtener_cache().obtener_o_sintetizar, texto, timeout=TIMEOUT_TTS)
+        # Versión para el robot (mono, 16 kHz): menos que subir y que descargar
+        with turno.etapa("codificacion"):
+            audio, extension = await ejecutar(obtener_codificador().codificar, audio, timeout=TIMEOUT_TTS)
+
+        # Generar un nombre único para el archivo (con la extensión de lo que se ha codificado)
         unique_id = str(uuid.uuid4())[:8]
         timestamp = int(time.time())
-        audio_filename = f"respuesta_{unique_id}_{timestamp}.mp3"
+        audio_filename = f"respuesta_{unique_id}_{timestamp}.{extension}"
         audio_path = os.path.join(current_dir, audio_filename)
-
-        # Convertir texto a audio
-        tts = gTTS(text=texto, lang='es')
-        tts.save(audio_path)
+        with open(audio_path, "wb") as f:
+            f.write(audio)
 
         # Verificar si el archivo existe
         if not os.path.exists(audio_path):
@@ -149,7 +165,7 @@ async def generar_reproducir_tts(texto: str):
         # Intentar subir y reproducir el audio hasta 3 veces
         for intento in range(1, 4):
             print(f"Intento {intento} de subir y reproducir audio...")
-            success = await subir_y_reproducir_audio(audio_path, audio_filename)
+            success = await subir_y_reproducir_audio(audio_path, audio_filename, turno)
             if success:
                 break
             else:
@@ -167,7 +183,7 @@ async def generar_reproducir_tts(texto: str):
 async def _run():
     try:
         print("Buscando el robot...")
-        device = await MiniSdk.get_device_by_name("20256", 10)
+        device = await obtener_cache_dispositivos().buscar("20256", 10)
         if device:
             print("Robot encontrado, conectando...")
             is_connected = await MiniSdk.connect(device)
@@ -181,18 +197,49 @@ async def _run():
                 print("No se pudo entrar en modo programa")
                 return
 
+            # Crear el modelo antes del primer mensaje
+            await ejecutar(obtener_pool().calentar)
+
+            # Medir el retraso del loop durante la sesión
+            monitor_lag = MonitorLag()
+            monitor_lag.iniciar()
+
             print("Iniciando interacción con Gemini...")
             while True:
-                mensaje = input("Escribe un mensaje para Gemini (o 'salir' para terminar): ")
+                inicio_entrada = time.perf_counter()
+                mensaje = await leer_entrada("Escribe un mensaje para Gemini (o 'salir' para terminar): ")
                 if mensaje.lower() == 'salir':
                     break
 
-                # Respuesta del chatbot
-                respuesta = obtener_respuesta_chatbot(mensaje)
-                print(f"Respuesta de Gemini: {respuesta}")
-
-                # Generar y reproducir TTS
-                await generar_reproducir_tts(respuesta)
+                with trazador.turno("github_pages") as turno:
+                    turno.registrar("entrada", time.perf_counter() - inicio_entrada)
+
+                    # Respuesta del chatbot (en un hilo: el loop del robot sigue atendido)
+                    try:
+                        with turno.etapa("gemini"):
+                            respuesta = await ejecutar(obtener_respuesta_chatbot, mensaje, timeout=TIMEOUT_GEMINI)
+                    except asyncio.TimeoutError:
+                        print("Gemini no respondió a tiempo")
+                        turno.atributos["error"] = "timeout_gemini"
+                        continue
+                    print(f"Respuesta de Gemini: {respuesta}")
+
+                    # Actualizar historial; si se pasa del presupuesto se compacta en un resumen
+                    # (en un hilo y con su propio timeout, no con el de la respuesta)
+                    if respuesta != RESPUESTA_ERROR:
+                        chat_history.agregar(mensaje, respuesta, compactar=False)
+                        try:
+                            with turno.etapa("memoria"):
+                                await ejecutar(chat_history.compactar, timeout=TIMEOUT_GEMINI)
+                        except asyncio.TimeoutError:
+                            print("El resumen del historial no terminó a tiempo, se reintenta en el próximo turno")
+
+                    # Generar y reproducir TTS
+                    await generar_reproducir_tts(respuesta, turno)
+
+            print(f"Caché de respuestas: {obtener_cache_respuestas().estadisticas()}")
+            await monitor_lag.detener()
+            print(f"Retraso del loop: {monitor_lag.informe()}")
 
             print("Saliendo del modo programa...")
             await MiniSdk.quit_program()
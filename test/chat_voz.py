@@ -0,0 +1,215 @@
+import asyncio
+import inspect
+import time
+
+from trazas import percentil
+
+# Qué decir para terminar la conversación por voz
+PALABRA_SALIDA = "salir"
+
+
+class DetectorFinFrase:
+    """
+    Junta los textos de ObserveSpeechRecognise en frases completas
+
+    Una frase se da por terminada cuando pasan silencio_s sin eventos de reconocimiento
+    (o cuando dura más de max_frase_s) y entonces se llama a al_cerrar(texto, fin_habla),
+    con fin_habla el instante del último evento. Si el robot manda resultados parciales
+    que van creciendo ("hola", "hola qué", "hola qué tal") se queda con el último; si no,
+    los concatena. Todo va por temporizadores del loop: el handler del SDK nunca espera.
+    """
+
+    def __init__(self, al_cerrar, silencio_s: float = 0.8, max_frase_s: float = 15.0):
+        self.al_cerrar = al_cerrar
+        self.silencio_s = silencio_s
+        self.max_frase_s = max_frase_s
+        self._partes = []
+        self._inicio = None
+        self._ultimo = None
+        self._temporizador = None
+
+    def manejador(self, mensaje):
+        """
+        Handler para set_handler de ObserveSpeechRecognise
+        """
+        if mensaje.isSuccess and mensaje.text.strip():
+            self.agregar(mensaje.text.strip())
+
+    def agregar(self, texto: str):
+        loop = asyncio.get_running_loop()
+        ahora = loop.time()
+        if not self._partes:
+            self._inicio = ahora
+        if self._partes and texto.startswith(self._partes[-1]):
+            self._partes[-1] = texto
+        else:
+            self._partes.append(texto)
+        self._ultimo = ahora
+        if self._temporizador is not None:
+            self._temporizador.cancel()
+        if ahora - self._inicio >= self.max_frase_s:
+            self.cerrar()
+        else:
+            self._temporizador = loop.call_later(self.silencio_s, self.cerrar)
+
+    def descartar(self):
+        """
+        Olvida la frase a medias sin cerrarla
+        """
+        if self._temporizador is not None:
+            self._temporizador.cancel()
+            self._temporizador = None
+        self._partes = []
+
+    def cerrar(self):
+        if self._temporizador is not None:
+            self._temporizador.cancel()
+            self._temporizador = None
+        if not self._partes:
+            return
+        texto = " ".join(self._partes)
+        self._partes = []
+        self.al_cerrar(texto, self._ultimo)
+
+
+class ChatVoz:
+    """
+    Conversación manos libres: lo que se oye va a responder(texto) sin pasar por input()
+
+    El reconocimiento de voz sigue activo mientras el robot contesta; las frases que se
+    cierran entonces esperan en una cola de max_pendientes (se descartan las más
+    antiguas) o, con escuchar_mientras_habla=False, se tiran (para no contestarse a sí
+    mismo si el micrófono oye el altavoz). responder puede ser una función o una corrutina
+    y se llama en cuanto se cierra la frase. Con interrupcion (un ControladorInterrupcion)
+    hablar mientras el robot contesta corta la respuesta y lo dicho pasa a ser la
+    siguiente frase.
+    """
+
+    def __init__(self, responder, observador=None, silencio_s: float = 0.8, max_frase_s: float = 15.0,
+                 escuchar_mientras_habla: bool = True, max_pendientes: int = 2,
+                 palabra_salida: str = PALABRA_SALIDA, interrupcion=None):
+        self.responder = responder
+        self.interrupcion = interrupcion
+        self.escuchar_mientras_habla = escuchar_mientras_habla
+        self.palabra_salida = palabra_salida
+        self._observador = observador
+        self._detector = DetectorFinFrase(self._frase_cerrada, silencio_s, max_frase_s)
+        self._frases = asyncio.Queue(maxsize=max_pendientes)
+        self.hablando = False
+        # Métricas
+        self.eventos = 0
+        self.eventos_mientras_habla = 0
+        self.descartadas = 0
+        self.turnos = []
+
+    def _manejador(self, mensaje):
+        self.eventos += 1
+        if self.hablando:
+            self.eventos_mientras_habla += 1
+            if self.interrupcion is not None:
+                self.interrupcion.manejador_voz(mensaje)
+        self._detector.manejador(mensaje)
+
+    def _frase_cerrada(self, texto: str, fin_habla: float):
+        if self.hablando and not self.escuchar_mientras_habla:
+            self.descartadas += 1
+            return
+        if self._frases.full():
+            self._frases.get_nowait()
+            self.descartadas += 1
+        self._frases.put_nowait((texto, fin_habla, asyncio.get_running_loop().time()))
+
+    async def ejecutar(self):
+        """
+        Escucha y contesta hasta que se diga la palabra de salida
+        """
+        if self._observador is None:
+            from mini.apis.api_observe import ObserveSpeechRecognise
+            self._observador = ObserveSpeechRecognise()
+        self._observador.set_handler(self._manejador)
+        self._observador.start()
+        loop = asyncio.get_running_loop()
+        try:
+            while True:
+                texto, fin_habla, cierre = await self._frases.get()
+                print(f"Has dicho: {texto}")
+                if texto.lower().strip(" .!?¡¿") == self.palabra_salida:
+                    break
+                inicio = loop.time()
+                self.hablando = True
+                try:
+                    resultado = self.responder(texto)
+                    if inspect.isawaitable(resultado):
+                        await resultado
+                except Exception as e:
+                    print(f"Error al responder por voz: {e}")
+                finally:
+                    self.hablando = False
+                self.turnos.append({"texto": texto, "espera_s": inicio - fin_habla, "cola_s": inicio - cierre,
+                                    "respuesta_s": loop.time() - inicio})
+        finally:
+            self._observador.stop()
+            self._detector.descartar()
+
+    def metricas(self) -> dict:
+        esperas = sorted(t["espera_s"] for t in self.turnos)
+        return {
+            "turnos": len(self.turnos),
+            "eventos": self.eventos,
+            "eventos_mientras_habla": self.eventos_mientras_habla,
+            "descartadas": self.descartadas,
+            "fin_habla_a_peticion_p50_s": round(percentil(esperas, 50), 3),
+            "fin_habla_a_peticion_max_s": round(esperas[-1], 3) if esperas else 0.0,
+        }
+
+
+def guion_reconocimiento(frases: list) -> list:
+    """
+    Guion de SpeechRecogniseResponse para ObservadorGuionado a partir de
+    (segundos, texto): los textos que llegan seguidos forman la misma frase
+    """
+    from mini.pb2.codemao_speechrecognise_pb2 import SpeechRecogniseResponse
+    guion = []
+    for instante, texto in frases:
+        mensaje = SpeechRecogniseResponse()
+        mensaje.isSuccess = True
+        mensaje.text = texto
+        guion.append((instante, mensaje))
+    return guion
+
+
+async def _benchmark(silencio_s: float, latencia_respuesta: float):
+    from fakes import ObservadorGuionado
+
+    # Resultados parciales, una frase en dos trozos, una pregunta mientras el robot
+    # aún contesta y la palabra de salida
+    observador = ObservadorGuionado(guion_reconocimiento([
+        (0.2, "hola"), (0.4, "hola qué tal"), (0.6, "hola qué tal estás"),
+        (2.0, "cuéntame un chiste"), (2.5, "sobre robots"),
+        (4.5, "y otro"), (4.7, "y otro más"),
+        (8.0, "salir"),
+    ]))
+    peticiones = []
+
+    async def responder(texto):
+        peticiones.append((time.perf_counter(), texto))
+        # Gemini + TTS + reproducción en el robot
+        await asyncio.sleep(latencia_respuesta)
+
+    chat = ChatVoz(responder, observador, silencio_s=silencio_s)
+    inicio = time.perf_counter()
+    await chat.ejecutar()
+    for instante, texto in peticiones:
+        print(f"  {instante - inicio:5.2f}s petición: {texto}")
+    for turno in chat.turnos:
+        print(f"  '{turno['texto']}': fin de habla -> petición {turno['espera_s']:.3f}s "
+              f"(en cola {turno['cola_s']:.3f}s), respuesta {turno['respuesta_s']:.2f}s")
+    print(f"Silencio de fin de frase {silencio_s}s: {chat.metricas()}")
+
+
+def benchmark(silencio_s: float = 0.8, latencia_respuesta: float = 2.0):
+    asyncio.run(_benchmark(silencio_s, latencia_respuesta))
+
+
+if __name__ == '__main__':
+    benchmark()
@@ -0,0 +1,284 @@
+import hashlib
+import os
+import shutil
+import struct
+import subprocess
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+# Formato para el altavoz del robot: voz mono a 16 kHz en mp3 de 24 kbps
+FRECUENCIA = 16000
+KBPS = 24
+# ffmpeg (con libmp3lame) para leer y escribir mp3; la variable FFMPEG permite indicar otro binario
+FFMPEG = os.getenv("FFMPEG") or shutil.which("ffmpeg")
+
+
+def _leer_wav(datos: bytes):
+    """
+    (muestras int16 con forma (n, canales), frecuencia) de un WAV PCM de 16 bits, o None
+
+    Se lee a mano porque ffmpeg escribiendo a una tubería deja los tamaños de la cabecera sin rellenar.
+    """
+    if datos[:4] != b"RIFF" or datos[8:12] != b"WAVE":
+        return None
+    pos = 12
+    canales = frecuencia = None
+    while pos + 8 <= len(datos):
+        nombre, tamano = datos[pos:pos + 4], struct.unpack("<I", datos[pos + 4:pos + 8])[0]
+        pos += 8
+        if nombre == b"fmt ":
+            formato, canales, frecuencia = struct.unpack("<HHI", datos[pos:pos + 8])
+            bits = struct.unpack("<H", datos[pos + 14:pos + 16])[0]
+            if formato not in (1, 0xFFFE) or bits != 16:
+                return None
+        elif nombre == b"data":
+            if canales is None:
+                return None
+            fin = len(datos) if tamano in (0, 0xFFFFFFFF) else min(pos + tamano, len(datos))
+            fin -= (fin - pos) % (2 * canales)
+            return np.frombuffer(datos[pos:fin], dtype="<i2").reshape(-1, canales), frecuencia
+        pos += tamano + (tamano & 1)
+    return None
+
+
+def _escribir_wav(muestras: np.ndarray, frecuencia: int) -> bytes:
+    pcm = muestras.astype("<i2").tobytes()
+    return (b"RIFF" + struct.pack("<I", 36 + len(pcm)) + b"WAVEfmt " +
+            struct.pack("<IHHIIHH", 16, 1, 1, frecuencia, frecuencia * 2, 2, 16) +
+            b"data" + struct.pack("<I", len(pcm)) + pcm)
+
+
+def _ffmpeg(argumentos: list, entrada: bytes) -> bytes:
+    resultado = subprocess.run([FFMPEG, "-hide_banner", "-loglevel", "error", *argumentos],
+                               input=entrada, stdout=subprocess.PIPE, stderr=subprocess.PIPE, check=False)
+    if resultado.returncode != 0:
+        raise RuntimeError(f"ffmpeg falló: {resultado.stderr.decode(errors='replace').strip()}")
+    return resultado.stdout
+
+
+def extension_audio(audio: bytes) -> str:
+    """
+    Extensión que corresponde al contenido: "wav" si es RIFF/WAVE y "mp3" en otro caso
+    (gTTS y ffmpeg dan mp3)
+    """
+    return "wav" if audio[:4] == b"RIFF" and audio[8:12] == b"WAVE" else "mp3"
+
+
+def decodificar(audio: bytes):
+    """
+    (muestras, frecuencia) de un WAV directamente o de cualquier otro formato con ffmpeg
+    """
+    leido = _leer_wav(audio)
+    if leido is None and FFMPEG:
+        leido = _leer_wav(_ffmpeg(["-i", "pipe:0", "-f", "wav", "-acodec", "pcm_s16le", "pipe:1"], audio))
+    if leido is None:
+        raise ValueError("Formato de audio no soportado sin ffmpeg")
+    return leido
+
+
+def procesar(muestras: np.ndarray, frecuencia: int, destino: int = FRECUENCIA, recortar: bool = True,
+             umbral_db: float = -45.0, margen_s: float = 0.08) -> np.ndarray:
+    """
+    Voz lista para el robot: mono, sin silencios al principio y al final, a destino Hz
+    y normalizada a -1 dBFS. Devuelve float32 en [-1, 1].
+    """
+    senal = muestras.astype(np.float32).mean(axis=1) / 32768.0 if muestras.ndim == 2 \
+        else muestras.astype(np.float32) / 32768.0
+    if recortar and len(senal):
+        # Energía por tramos de 20 ms respecto al pico: lo que quede por debajo del umbral es silencio
+        tramo = max(1, int(frecuencia * 0.02))
+        n = len(senal) // tramo
+        if n:
+            rms = np.sqrt(np.mean(senal[:n * tramo].reshape(n, tramo) ** 2, axis=1))
+            voz = np.flatnonzero(rms > rms.max() * 10 ** (umbral_db / 20))
+            if len(voz):
+                margen = int(margen_s * frecuencia)
+                senal = senal[max(0, voz[0] * tramo - margen):min(len(senal), (voz[-1] + 1) * tramo + margen)]
+    if destino < frecuencia and len(senal):
+        # Paso bajo (sinc enventanada) antes de diezmar para no meter aliasing
+        corte = 0.45 * destino / frecuencia
+        k = np.arange(-32, 33)
+        filtro = 2 * corte * np.sinc(2 * corte * k) * np.hamming(len(k))
+        senal = np.convolve(senal, filtro / filtro.sum(), mode="same")
+        instantes = np.arange(int(len(senal) * destino / frecuencia)) * (frecuencia / destino)
+        senal = np.interp(instantes, np.arange(len(senal)), senal).astype(np.float32)
+    pico = np.abs(senal).max() if len(senal) else 0.0
+    if pico > 0:
+        senal = senal * (0.89 / pico)
+    return senal
+
+
+class CodificadorAudio:
+    """
+    Etapa entre la síntesis y la entrega: recodifica cada audio para el robot
+
+    La caché TTS sigue guardando el audio original (sus claves no cambian); aquí se
+    guarda el resultado por hash del original en una LRU de max_entradas, así una frase
+    repetida no se recodifica. Con ffmpeg la salida es mp3 mono de kbps; sin ffmpeg los
+    WAV (p.ej. de pyttsx3) se quedan en WAV de 16 bits a frecuencia y el resto pasa tal
+    cual. Si el resultado no es más pequeño, se entrega el original. Por eso codificar
+    devuelve también la extensión real ("mp3" o "wav") con la que hay que servirlo.
+    """
+
+    def __init__(self, frecuencia: int = FRECUENCIA, kbps: int = KBPS, recortar: bool = True,
+                 max_entradas: int = 256):
+        self.frecuencia = frecuencia
+        self.kbps = kbps
+        self.recortar = recortar
+        self.max_entradas = max_entradas
+        self._codificados = OrderedDict()
+        self._lock = threading.Lock()
+        self._aviso_ffmpeg = False
+        # Métricas
+        self.audios = 0
+        self.aciertos = 0
+        self.bytes_entrada = 0
+        self.bytes_salida = 0
+        self.segundos_voz = 0.0
+        self.tiempo_codificacion = 0.0
+
+    def _recodificar(self, audio: bytes):
+        """
+        (audio recodificado, segundos de voz que contiene)
+        """
+        if not FFMPEG and _leer_wav(audio) is None:
+            if not self._aviso_ffmpeg:
+                print("ffmpeg no encontrado: los audios se envían sin recodificar")
+                self._aviso_ffmpeg = True
+            return audio, 0.0
+        muestras, frecuencia = decodificar(audio)
+        senal = procesar(muestras, frecuencia, self.frecuencia, self.recortar)
+        frecuencia_salida = min(self.frecuencia, frecuencia)
+        segundos = len(senal) / frecuencia_salida
+        pcm = np.round(senal * 32767).astype("<i2")
+        if FFMPEG:
+            return _ffmpeg(["-f", "s16le", "-ar", str(frecuencia_salida), "-ac", "1", "-i", "pipe:0",
+                            "-acodec", "libmp3lame", "-b:a", f"{self.kbps}k", "-f", "mp3", "pipe:1"],
+                           pcm.tobytes()), segundos
+        return _escribir_wav(pcm, frecuencia_salida), segundos
+
+    def codificar(self, audio: bytes):
+        """
+        (audio para el robot, extensión "mp3" o "wav" según lo que sea realmente)
+        """
+        clave = hashlib.sha1(audio).hexdigest()
+        with self._lock:
+            codificado = self._codificados.get(clave)
+            if codificado is not None:
+                self._codificados.move_to_end(clave)
+                self.aciertos += 1
+                return codificado
+        inicio = time.perf_counter()
+        try:
+            recodificado, segundos = self._recodificar(audio)
+        except Exception as e:
+            print(f"Error al recodificar el audio, se envía el original: {e}")
+            recodificado, segundos = audio, 0.0
+        if len(recodificado) >= len(audio):
+            recodificado = audio
+        codificado = (recodificado, extension_audio(recodificado))
+        with self._lock:
+            self.tiempo_codificacion += time.perf_counter() - inicio
+            self.audios += 1
+            self.bytes_entrada += len(audio)
+            self.bytes_salida += len(recodificado)
+            self.segundos_voz += segundos
+            self._codificados[clave] = codificado
+            while len(self._codificados) > self.max_entradas:
+                self._codificados.popitem(last=False)
+        return codificado
+
+    def metricas(self) -> dict:
+        return {
+            "audios": self.audios,
+            "aciertos": self.aciertos,
+            "reduccion": round(1 - self.bytes_salida / self.bytes_entrada, 3) if self.bytes_entrada else 0.0,
+            "kbps_salida": round(self.bytes_salida * 8 / 1000 / self.segundos_voz, 1) if self.segundos_voz else 0.0,
+            "ms_por_audio": round(self.tiempo_codificacion / self.audios * 1000, 1) if self.audios else 0.0,
+        }
+
+
+_codificador = None
+
+
+def obtener_codificador() -> CodificadorAudio:
+    """
+    Codificador compartido por los scripts de chat
+    """
+    global _codificador
+    if _codificador is None:
+        _codificador = CodificadorAudio()
+    return _codificador
+
+
+def _voz_sintetica(segundos: float = 4.0, frecuencia: int = 22050, silencio_s: float = 0.6) -> bytes:
+    """
+    WAV tipo pyttsx3: sílabas armónicas con pausas y silencio al principio y al final
+    """
+    t = np.arange(int(segundos * frecuencia)) / frecuencia
+    tono = 140 + 30 * np.sin(2 * np.pi * 0.5 * t)
+    fase = 2 * np.cumsum(np.pi * tono / frecuencia)
+    voz = sum(np.sin(fase * h) / h for h in range(1, 12))
+    voz *= (np.sin(2 * np.pi * 3 * t) > -0.3) * 0.3
+    silencio = np.zeros(int(silencio_s * frecuencia))
+    senal = np.concatenate([silencio, voz, silencio]) + np.random.default_rng(1).normal(0, 1e-4, 2 * len(silencio) + len(t))
+    return _escribir_wav(np.round(senal * 32767).astype("<i2"), frecuencia)
+
+
+def benchmark(kbps_enlace: int = 512, ruta_muestras: str = "tts_demo/play_tts"):
+    import urllib.request
+    from servidor_audio import AlmacenAudio, ServidorAudioHTTP, url_audio
+
+    muestras = {"sintetica.wav": _voz_sintetica()}
+    if os.path.isdir(ruta_muestras):
+        for nombre in sorted(os.listdir(ruta_muestras)):
+            if nombre.endswith(".mp3"):
+                with open(os.path.join(ruta_muestras, nombre), "rb") as f:
+                    muestras[nombre] = f.read()
+    print(f"ffmpeg: {FFMPEG or 'no encontrado'}")
+
+    almacen = AlmacenAudio()
+    servidor = ServidorAudioHTTP(("127.0.0.1", 0), almacen)
+    threading.Thread(target=servidor.serve_forever, daemon=True).start()
+
+    def descargar(clave: str, extension: str) -> float:
+        # Lectura limitada a kbps_enlace, como la WiFi del robot con la red cargada
+        inicio = time.perf_counter()
+        recibidos = 0
+        with urllib.request.urlopen(url_audio("127.0.0.1", servidor.server_address[1], clave, extension)) as respuesta:
+            while True:
+                bloque = respuesta.read(4096)
+                if not bloque:
+                    break
+                recibidos += len(bloque)
+                espera = inicio + recibidos * 8 / (kbps_enlace * 1000) - time.perf_counter()
+                if espera > 0:
+                    time.sleep(espera)
+        return time.perf_counter() - inicio
+
+    codificador = CodificadorAudio()
+    for nombre, audio in muestras.items():
+        try:
+            original, frecuencia = decodificar(audio)
+        except ValueError:
+            print(f"{nombre}: mp3 sin ffmpeg, se envía tal cual ({len(audio) / 1024:.0f} KiB)")
+            continue
+        duracion = len(original) / frecuencia
+        codificado, extension = codificador.codificar(audio)
+        recodificado, frecuencia_salida = decodificar(codificado)
+        extension_original = extension_audio(audio)
+        t_original = descargar(almacen.guardar(audio, extension=extension_original), extension_original)
+        t_codificado = descargar(almacen.guardar(codificado, extension=extension), extension)
+        print(f"{nombre}: {len(audio) / 1024:.0f} KiB ({len(audio) * 8 / 1000 / duracion:.0f} kbps, {duracion:.2f}s) -> "
+              f"{len(codificado) / 1024:.0f} KiB {extension} ({len(recodificado) / frecuencia_salida:.2f}s a {frecuencia_salida} Hz); "
+              f"descarga a {kbps_enlace} kbps: {t_original * 1000:.0f} ms -> {t_codificado * 1000:.0f} ms")
+    codificador.codificar(muestras["sintetica.wav"])
+    print(f"Codificador: {codificador.metricas()}")
+    servidor.shutdown()
+
+
+if __name__ == '__main__':
+    benchmark()
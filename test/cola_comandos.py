@@ -0,0 +1,268 @@
+import asyncio
+import contextlib
+import itertools
+import time
+
+from comandos_robot import Comando
+
+# Recurso del robot que ocupa cada bloque: los de un mismo recurso se ejecutan en orden,
+# uno tras otro; los de recursos distintos van en paralelo. Los que no están aquí
+# (lecturas de sensores, consultas...) no tienen orden y solo cuentan para el límite global.
+RECURSOS = {
+    "StartPlayTTS": "voz",
+    "PlayAudio": "voz",
+    "PlayAction": "movimiento",
+    "PlayCustomAction": "movimiento",
+    "MoveRobot": "movimiento",
+    "PlayExpression": "expresion",
+    "PlayBehavior": "expresion",
+    "SetMouthLampNormal": "luces",
+    "SetMouthLampBreath": "luces",
+    "SwitchMouthLamp": "luces",
+}
+
+# Bloques que paran un recurso: no pueden esperar en su carril, porque lo ocupa justo lo
+# que tienen que parar (PlayAudio no responde hasta que acaba el audio). Se mandan al
+# momento, sin pasar por el límite de en vuelo, y descartan lo que esperaba en el carril.
+PARADAS = {
+    "StopPlayTTS": "voz",
+    "StopAllAudio": "voz",
+    "StopAllAction": "movimiento",
+    "StopCustomAction": "movimiento",
+    "StopBehavior": "expresion",
+}
+
+
+def recurso_de(comando: Comando):
+    return RECURSOS.get(comando.clase)
+
+
+class PeticionComando:
+    """
+    Un comando encolado: id de correlación, recurso y futuro con su resultado
+    """
+
+    def __init__(self, id_correlacion: int, comando: Comando, recurso):
+        self.id = id_correlacion
+        self.comando = comando
+        self.recurso = recurso
+        self.futuro = asyncio.get_running_loop().create_future()
+        self.encolado = time.perf_counter()
+        self.enviado = None
+        self.terminado = None
+
+    def __await__(self):
+        return self.futuro.__await__()
+
+    def __repr__(self):
+        return f"#{self.id} {self.comando!r} [{self.recurso or 'libre'}]"
+
+
+class ColaComandos:
+    """
+    Tubería de comandos al robot con varios bloques en vuelo a la vez
+
+    ejecutar(comando) es la corrutina que manda un bloque y espera su respuesta (por
+    ejemplo SupervisorConexion.ejecutar o ConexionSdk.ejecutar); el SDK ya correlaciona
+    cada respuesta con su petición por el id del mensaje, así que puede haber hasta
+    max_en_vuelo llamadas abiertas. Cada recurso (voz, movimiento...) tiene su propio
+    carril ordenado con una cola de max_cola comandos: si se llena, enviar() espera
+    (contrapresión) en lugar de acumular trabajo sin límite. Un carril tiene como mucho
+    un comando en vuelo, así que max_en_vuelo limita la suma de carriles y comandos sin
+    recurso, no el habla. Las paradas de PARADAS se adelantan a todo: se mandan al momento
+    y los comandos que esperaban en el carril parado terminan cancelados.
+    """
+
+    def __init__(self, ejecutar, max_en_vuelo: int = 8, max_cola: int = 32, recursos: dict = None,
+                 paradas: dict = None):
+        self._ejecutar = ejecutar
+        self.max_en_vuelo = max_en_vuelo
+        self.max_cola = max_cola
+        self._recursos = RECURSOS if recursos is None else recursos
+        self._paradas = PARADAS if paradas is None else paradas
+        self._en_vuelo = asyncio.Semaphore(max_en_vuelo)
+        self._ids = itertools.count(1)
+        self._carriles = {}
+        self._tareas_carril = []
+        self._libres = set()
+        self._pendientes = {}
+        # Métricas
+        self.completados = 0
+        self.fallidos = 0
+        self.descartados = 0
+        self.max_en_vuelo_observado = 0
+        self._abiertos = 0
+        self._latencias = {}
+        self._inicio = time.perf_counter()
+
+    def _carril(self, recurso: str) -> asyncio.Queue:
+        carril = self._carriles.get(recurso)
+        if carril is None:
+            carril = asyncio.Queue(maxsize=self.max_cola)
+            self._carriles[recurso] = carril
+            self._tareas_carril.append(asyncio.create_task(self._vaciar_carril(carril)))
+        return carril
+
+    async def _vaciar_carril(self, carril: asyncio.Queue):
+        while True:
+            peticion = await carril.get()
+            try:
+                await self._mandar(peticion)
+            finally:
+                carril.task_done()
+
+    def _descartar_carril(self, recurso: str):
+        carril = self._carriles.get(recurso)
+        while carril is not None and not carril.empty():
+            peticion = carril.get_nowait()
+            carril.task_done()
+            self._pendientes.pop(peticion.id, None)
+            peticion.futuro.cancel()
+            self.descartados += 1
+
+    def _lanzar(self, peticion: PeticionComando, limitar: bool = True):
+        tarea = asyncio.create_task(self._mandar(peticion, limitar))
+        self._libres.add(tarea)
+        tarea.add_done_callback(self._libres.discard)
+
+    async def _mandar(self, peticion: PeticionComando, limitar: bool = True):
+        async with self._en_vuelo if limitar else contextlib.nullcontext():
+            self._abiertos += 1
+            self.max_en_vuelo_observado = max(self.max_en_vuelo_observado, self._abiertos)
+            peticion.enviado = time.perf_counter()
+            try:
+                resultado = await self._ejecutar(peticion.comando)
+            except Exception as e:
+                self.fallidos += 1
+                if not peticion.futuro.done():
+                    peticion.futuro.set_exception(e)
+            else:
+                self.completados += 1
+                if not peticion.futuro.done():
+                    peticion.futuro.set_result(resultado)
+            finally:
+                self._abiertos -= 1
+                peticion.terminado = time.perf_counter()
+                self._pendientes.pop(peticion.id, None)
+                self._latencias.setdefault(peticion.recurso or "libre", []).append(
+                    peticion.terminado - peticion.encolado)
+
+    async def enviar(self, comando: Comando, recurso: str = None) -> PeticionComando:
+        """
+        Encola el comando y devuelve su petición (await peticion da el resultado)
+
+        Espera si el carril del recurso está lleno. recurso sustituye al de RECURSOS.
+        """
+        parado = self._paradas.get(comando.clase) if recurso is None else None
+        recurso = recurso or parado or self._recursos.get(comando.clase)
+        peticion = PeticionComando(next(self._ids), comando, recurso)
+        self._pendientes[peticion.id] = peticion
+        if parado is not None:
+            # Se adelanta al carril: lo que estaba esperando ya no debe sonar ni moverse
+            self._descartar_carril(parado)
+            self._lanzar(peticion, limitar=False)
+        elif recurso is None:
+            # Sin orden: la contrapresión la pone el límite de comandos sin terminar
+            while len(self._libres) >= self.max_cola:
+                await asyncio.wait(self._libres, return_when=asyncio.FIRST_COMPLETED)
+            self._lanzar(peticion)
+        else:
+            await self._carril(recurso).put(peticion)
+        return peticion
+
+    async def ejecutar(self, comando: Comando, recurso: str = None):
+        """
+        Encola el comando y espera su resultado
+        """
+        return await (await self.enviar(comando, recurso))
+
+    def pendiente(self, id_correlacion: int):
+        return self._pendientes.get(id_correlacion)
+
+    async def esperar_todo(self):
+        for carril in list(self._carriles.values()):
+            await carril.join()
+        if self._libres:
+            await asyncio.wait(set(self._libres))
+
+    async def cerrar(self):
+        await self.esperar_todo()
+        for tarea in self._tareas_carril:
+            tarea.cancel()
+        await asyncio.gather(*self._tareas_carril, return_exceptions=True)
+        self._tareas_carril.clear()
+        self._carriles.clear()
+
+    def metricas(self) -> dict:
+        duracion = time.perf_counter() - self._inicio
+        return {
+            "completados": self.completados,
+            "fallidos": self.fallidos,
+            "descartados": self.descartados,
+            "comandos_s": round(self.completados / duracion, 1) if duracion else 0.0,
+            "max_en_vuelo": self.max_en_vuelo_observado,
+            "latencia_media_s": {r: round(sum(l) / len(l), 3) for r, l in self._latencias.items()},
+        }
+
+
+async def _benchmark(comandos: int, latencia: float):
+    from fakes import ConexionRobotFalso, ServidorRobotFalso
+    from comandos_robot import play_action, play_expression, start_play_tts, stop_all_audio
+
+    robot = await ServidorRobotFalso("Mini_AA20256", latencia_comando=latencia).iniciar()
+    conexion = ConexionRobotFalso({"address": "127.0.0.1", "port": robot.puerto})
+    await conexion.conectar()
+
+    def carga(n):
+        # Mezcla de habla, gestos, expresiones y lecturas de sensores
+        tipos = [lambda i: start_play_tts(f"frase {i}"), lambda i: play_action(f"0{i % 30:02d}"),
+                 lambda i: play_expression("codemao1"), lambda i: Comando("mini.apis.api_sence", "GetInfraredDistance")]
+        return [tipos[i % len(tipos)](i) for i in range(n)]
+
+    inicio = time.perf_counter()
+    for comando in carga(comandos // 4):
+        await conexion.ejecutar(comando)
+    secuencial = comandos // 4 / (time.perf_counter() - inicio)
+    print(f"Uno tras otro: {secuencial:.1f} comandos/s")
+
+    for max_en_vuelo in (1, 4, 16):
+        robot.comandos.clear()
+        cola = ColaComandos(conexion.ejecutar, max_en_vuelo=max_en_vuelo)
+        inicio = time.perf_counter()
+        for comando in carga(comandos):
+            await cola.enviar(comando)
+        await cola.esperar_todo()
+        duracion = time.perf_counter() - inicio
+        await cola.cerrar()
+
+        # El habla tiene que haber llegado al robot en el mismo orden en que se pidió
+        frases = [c for c in robot.comandos if c.startswith("StartPlayTTS")]
+        ordenado = frases == [repr(c) for c in carga(comandos) if c.clase == "StartPlayTTS"]
+        metricas = cola.metricas()
+        print(f"max_en_vuelo={max_en_vuelo}: {comandos / duracion:.1f} comandos/s, "
+              f"en vuelo máx {metricas['max_en_vuelo']}, habla en orden: {ordenado}, "
+              f"latencia media por recurso {metricas['latencia_media_s']}")
+
+    # Barge-in: StopAllAudio con el carril de voz ocupado y frases esperando detrás
+    cola = ColaComandos(conexion.ejecutar)
+    frases = [await cola.enviar(start_play_tts(f"respuesta {i}")) for i in range(10)]
+    await asyncio.sleep(latencia / 2)
+    inicio = time.perf_counter()
+    await cola.ejecutar(stop_all_audio())
+    parada = time.perf_counter() - inicio
+    await cola.esperar_todo()
+    canceladas = sum(f.futuro.cancelled() for f in frases)
+    print(f"StopAllAudio con {len(frases)} frases en el carril de voz: respondido en {parada * 1000:.0f} ms, "
+          f"{canceladas} frases descartadas, {cola.metricas()['descartados']} descartados")
+    await cola.cerrar()
+
+    await conexion.cerrar()
+    await robot.detener()
+
+
+def benchmark(comandos: int = 200, latencia: float = 0.02):
+    asyncio.run(_benchmark(comandos, latencia))
+
+
+if __name__ == '__main__':
+    benchmark()
@@ -0,0 +1,82 @@
+import importlib
+
+# Bloques del SDK para un robot: descripción serializable (Comando), atajos de los más
+# usados y la conexión real por MiniSdk. Los usan el supervisor de la conexión, la cola
+# de comandos, los scripts de chat y la flota.
+
+TIMEOUT_CONEXION = 20
+TIMEOUT_COMANDO = 15
+# PlayAudio no contesta hasta que termina el audio: mismo límite que el SDK (DEFAULT_TIMEOUT)
+TIMEOUT_REPRODUCCION = 300
+
+
+class Comando:
+    """
+    Bloque del SDK descrito por módulo, clase y argumentos, para mandarlo a otro proceso
+    """
+
+    def __init__(self, modulo: str, clase: str, **argumentos):
+        self.modulo = modulo
+        self.clase = clase
+        self.argumentos = argumentos
+
+    def crear_bloque(self):
+        return getattr(importlib.import_module(self.modulo), self.clase)(**self.argumentos)
+
+    def __repr__(self):
+        argumentos = ", ".join(f"{k}={v!r}" for k, v in self.argumentos.items())
+        return f"{self.clase}({argumentos})"
+
+
+def play_action(action_name: str) -> Comando:
+    return Comando("mini.apis.api_action", "PlayAction", action_name=action_name)
+
+
+def start_play_tts(text: str) -> Comando:
+    return Comando("mini.apis.api_sound", "StartPlayTTS", text=text)
+
+
+def play_expression(express_name: str) -> Comando:
+    return Comando("mini.apis.api_expression", "PlayExpression", express_name=express_name)
+
+
+def play_audio(url: str, volume: float = 1.0) -> Comando:
+    from mini import AudioStorageType
+    return Comando("mini.apis.api_sound", "PlayAudio", url=url, storage_type=AudioStorageType.NET_PUBLIC,
+                   volume=volume)
+
+
+def stop_all_audio() -> Comando:
+    return Comando("mini.apis.api_sound", "StopAllAudio")
+
+
+class ConexionSdk:
+    """
+    Conexión real con un robot a través de MiniSdk (dentro del proceso de ese robot)
+    """
+
+    def __init__(self, dispositivo: dict):
+        self.dispositivo = dispositivo
+
+    async def conectar(self) -> bool:
+        import mini.mini_sdk as MiniSdk
+        from mini.dns.dns_browser import WiFiDevice
+        MiniSdk.set_robot_type(MiniSdk.RobotType.MINI)
+        d = self.dispositivo
+        return await MiniSdk.connect(WiFiDevice(d["name"], d["address"], d["port"], d["type"], d["server"]))
+
+    async def entrar_programa(self) -> bool:
+        import mini.mini_sdk as MiniSdk
+        return await MiniSdk.enter_program()
+
+    async def ejecutar(self, comando: Comando):
+        from mini import MiniApiResultType
+        result_type, response = await comando.crear_bloque().execute()
+        exito = result_type == MiniApiResultType.Success and getattr(response, "isSuccess", True)
+        codigo = getattr(response, "resultCode", None)
+        return exito, result_type.name if codigo is None else f"{result_type.name} ({codigo})"
+
+    async def cerrar(self):
+        import mini.mini_sdk as MiniSdk
+        await MiniSdk.quit_program()
+        await MiniSdk.release()
@@ -0,0 +1,106 @@
+import asyncio
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from trazas import percentil
+
+# Hilos para las llamadas bloqueantes (Gemini, gTTS, git); así no se congela el loop del robot
+MAX_HILOS = 4
+TIMEOUT_GEMINI = 30
+TIMEOUT_TTS = 20
+
+_ejecutor = None
+# input() se queda esperando al usuario: va en su propio hilo para no ocupar el pool
+_ejecutor_entrada = ThreadPoolExecutor(max_workers=1, thread_name_prefix="entrada")
+
+
+def obtener_ejecutor() -> ThreadPoolExecutor:
+    global _ejecutor
+    if _ejecutor is None:
+        _ejecutor = ThreadPoolExecutor(max_workers=MAX_HILOS, thread_name_prefix="bloqueante")
+    return _ejecutor
+
+
+async def ejecutar(funcion, *args, timeout: float = None):
+    """
+    Ejecuta una función bloqueante en el pool de hilos sin bloquear el loop
+
+    Si vence el timeout (o se cancela la tarea) se lanza asyncio.TimeoutError /
+    CancelledError; si la función aún no había empezado se descarta, si ya estaba
+    en marcha su resultado se ignora.
+    """
+    loop = asyncio.get_running_loop()
+    futuro = loop.run_in_executor(obtener_ejecutor(), funcion, *args)
+    try:
+        return await asyncio.wait_for(futuro, timeout)
+    except (asyncio.TimeoutError, asyncio.CancelledError):
+        futuro.cancel()
+        raise
+
+
+async def leer_entrada(mensaje: str) -> str:
+    """
+    input() sin bloquear el loop (el robot y los observadores siguen atendidos)
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_ejecutor_entrada, input, mensaje)
+
+
+class MonitorLag:
+    """
+    Mide el retraso del loop de asyncio: cuánto tarda en despertar un sleep(intervalo)
+    por encima de lo pedido. Un lag alto significa que algo bloqueó el loop.
+    """
+
+    def __init__(self, intervalo: float = 0.05, max_muestras: int = 10000):
+        self.intervalo = intervalo
+        self.muestras = deque(maxlen=max_muestras)
+        self._tarea = None
+
+    def iniciar(self):
+        self._tarea = asyncio.create_task(self._medir())
+
+    async def detener(self):
+        if self._tarea:
+            self._tarea.cancel()
+            await asyncio.gather(self._tarea, return_exceptions=True)
+            self._tarea = None
+
+    async def _medir(self):
+        while True:
+            inicio = time.perf_counter()
+            await asyncio.sleep(self.intervalo)
+            self.muestras.append(max(time.perf_counter() - inicio - self.intervalo, 0.0))
+
+    def informe(self) -> dict:
+        if not self.muestras:
+            return {"muestras": 0}
+        ordenadas = sorted(self.muestras)
+        return {
+            "muestras": len(ordenadas),
+            "p50_ms": percentil(ordenadas, 50) * 1000,
+            "p95_ms": percentil(ordenadas, 95) * 1000,
+            "max_ms": ordenadas[-1] * 1000,
+        }
+
+
+async def benchmark(duracion_llamada: float = 1.0):
+    """
+    Lag del loop con una llamada bloqueante directa frente a la misma llamada en el pool
+    """
+    for nombre, en_pool in (("llamada directa", False), ("llamada en el pool", True)):
+        monitor = MonitorLag(intervalo=0.01)
+        monitor.iniciar()
+        await asyncio.sleep(0.05)
+        if en_pool:
+            await ejecutar(time.sleep, duracion_llamada, timeout=duracion_llamada + 1)
+        else:
+            time.sleep(duracion_llamada)
+        await asyncio.sleep(0.05)
+        await monitor.detener()
+        print(f"{nombre}: {monitor.informe()}")
+
+
+if __name__ == '__main__':
+    asyncio.run(benchmark())
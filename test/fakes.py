@@ -0,0 +1,513 @@
+import asyncio
+import json
+import threading
+import time
+import urllib.request
+
+
+# Sustitutos locales para medir el flujo de chat sin robot, sin clave de Gemini y sin internet
+
+
+class RespuestaGeminiFalsa:
+    """
+    Respuesta con la misma forma que la de genai: atributo text e iterable por fragmentos
+    """
+
+    def __init__(self, fragmentos: list, latencia_fragmento: float = 0.0):
+        self._fragmentos = fragmentos
+        self._latencia_fragmento = latencia_fragmento
+
+    @property
+    def text(self) -> str:
+        return "".join(f.text for f in self._fragmentos)
+
+    def __iter__(self):
+        for fragmento in self._fragmentos:
+            if self._latencia_fragmento:
+                time.sleep(self._latencia_fragmento)
+            yield fragmento
+
+
+class FragmentoGeminiFalso:
+    def __init__(self, text: str):
+        self.text = text
+
+
+class ChatGeminiFalso:
+    """
+    Imita a genai.ChatSession: guarda historial y delega en el modelo falso
+    """
+
+    def __init__(self, modelo, history=None):
+        self.modelo = modelo
+        self.history = list(history or [])
+
+    def send_message(self, mensaje, stream: bool = False):
+        respuesta = self.modelo.generate_content(mensaje, stream=stream, historial=self.history)
+        self.history.append({"role": "user", "parts": [mensaje]})
+        self.history.append({"role": "model", "parts": [respuesta.text]})
+        return respuesta
+
+
+class ModeloGeminiFalso:
+    """
+    Imita a genai.GenerativeModel con latencias configurables
+
+    latencia_setup se paga una sola vez por modelo (equivalente a abrir el canal),
+    latencia es el tiempo hasta el primer fragmento y latencia_fragmento el tiempo
+    entre fragmentos cuando se pide stream=True.
+    """
+
+    def __init__(self, model_name: str = "gemini-2.0-flash", latencia_setup: float = 0.0,
+                 latencia: float = 0.0, latencia_fragmento: float = 0.0, respuesta=None,
+                 palabras_por_fragmento: int = 4):
+        self.model_name = model_name
+        self.latencia_setup = latencia_setup
+        self.latencia = latencia
+        self.latencia_fragmento = latencia_fragmento
+        self.respuesta = respuesta or (lambda mensaje: f"Respuesta a: {mensaje}. Gracias por preguntar.")
+        self.palabras_por_fragmento = palabras_por_fragmento
+        self.llamadas = 0
+        self.bytes_prompt = []
+        self._canal_abierto = False
+        self._lock = threading.Lock()
+
+    def _abrir_canal(self):
+        with self._lock:
+            if not self._canal_abierto:
+                time.sleep(self.latencia_setup)
+                self._canal_abierto = True
+
+    def start_chat(self, history=None):
+        return ChatGeminiFalso(self, history)
+
+    def count_tokens(self, contenido):
+        self._abrir_canal()
+        return len(str(contenido)) // 4
+
+    def generate_content(self, mensaje, stream: bool = False, historial=None):
+        self._abrir_canal()
+        self.llamadas += 1
+        prompt = "".join(str(p) for h in (historial or []) for p in h["parts"]) + str(mensaje)
+        self.bytes_prompt.append(len(prompt.encode("utf-8")))
+        time.sleep(self.latencia)
+
+        palabras = self.respuesta(mensaje).split(" ")
+        n = self.palabras_por_fragmento
+        fragmentos = [FragmentoGeminiFalso(" ".join(palabras[i:i + n]) + (" " if i + n < len(palabras) else ""))
+                      for i in range(0, len(palabras), n)]
+        if not stream:
+            time.sleep(self.latencia_fragmento * max(len(fragmentos) - 1, 0))
+            return RespuestaGeminiFalsa(fragmentos)
+        return RespuestaGeminiFalsa(fragmentos, self.latencia_fragmento)
+
+
+class TTSFalso:
+    """
+    Sustituto de gTTS: devuelve bytes de mp3 de un tamaño fijo tras una latencia
+
+    La latencia total es latencia + latencia_caracter * len(texto), como en un motor real
+    que tarda más con textos largos.
+    """
+
+    def __init__(self, tamano: int = 24 * 1024, latencia: float = 0.0, latencia_caracter: float = 0.0):
+        self.tamano = tamano
+        self.latencia = latencia
+        self.latencia_caracter = latencia_caracter
+        self.llamadas = 0
+        self._lock = threading.Lock()
+
+    def __call__(self, texto: str, idioma: str = "es") -> bytes:
+        with self._lock:
+            self.llamadas += 1
+        time.sleep(self.latencia + self.latencia_caracter * len(texto))
+        # Cabecera ID3 vacía seguida de marcas de trama MPEG, suficiente para parecer un mp3
+        cabecera = b"ID3\x04\x00\x00\x00\x00\x00\x00"
+        cuerpo = (b"\xff\xfb\x90\x64" + texto.encode("utf-8")[:28].ljust(28, b"\x00")) * (self.tamano // 32 + 1)
+        return (cabecera + cuerpo)[:self.tamano]
+
+
+class RespuestaPlayAudioFalsa:
+    def __init__(self, isSuccess: bool, resultCode: int = 0):
+        self.isSuccess = isSuccess
+        self.resultCode = resultCode
+
+
+class RobotFalso:
+    """
+    Robot que acepta PlayAudio: descarga la URL por HTTP y "reproduce" el audio
+
+    La reproducción dura len(audio) / bytes_por_segundo segundos (16000 B/s es un mp3
+    de 128 kbps) multiplicado por factor_reproduccion, para acelerar las pruebas.
+    """
+
+    def __init__(self, name: str = "Mini_20256", address: str = "127.0.0.1", latencia_comando: float = 0.0,
+                 bytes_por_segundo: int = 16000, factor_reproduccion: float = 1.0, timeout: float = 10):
+        self.name = name
+        self.address = address
+        self.latencia_comando = latencia_comando
+        self.bytes_por_segundo = bytes_por_segundo
+        self.factor_reproduccion = factor_reproduccion
+        self.timeout = timeout
+        self.reproducidos = []
+
+    def _descargar(self, url: str) -> bytes:
+        with urllib.request.urlopen(url, timeout=self.timeout) as respuesta:
+            return respuesta.read()
+
+    async def play_audio(self, url: str, storage_type=None, volume: float = 1.0):
+        """
+        Equivalente a PlayAudio(url=...).execute(): devuelve (éxito, respuesta)
+        """
+        await asyncio.sleep(self.latencia_comando)
+        inicio = time.perf_counter()
+        try:
+            audio = await asyncio.get_running_loop().run_in_executor(None, self._descargar, url)
+        except Exception as e:
+            print(f"[RobotFalso] Error al descargar {url}: {e}")
+            return False, RespuestaPlayAudioFalsa(False, 404)
+        descarga = time.perf_counter() - inicio
+        await asyncio.sleep(len(audio) / self.bytes_por_segundo * self.factor_reproduccion)
+        self.reproducidos.append({"url": url, "bytes": len(audio), "descarga_s": descarga})
+        return True, RespuestaPlayAudioFalsa(True)
+
+    async def reproducir(self, url: str) -> bool:
+        exito, respuesta = await self.play_audio(url)
+        return exito and respuesta.isSuccess
+
+
+class NavegadorFalso:
+    """
+    Imita a mini.dns.dns_browser.browser(): avisa a los listeners desde otro hilo
+
+    Cada start_scan vuelve a anunciar (on_device_found) todos los robots presentes
+    tras latencia_descubrimiento segundos, como hace zeroconf al reiniciar el escaneo.
+    """
+
+    def __init__(self, latencia_descubrimiento: float = 0.0):
+        self.latencia_descubrimiento = latencia_descubrimiento
+        self.robots = {}
+        self.escaneos = 0
+        self._listeners = set()
+        self._escaneando = False
+        self._lock = threading.Lock()
+
+    def add_listener(self, listener):
+        if listener is not None:
+            self._listeners.add(listener)
+
+    def remove_listener(self, listener):
+        self._listeners.discard(listener)
+
+    def remove_all_listener(self):
+        self._listeners.clear()
+
+    def _avisar(self, metodo: str, device):
+        for listener in list(self._listeners):
+            getattr(listener, metodo)(device)
+
+    def _anunciar(self, escaneo: int):
+        time.sleep(self.latencia_descubrimiento)
+        with self._lock:
+            if not self._escaneando or escaneo != self.escaneos:
+                return
+            robots = list(self.robots.values())
+        for device in robots:
+            self._avisar("on_device_found", device)
+
+    def start_scan(self, timeout: int = 0) -> bool:
+        with self._lock:
+            self.escaneos += 1
+            self._escaneando = True
+            escaneo = self.escaneos
+        threading.Thread(target=self._anunciar, args=(escaneo,), daemon=True).start()
+        return True
+
+    def stop_scan(self) -> bool:
+        with self._lock:
+            self._escaneando = False
+        return True
+
+    def agregar(self, nombre: str, direccion: str, puerto: int = 8800):
+        from mini.dns.dns_browser import WiFiDevice
+        device = WiFiDevice(nombre, direccion, puerto, "_Dedu_mini_channel_server._tcp.local.", f"{nombre}.local.")
+        with self._lock:
+            nuevo = nombre not in self.robots
+            self.robots[nombre] = device
+            escaneando = self._escaneando
+        if escaneando:
+            self._avisar("on_device_found" if nuevo else "on_device_updated", device)
+        return device
+
+    def quitar(self, nombre: str, avisar: bool = True):
+        """
+        Con avisar=False el robot desaparece sin despedirse (apagado o fuera de la red)
+        """
+        with self._lock:
+            device = self.robots.pop(nombre, None)
+            escaneando = self._escaneando
+        if device is not None and avisar and escaneando:
+            self._avisar("on_device_removed", device)
+
+
+class ServidorRobotFalso:
+    """
+    Endpoint TCP local que hace de robot: responde a cada comando tras su latencia
+
+    Protocolo de líneas JSON {"id", "metodo", "comando"} -> {"id", "exito", "detalle"};
+    como el websocket del SDK, varias peticiones pueden estar en curso a la vez.
+    Se usa con ConexionRobotFalso, que ocupa el lugar de la conexión del SDK.
+    """
+
+    def __init__(self, nombre: str, latencia_comando: float = 0.1, latencia_conexion: float = 0.0,
+                 latencia_programa: float = 0.0):
+        self.nombre = nombre
+        self.latencia_comando = latencia_comando
+        self.latencia_conexion = latencia_conexion
+        self.latencia_programa = latencia_programa
+        self.comandos = []
+        self.puerto = None
+        self.host = None
+        self._servidor = None
+        self._tareas = set()
+
+    async def iniciar(self, host: str = "127.0.0.1"):
+        self.host = host
+        self._servidor = await asyncio.start_server(self._atender, host, self.puerto or 0)
+        self.puerto = self._servidor.sockets[0].getsockname()[1]
+        return self
+
+    async def detener(self):
+        self._servidor.close()
+        tareas = list(self._tareas)
+        for tarea in tareas:
+            tarea.cancel()
+        await asyncio.gather(*tareas, return_exceptions=True)
+        await self._servidor.wait_closed()
+
+    async def caer(self, duracion: float = 0.0):
+        """
+        Corta todas las conexiones y deja de escuchar durante duracion segundos
+        (como un robot que pierde la WiFi), luego vuelve a aceptar en el mismo puerto
+        """
+        await self.detener()
+        if duracion:
+            await asyncio.sleep(duracion)
+        await self.iniciar(self.host)
+
+    async def _responder(self, peticion: dict, escritor):
+        metodo = peticion["metodo"]
+        if metodo == "conectar":
+            await asyncio.sleep(self.latencia_conexion)
+        elif metodo == "entrar_programa":
+            await asyncio.sleep(self.latencia_programa)
+        elif metodo == "ejecutar":
+            await asyncio.sleep(self.latencia_comando)
+            self.comandos.append(peticion["comando"])
+        escritor.write((json.dumps({"id": peticion.get("id"), "exito": True, "detalle": "Success"}) + "\n").encode())
+        await escritor.drain()
+
+    async def _atender(self, lector, escritor):
+        conexion = asyncio.current_task()
+        self._tareas.add(conexion)
+        pendientes = set()
+        try:
+            while linea := await lector.readline():
+                tarea = asyncio.create_task(self._responder(json.loads(linea), escritor))
+                pendientes.add(tarea)
+                tarea.add_done_callback(pendientes.discard)
+        except (ConnectionError, asyncio.CancelledError):
+            pass
+        finally:
+            for tarea in pendientes:
+                tarea.cancel()
+            await asyncio.gather(*pendientes, return_exceptions=True)
+            self._tareas.discard(conexion)
+            escritor.close()
+
+
+class ConexionRobotFalso:
+    """
+    Conexión con un ServidorRobotFalso con la misma interfaz que comandos_robot.ConexionSdk
+    """
+
+    def __init__(self, dispositivo: dict):
+        self.dispositivo = dispositivo
+        self._escritor = None
+        self._lector_tarea = None
+        self._pendientes = {}
+        self._siguiente_id = 0
+
+    async def _leer(self, lector):
+        try:
+            while linea := await lector.readline():
+                respuesta = json.loads(linea)
+                futuro = self._pendientes.pop(respuesta["id"], None)
+                if futuro and not futuro.done():
+                    futuro.set_result((respuesta["exito"], respuesta["detalle"]))
+        except ConnectionError:
+            pass
+        finally:
+            # La conexión se cerró: todo lo que estaba en curso falla
+            for futuro in self._pendientes.values():
+                if not futuro.done():
+                    futuro.set_exception(ConnectionError("El robot cerró la conexión"))
+            self._pendientes.clear()
+            if self._escritor:
+                self._escritor.close()
+
+    async def _pedir(self, metodo: str, comando: str = None):
+        if self._escritor is None or self._escritor.is_closing():
+            raise ConnectionError("Sin conexión con el robot")
+        self._siguiente_id += 1
+        futuro = asyncio.get_running_loop().create_future()
+        self._pendientes[self._siguiente_id] = futuro
+        peticion = {"id": self._siguiente_id, "metodo": metodo, "comando": comando}
+        self._escritor.write((json.dumps(peticion) + "\n").encode())
+        await self._escritor.drain()
+        return await futuro
+
+    async def conectar(self) -> bool:
+        lector, self._escritor = await asyncio.open_connection(self.dispositivo["address"], self.dispositivo["port"])
+        self._lector_tarea = asyncio.create_task(self._leer(lector))
+        exito, _ = await self._pedir("conectar")
+        return exito
+
+    async def entrar_programa(self) -> bool:
+        exito, _ = await self._pedir("entrar_programa")
+        return exito
+
+    async def ejecutar(self, comando):
+        return await self._pedir("ejecutar", repr(comando))
+
+    async def latido(self) -> bool:
+        exito, _ = await self._pedir("latido")
+        return exito
+
+    async def soltar(self):
+        if self._escritor:
+            self._escritor.close()
+            self._escritor = None
+        if self._lector_tarea:
+            self._lector_tarea.cancel()
+            await asyncio.gather(self._lector_tarea, return_exceptions=True)
+            self._lector_tarea = None
+
+    async def cerrar(self):
+        await self.soltar()
+
+
+class ConexionRobotLocal:
+    """
+    Conexión con un RobotFalso del mismo proceso con la interfaz de comandos_robot.ConexionSdk
+
+    PlayAudio se hace con robot.play_audio (descarga de verdad la URL); el resto de
+    bloques solo tardan latencia_comando.
+    """
+
+    def __init__(self, robot):
+        self.robot = robot
+
+    async def conectar(self) -> bool:
+        return True
+
+    async def entrar_programa(self) -> bool:
+        return True
+
+    async def ejecutar(self, comando):
+        if comando.clase != "PlayAudio":
+            await asyncio.sleep(self.robot.latencia_comando)
+            return True, "Success"
+        exito, respuesta = await self.robot.play_audio(**comando.argumentos)
+        return exito and respuesta.isSuccess, f"Success ({respuesta.resultCode})"
+
+    async def latido(self) -> bool:
+        return True
+
+    async def soltar(self):
+        pass
+
+    async def cerrar(self):
+        pass
+
+
+class ObservadorFalso:
+    """
+    Imita a un BaseEventApi del SDK (ObserveInfraredDistance...): set_handler, start, stop
+
+    Emite los eventos de generar(i) cada intervalo segundos llamando al handler en línea,
+    como hace el SDK en su camino de recepción, y mide cuánto tarda cada llamada.
+    """
+
+    def __init__(self, generar, intervalo: float = 0.001, cantidad: int = None):
+        self.generar = generar
+        self.intervalo = intervalo
+        self.cantidad = cantidad
+        self.tiempos_entrega = []
+        self._handler = None
+        self._tarea = None
+
+    def set_handler(self, handler=None):
+        self._handler = handler
+
+    def start(self):
+        self._tarea = asyncio.create_task(self._emitir())
+
+    def stop(self):
+        if self._tarea:
+            self._tarea.cancel()
+
+    async def _emitir(self):
+        i = 0
+        while self.cantidad is None or i < self.cantidad:
+            await asyncio.sleep(self.intervalo)
+            if self._handler:
+                inicio = time.perf_counter()
+                self._handler(self.generar(i))
+                self.tiempos_entrega.append(time.perf_counter() - inicio)
+            i += 1
+
+    async def terminado(self):
+        try:
+            await self._tarea
+        except asyncio.CancelledError:
+            pass
+
+
+class ObservadorGuionado:
+    """
+    Como ObservadorFalso pero con un guion: lista de (segundos desde start, mensaje)
+
+    Sirve para probar con una secuencia fija de eventos (p.ej. SpeechRecogniseResponse
+    con frases y pausas concretas) sin robot.
+    """
+
+    def __init__(self, guion: list):
+        self.guion = sorted(guion, key=lambda evento: evento[0])
+        self.entregados = []
+        self._handler = None
+        self._tarea = None
+
+    def set_handler(self, handler=None):
+        self._handler = handler
+
+    def start(self):
+        self._tarea = asyncio.create_task(self._emitir())
+
+    def stop(self):
+        if self._tarea:
+            self._tarea.cancel()
+
+    async def _emitir(self):
+        inicio = time.perf_counter()
+        for instante, mensaje in self.guion:
+            await asyncio.sleep(max(0.0, inicio + instante - time.perf_counter()))
+            self.entregados.append((time.perf_counter() - inicio, mensaje))
+            if self._handler:
+                self._handler(mensaje)
+
+    async def terminado(self):
+        try:
+            await self._tarea
+        except asyncio.CancelledError:
+            pass
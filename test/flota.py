@@ -0,0 +1,216 @@
+import asyncio
+import multiprocessing
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as TimeoutFuturo
+
+from comandos_robot import Comando, ConexionSdk, TIMEOUT_COMANDO, TIMEOUT_CONEXION, play_action
+
+# Margen sobre el timeout del trabajador para que el proceso conteste antes de darlo por perdido
+MARGEN_TRABAJADOR = 1.0
+
+
+# Estado del proceso de cada robot: el websocket del SDK es único por proceso, así que
+# cada robot vive en su propio proceso con un loop en segundo plano
+_conexion = None
+_loop = None
+
+
+def _iniciar_trabajador(clase_conexion, dispositivo: dict):
+    global _conexion, _loop
+    _loop = asyncio.new_event_loop()
+    threading.Thread(target=_loop.run_forever, daemon=True).start()
+    _conexion = clase_conexion(dispositivo)
+
+
+def _en_trabajador(metodo: str, timeout: float, *argumentos):
+    # El proceso del robot solo atiende una llamada a la vez: una que no termina se cancela
+    # aquí, o dejaría atascadas todas las siguientes (incluido cerrar)
+    futuro = asyncio.run_coroutine_threadsafe(getattr(_conexion, metodo)(*argumentos), _loop)
+    try:
+        return futuro.result(timeout)
+    except TimeoutFuturo:
+        futuro.cancel()
+        raise
+
+
+def _datos_dispositivo(dispositivo) -> dict:
+    return {"name": dispositivo.name, "address": dispositivo.address, "port": dispositivo.port,
+            "type": dispositivo.type, "server": dispositivo.server}
+
+
+class ResultadoRobot:
+    def __init__(self, nombre: str, exito: bool, latencia_s: float, detalle: str = ""):
+        self.nombre = nombre
+        self.exito = exito
+        self.latencia_s = latencia_s
+        self.detalle = detalle
+
+    def __repr__(self):
+        return f"{self.nombre}: {'ok' if self.exito else 'error'} {self.latencia_s * 1000:.0f} ms {self.detalle}"
+
+
+class RobotFlota:
+    """
+    Un robot de la flota: su conexión vive en un proceso propio y se le habla desde el loop
+    """
+
+    def __init__(self, dispositivo, clase_conexion=ConexionSdk):
+        self.nombre = dispositivo.name
+        self.dispositivo = dispositivo
+        self.conectado = False
+        self.latencias = []
+        self._ejecutor = ProcessPoolExecutor(
+            max_workers=1, mp_context=multiprocessing.get_context("spawn"),
+            initializer=_iniciar_trabajador, initargs=(clase_conexion, _datos_dispositivo(dispositivo)))
+
+    async def _llamar(self, metodo: str, *argumentos, timeout: float = TIMEOUT_COMANDO) -> ResultadoRobot:
+        loop = asyncio.get_running_loop()
+        inicio = time.perf_counter()
+        try:
+            respuesta = await asyncio.wait_for(
+                loop.run_in_executor(self._ejecutor, _en_trabajador, metodo, timeout, *argumentos),
+                None if timeout is None else timeout + MARGEN_TRABAJADOR)
+        except (asyncio.TimeoutError, TimeoutFuturo):
+            return ResultadoRobot(self.nombre, False, time.perf_counter() - inicio, "Timeout")
+        except Exception as e:
+            return ResultadoRobot(self.nombre, False, time.perf_counter() - inicio, repr(e))
+        latencia = time.perf_counter() - inicio
+        if isinstance(respuesta, tuple):
+            exito, detalle = respuesta
+        else:
+            exito, detalle = bool(respuesta), ""
+        return ResultadoRobot(self.nombre, exito, latencia, detalle)
+
+    async def conectar(self) -> ResultadoRobot:
+        """
+        connect + enter_program en el proceso del robot
+        """
+        inicio = time.perf_counter()
+        resultado = await self._llamar("conectar", timeout=TIMEOUT_CONEXION)
+        if resultado.exito:
+            resultado = await self._llamar("entrar_programa", timeout=TIMEOUT_CONEXION)
+        resultado.latencia_s = time.perf_counter() - inicio
+        self.conectado = resultado.exito
+        return resultado
+
+    async def ejecutar(self, comando: Comando, timeout: float = TIMEOUT_COMANDO) -> ResultadoRobot:
+        resultado = await self._llamar("ejecutar", comando, timeout=timeout)
+        self.latencias.append(resultado.latencia_s)
+        return resultado
+
+    async def cerrar(self):
+        if self.conectado:
+            await self._llamar("cerrar")
+            self.conectado = False
+        self._ejecutor.shutdown(wait=False, cancel_futures=True)
+
+
+def resumen(resultados: dict) -> dict:
+    """
+    Agrega los resultados por robot de una difusión
+    """
+    latencias = sorted(r.latencia_s for r in resultados.values())
+    return {
+        "robots": len(resultados),
+        "exitos": sum(r.exito for r in resultados.values()),
+        "latencia_media_s": round(sum(latencias) / len(latencias), 3) if latencias else 0.0,
+        "latencia_max_s": round(latencias[-1], 3) if latencias else 0.0,
+        "fallidos": [r.nombre for r in resultados.values() if not r.exito],
+    }
+
+
+class Flota:
+    """
+    Varios Alpha Mini a la vez: descubrimiento, conexión en paralelo y difusión de bloques
+
+    Cada robot tiene su propio proceso (ver RobotFlota), así que conectar y difundir
+    tardan lo que tarde el robot más lento, no la suma de todos.
+    """
+
+    def __init__(self, clase_conexion=ConexionSdk):
+        self._clase_conexion = clase_conexion
+        self.robots = {}
+
+    async def descubrir(self, timeout: int = 5, registro=None) -> tuple:
+        """
+        Robots de la red, desde el registro en segundo plano si se pasa uno
+        """
+        if registro is not None:
+            return await registro.get_device_list(timeout)
+        import mini.mini_sdk as MiniSdk
+        return await MiniSdk.get_device_list(timeout)
+
+    async def conectar(self, dispositivos) -> dict:
+        for dispositivo in dispositivos:
+            if dispositivo.name not in self.robots:
+                self.robots[dispositivo.name] = RobotFlota(dispositivo, self._clase_conexion)
+        robots = [self.robots[d.name] for d in dispositivos]
+        resultados = await asyncio.gather(*(r.conectar() for r in robots))
+        return {r.nombre: r for r in resultados}
+
+    async def difundir(self, comando: Comando, nombres=None, timeout: float = TIMEOUT_COMANDO) -> dict:
+        """
+        Ejecuta el bloque en todos los robots conectados (o en los indicados) a la vez
+        """
+        robots = [r for r in self.robots.values() if r.conectado and (nombres is None or r.nombre in nombres)]
+        resultados = await asyncio.gather(*(r.ejecutar(comando, timeout) for r in robots))
+        return {r.nombre: r for r in resultados}
+
+    def metricas(self) -> dict:
+        return {nombre: {"comandos": len(r.latencias),
+                         "latencia_media_s": round(sum(r.latencias) / len(r.latencias), 3) if r.latencias else 0.0}
+                for nombre, r in self.robots.items()}
+
+    async def cerrar(self):
+        await asyncio.gather(*(r.cerrar() for r in self.robots.values()))
+        self.robots.clear()
+
+
+async def _benchmark(latencias: list, repeticiones: int):
+    from fakes import ConexionRobotFalso, ServidorRobotFalso
+    from mini.dns.dns_browser import WiFiDevice
+
+    servidores = [await ServidorRobotFalso(f"Mini_AA{20000 + i}", latencia, latencia_conexion=0.2,
+                                           latencia_programa=0.3).iniciar()
+                  for i, latencia in enumerate(latencias)]
+    dispositivos = [WiFiDevice(s.nombre, "127.0.0.1", s.puerto, "_Dedu_mini_channel_server._tcp.local.")
+                    for s in servidores]
+
+    flota = Flota(ConexionRobotFalso)
+    inicio = time.perf_counter()
+    conexiones = await flota.conectar(dispositivos)
+    print(f"Conexión de {len(dispositivos)} robots: {time.perf_counter() - inicio:.2f}s "
+          f"(connect + enter_program: 0.5 s por robot) {resumen(conexiones)}")
+
+    comando = play_action("018")
+    # Calentar los procesos antes de medir
+    await flota.difundir(comando)
+
+    inicio = time.perf_counter()
+    for _ in range(repeticiones):
+        for robot in flota.robots.values():
+            await robot.ejecutar(comando)
+    secuencial = (time.perf_counter() - inicio) / repeticiones
+
+    inicio = time.perf_counter()
+    for _ in range(repeticiones):
+        resultados = await flota.difundir(comando)
+    paralelo = (time.perf_counter() - inicio) / repeticiones
+
+    print(f"Latencias de los robots: {latencias} (suma {sum(latencias):.2f}s, máx {max(latencias):.2f}s)")
+    print(f"Uno tras otro: {secuencial:.3f}s por difusión")
+    print(f"Difusión en paralelo: {paralelo:.3f}s por difusión {resumen(resultados)}")
+    print(f"Por robot: {flota.metricas()}")
+
+    await flota.cerrar()
+    for servidor in servidores:
+        await servidor.detener()
+
+
+def benchmark(latencias=(0.05, 0.1, 0.15, 0.2, 0.3), repeticiones: int = 5):
+    asyncio.run(_benchmark(list(latencias), repeticiones))
+
+
+if __name__ == '__main__':
+    benchmark()
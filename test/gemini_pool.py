@@ -0,0 +1,185 @@
+import threading
+import time
+from collections import OrderedDict, deque
+
+MODELO_GEMINI = 'gemini-2.0-flash'
+
+
+def _crear_modelo_genai(nombre_modelo: str):
+    """
+    Crea el modelo real de Gemini (genai.configure debe haberse llamado antes)
+    """
+    import google.generativeai as genai
+    return genai.GenerativeModel(nombre_modelo)
+
+
+class PoolGemini:
+    """
+    Mantiene un modelo de Gemini ya calentado y los chats de cada conversación
+
+    El modelo se crea una sola vez y reutiliza su cliente (y el canal con Google) en
+    todos los turnos. Las conversaciones con estado guardan su objeto chat, las
+    conversaciones sin estado llaman directamente a generate_content.
+    """
+
+    def __init__(self, nombre_modelo: str = MODELO_GEMINI, fabrica_modelo=None, max_sesiones: int = 32,
+                 max_turnos_metricas: int = 1000):
+        self.nombre_modelo = nombre_modelo
+        self._fabrica_modelo = fabrica_modelo or _crear_modelo_genai
+        self._max_sesiones = max_sesiones
+        self._modelo = None
+        self._sesiones = OrderedDict()
+        self._lock = threading.Lock()
+        # Métricas: calentamiento, primer turno (el canal se abre en la primera llamada si no
+        # se calentó) y los últimos turnos como (preparación, llamada)
+        self.calentamiento_s = None
+        self.turnos = 0
+        self._primer_turno = None
+        self._turnos = deque(maxlen=max_turnos_metricas)
+
+    def _obtener_modelo(self):
+        with self._lock:
+            if self._modelo is None:
+                self._modelo = self._fabrica_modelo(self.nombre_modelo)
+            return self._modelo
+
+    def calentar(self):
+        """
+        Crea el modelo y abre el canal antes del primer mensaje
+        """
+        inicio = time.perf_counter()
+        modelo = self._obtener_modelo()
+        try:
+            modelo.count_tokens("hola")
+        except Exception as e:
+            print(f"No se pudo calentar el modelo de Gemini: {e}")
+        duracion = time.perf_counter() - inicio
+        self.calentamiento_s = duracion
+        print(f"Modelo {self.nombre_modelo} listo en {duracion:.3f}s")
+        return duracion
+
+    def sesion(self, id_conversacion, historial=None):
+        """
+        Devuelve el chat de una conversación, creándolo si no existe
+        """
+        modelo = self._obtener_modelo()
+        with self._lock:
+            chat = self._sesiones.get(id_conversacion)
+            if chat is None:
+                chat = modelo.start_chat(history=list(historial or []))
+                self._sesiones[id_conversacion] = chat
+                # Descartar la conversación usada hace más tiempo
+                if len(self._sesiones) > self._max_sesiones:
+                    self._sesiones.popitem(last=False)
+            else:
+                self._sesiones.move_to_end(id_conversacion)
+            return chat
+
+    def cerrar_sesion(self, id_conversacion):
+        with self._lock:
+            self._sesiones.pop(id_conversacion, None)
+
+    def enviar(self, mensaje: str, id_conversacion=None, historial=None, stream: bool = False):
+        """
+        Envía un mensaje y devuelve la respuesta de genai (con stream=True es iterable)
+
+        Sin id_conversacion la llamada no tiene estado; si se pasa historial se usa un
+        chat temporal con ese historial sobre el modelo ya calentado.
+        """
+        inicio = time.perf_counter()
+        if id_conversacion is not None:
+            destino = self.sesion(id_conversacion, historial)
+            enviar = destino.send_message
+        elif historial:
+            enviar = self._obtener_modelo().start_chat(history=list(historial)).send_message
+        else:
+            enviar = self._obtener_modelo().generate_content
+        preparado = time.perf_counter()
+
+        respuesta = enviar(mensaje, stream=stream)
+        fin = time.perf_counter()
+
+        with self._lock:
+            self.turnos += 1
+            if self._primer_turno is None:
+                self._primer_turno = fin - inicio
+            else:
+                self._turnos.append((preparado - inicio, fin - preparado))
+        return respuesta
+
+    def metricas(self) -> dict:
+        """
+        Coste de preparación frente al estado estable
+
+        sobrecoste_primer_turno_s es lo que tardó el primer turno de más sobre la media
+        de los siguientes (abrir el canal, si no se llamó antes a calentar());
+        calentamiento_s lo que tardó calentar(), si se llamó.
+        """
+        if self._primer_turno is None:
+            return {"turnos": 0, "calentamiento_s": self.calentamiento_s}
+        with self._lock:
+            turnos = list(self._turnos)
+        setup = [t[0] for t in turnos]
+        llamada = [t[1] for t in turnos]
+        estables = [s + l for s, l in turnos] or [self._primer_turno]
+        estable = sum(estables) / len(estables)
+        return {
+            "turnos": self.turnos,
+            "calentamiento_s": self.calentamiento_s,
+            "primer_turno_s": self._primer_turno,
+            "turno_medio_estable_s": estable,
+            "sobrecoste_primer_turno_s": self._primer_turno - estable,
+            "setup_medio_s": sum(setup) / len(setup) if setup else 0.0,
+            "llamada_media_s": sum(llamada) / len(llamada) if llamada else 0.0,
+            "sesiones_abiertas": len(self._sesiones),
+        }
+
+
+_pool = None
+
+
+def obtener_pool() -> PoolGemini:
+    """
+    Pool compartido por los scripts de chat
+    """
+    global _pool
+    if _pool is None:
+        _pool = PoolGemini()
+    return _pool
+
+
+def benchmark(turnos: int = 20):
+    """
+    Compara crear modelo y chat en cada turno frente a reutilizar el pool,
+    usando un modelo local que simula el coste de abrir el canal
+    """
+    from fakes import ModeloGeminiFalso
+
+    def fabrica(nombre):
+        return ModeloGeminiFalso(nombre, latencia_setup=0.05, latencia=0.01)
+
+    inicio = time.perf_counter()
+    for i in range(turnos):
+        chat = fabrica(MODELO_GEMINI).start_chat(history=[])
+        chat.send_message(f"pregunta {i}")
+    por_turno = (time.perf_counter() - inicio) / turnos
+
+    pool = PoolGemini(fabrica_modelo=fabrica)
+    inicio = time.perf_counter()
+    for i in range(turnos):
+        pool.enviar(f"pregunta {i}")
+    con_pool = (time.perf_counter() - inicio) / turnos
+
+    calentado = PoolGemini(fabrica_modelo=fabrica)
+    calentado.calentar()
+    for i in range(turnos):
+        calentado.enviar(f"pregunta {i}")
+
+    print(f"Modelo nuevo por turno: {por_turno * 1000:.1f} ms/turno")
+    print(f"Pool reutilizado:       {con_pool * 1000:.1f} ms/turno")
+    print(f"Métricas del pool sin calentar: {pool.metricas()}")
+    print(f"Métricas del pool calentado:    {calentado.metricas()}")
+
+
+if __name__ == '__main__':
+    benchmark()
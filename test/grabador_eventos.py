@@ -0,0 +1,289 @@
+import asyncio
+import importlib
+import mmap
+import os
+import time
+
+# Formato del registro (.rec):
+#   MAGIA y después registros seguidos, cada uno con enteros varint:
+#   id_tipo, microsegundos desde el registro anterior, longitud, bytes de SerializeToString().
+#   El id_tipo 0 declara un tipo nuevo: id nuevo, longitud, "modulo:Clase" del mensaje pb2.
+MAGIA = b"MINIREC1"
+_DECLARACION = 0
+
+
+def _varint(n: int) -> bytes:
+    salida = bytearray()
+    while n > 0x7F:
+        salida.append((n & 0x7F) | 0x80)
+        n >>= 7
+    salida.append(n)
+    return bytes(salida)
+
+
+def _leer_varint(datos, pos: int):
+    resultado = 0
+    desplazamiento = 0
+    while True:
+        byte = datos[pos]
+        pos += 1
+        resultado |= (byte & 0x7F) << desplazamiento
+        if byte < 0x80:
+            return resultado, pos
+        desplazamiento += 7
+
+
+def _nombre_tipo(mensaje) -> str:
+    clase = type(mensaje)
+    return f"{clase.__module__}:{clase.__qualname__}"
+
+
+def _clase_de(nombre: str):
+    modulo, clase = nombre.split(":")
+    # Los pb2 del SDK se importan como módulos sueltos o como mini.pb2.<módulo>
+    for candidato in (modulo, f"mini.pb2.{modulo}"):
+        try:
+            return getattr(importlib.import_module(candidato), clase)
+        except ImportError:
+            continue
+    raise ImportError(f"No se encuentra el tipo de mensaje {nombre}")
+
+
+class GrabadorEventos:
+    """
+    Graba respuestas de observadores (mensajes de mini.pb2) con su instante en un log binario
+
+    Uso con un observador del SDK: observer.set_handler(grabador.envolver(handler)).
+    """
+
+    def __init__(self, ruta: str):
+        self.ruta = ruta
+        self._archivo = open(ruta, "wb")
+        self._archivo.write(MAGIA)
+        self._tipos = {}
+        # Instante del registro anterior ya en microsegundos enteros (los deltas no acumulan
+        # redondeo); el primer evento marca el cero de la grabación
+        self._anterior_us = None
+        self.eventos = 0
+
+    def registrar(self, mensaje, instante: float = None):
+        instante = time.perf_counter() if instante is None else instante
+        nombre = _nombre_tipo(mensaje)
+        id_tipo = self._tipos.get(nombre)
+        if id_tipo is None:
+            id_tipo = self._tipos[nombre] = len(self._tipos) + 1
+            nombre_bytes = nombre.encode("utf-8")
+            self._archivo.write(_varint(_DECLARACION) + _varint(id_tipo) + _varint(len(nombre_bytes)) + nombre_bytes)
+        datos = mensaje.SerializeToString()
+        instante_us = round(instante * 1_000_000)
+        if self._anterior_us is None:
+            self._anterior_us = instante_us
+        delta = max(instante_us - self._anterior_us, 0)
+        self._anterior_us += delta
+        self._archivo.write(_varint(id_tipo) + _varint(delta) + _varint(len(datos)) + datos)
+        self.eventos += 1
+
+    def envolver(self, handler=None):
+        """
+        Handler para set_handler que graba cada mensaje y luego llama a handler
+        """
+        def grabar_y_manejar(mensaje):
+            self.registrar(mensaje)
+            if handler is not None:
+                handler(mensaje)
+        return grabar_y_manejar
+
+    def cerrar(self):
+        if not self._archivo.closed:
+            self._archivo.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.cerrar()
+
+
+class ReproductorEventos:
+    """
+    Lee un log de GrabadorEventos con mmap (no se carga entero en memoria) y lo reproduce
+
+    velocidad=1 respeta los tiempos grabados, velocidad=N los divide entre N y
+    velocidad=None reproduce tan rápido como se pueda.
+    """
+
+    def __init__(self, ruta: str):
+        self.ruta = ruta
+        with open(ruta, "rb") as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if os.path.getsize(ruta) else b""
+        if bytes(self._mmap[:len(MAGIA)]) != MAGIA:
+            raise ValueError(f"{ruta} no es un registro de eventos")
+
+    def cerrar(self):
+        if isinstance(self._mmap, mmap.mmap):
+            self._mmap.close()
+
+    def __iter__(self):
+        """
+        (segundos desde el inicio, mensaje) de cada evento, en orden
+        """
+        datos = memoryview(self._mmap)
+        clases = {}
+        pos = len(MAGIA)
+        instante = 0
+        try:
+            while pos < len(datos):
+                id_tipo, pos = _leer_varint(datos, pos)
+                if id_tipo == _DECLARACION:
+                    nuevo, pos = _leer_varint(datos, pos)
+                    longitud, pos = _leer_varint(datos, pos)
+                    clases[nuevo] = _clase_de(bytes(datos[pos:pos + longitud]).decode("utf-8"))
+                    pos += longitud
+                    continue
+                delta, pos = _leer_varint(datos, pos)
+                longitud, pos = _leer_varint(datos, pos)
+                mensaje = clases[id_tipo]()
+                mensaje.ParseFromString(datos[pos:pos + longitud])
+                pos += longitud
+                instante += delta
+                yield instante / 1_000_000, mensaje
+        finally:
+            datos.release()
+
+    async def reproducir(self, manejador, velocidad: float = 1.0, lote: int = 1000) -> dict:
+        """
+        Llama a manejador(mensaje) con cada evento (o manejador[nombre de la clase] si es un dict)
+
+        A velocidad máxima cede el loop cada lote eventos para no dejar a nadie sin atender.
+        """
+        loop = asyncio.get_running_loop()
+        inicio = loop.time()
+        eventos = 0
+        for instante, mensaje in self:
+            if velocidad:
+                espera = inicio + instante / velocidad - loop.time()
+                if espera > 0:
+                    await asyncio.sleep(espera)
+            elif eventos % lote == 0:
+                await asyncio.sleep(0)
+            destino = manejador.get(type(mensaje).__name__) if isinstance(manejador, dict) else manejador
+            if destino is not None:
+                destino(mensaje)
+            eventos += 1
+        duracion = loop.time() - inicio
+        return {"eventos": eventos, "duracion_s": round(duracion, 3),
+                "eventos_s": round(eventos / duracion, 1) if duracion else 0.0}
+
+    def observador(self, velocidad: float = 1.0):
+        """
+        Observador con la interfaz de los del SDK (set_handler/start/stop) que reproduce
+        el registro: sustituye a ObserveInfraredDistance() y compañía en las demos
+        """
+        return ObservadorGrabado(self, velocidad)
+
+
+class ObservadorGrabado:
+    def __init__(self, reproductor: ReproductorEventos, velocidad: float = 1.0):
+        self._reproductor = reproductor
+        self._velocidad = velocidad
+        self._handler = None
+        self._tarea = None
+        self.resultado = None
+
+    def set_handler(self, handler=None):
+        self._handler = handler
+
+    def start(self):
+        self._tarea = asyncio.create_task(self._reproducir())
+
+    async def _reproducir(self):
+        self.resultado = await self._reproductor.reproducir(lambda m: self._handler and self._handler(m),
+                                                            self._velocidad)
+
+    def stop(self):
+        if self._tarea:
+            self._tarea.cancel()
+
+    async def terminado(self):
+        try:
+            await self._tarea
+        except asyncio.CancelledError:
+            pass
+        return self.resultado
+
+
+async def grabar_robot(ruta: str, tipos: list, segundos: float):
+    """
+    Graba los observadores indicados (nombres de bus_eventos.OBSERVADORES) del robot conectado
+    """
+    from bus_eventos import _crear_observador_sdk
+    with GrabadorEventos(ruta) as grabador:
+        observadores = []
+        for tipo in tipos:
+            observador = _crear_observador_sdk(tipo)
+            observador.set_handler(grabador.envolver())
+            observador.start()
+            observadores.append(observador)
+        await asyncio.sleep(segundos)
+        for observador in observadores:
+            observador.stop()
+    print(f"{grabador.eventos} eventos grabados en {ruta}")
+
+
+async def _benchmark(eventos: int):
+    import json
+    import tempfile
+    from mini.pb2.codemao_observeinfrareddistance_pb2 import ObserveInfraredDistanceResponse
+    from mini.pb2.codemao_observefallclimb_pb2 import ObserveFallClimbResponse
+
+    directorio = tempfile.mkdtemp(prefix="grabador_eventos_")
+    ruta = os.path.join(directorio, "sesion.rec")
+
+    # Sesión sintética: infrarrojo a 1 kHz y de vez en cuando un cambio de postura
+    inicio = time.perf_counter()
+    with GrabadorEventos(ruta) as grabador:
+        for i in range(eventos):
+            if i % 500 == 0:
+                mensaje = ObserveFallClimbResponse()
+                mensaje.status = 1 + i // 500 % 3
+            else:
+                mensaje = ObserveInfraredDistanceResponse()
+                mensaje.distance = 300 + (i * 7) % 400
+            grabador.registrar(mensaje, i / 1000)
+    escritura = time.perf_counter() - inicio
+    tamano = os.path.getsize(ruta)
+    tamano_json = sum(len(json.dumps({"t": i / 1000, "tipo": "ObserveInfraredDistanceResponse",
+                                      "distance": 300 + (i * 7) % 400})) + 1 for i in range(eventos))
+    print(f"{eventos} eventos grabados en {escritura:.2f}s: {tamano / 1024:.0f} KiB "
+          f"({tamano / eventos:.1f} B/evento; JSON por líneas: {tamano_json / 1024:.0f} KiB)")
+
+    reproductor = ReproductorEventos(ruta)
+    posturas = []
+    distancias = []
+    manejadores = {"ObserveInfraredDistanceResponse": lambda m: distancias.append(m.distance),
+                   "ObserveFallClimbResponse": lambda m: posturas.append(m.status)}
+    print(f"Velocidad máxima: {await reproductor.reproducir(manejadores, velocidad=None)}")
+    print(f"  infrarrojo: {len(distancias)}, posturas: {len(posturas)}")
+
+    # Los 2 primeros segundos grabados a 1x y a 10x con la interfaz de observador del SDK
+    with GrabadorEventos(os.path.join(directorio, "corto.rec")) as corto:
+        for i, (instante, mensaje) in enumerate(reproductor):
+            if instante >= 2.0:
+                break
+            corto.registrar(mensaje, instante)
+    corto_reproductor = ReproductorEventos(corto.ruta)
+    for velocidad in (1, 10):
+        observador = corto_reproductor.observador(velocidad)
+        observador.set_handler(lambda m: None)
+        observador.start()
+        print(f"Velocidad {velocidad}x: {await observador.terminado()}")
+    corto_reproductor.cerrar()
+    reproductor.cerrar()
+
+
+def benchmark(eventos: int = 200_000):
+    asyncio.run(_benchmark(eventos))
+
+
+if __name__ == '__main__':
+    benchmark()
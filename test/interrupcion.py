@@ -0,0 +1,208 @@
+import asyncio
+import contextlib
+import time
+
+from trazas import percentil
+
+# Motivos de interrupción
+VOZ = "voz"
+CABEZA = "cabeza"
+
+
+async def detener_audio_sdk() -> bool:
+    """
+    StopAllAudio directo por MiniSdk (sin supervisor)
+    """
+    from mini.apis.api_sound import StopAllAudio
+    from mini import MiniApiResultType
+    result_type, response = await StopAllAudio().execute()
+    return result_type == MiniApiResultType.Success and getattr(response, "isSuccess", True)
+
+
+class ControladorInterrupcion:
+    """
+    Barge-in: corta la respuesta del robot en cuanto el usuario habla o le toca la cabeza
+
+    Mientras una respuesta suena (dentro de vigilar(pipeline)), un evento de
+    reconocimiento de voz o de ObserveHeadRacket manda StopAllAudio al momento y
+    cancela el PipelineTTS de esa respuesta: frases encoladas y síntesis en marcha. Los
+    primeros gracia_s desde que empieza a sonar cada frase no cuentan, para que el
+    micrófono no confunda el principio del propio audio del robot con el usuario (tocar
+    la cabeza corta siempre).
+
+    detener_audio() es la corrutina que manda StopAllAudio (p.ej. a través del
+    supervisor de la conexión); de cada interrupción se mide cuánto se tarda en dar la
+    orden, en que el robot la confirme y en cancelar la tubería.
+    """
+
+    def __init__(self, detener_audio=None, gracia_s: float = 0.3, min_caracteres: int = 2):
+        self._detener_audio = detener_audio or detener_audio_sdk
+        self.gracia_s = gracia_s
+        self.min_caracteres = min_caracteres
+        self._pipeline = None
+        self._observadores = []
+        self._tareas = set()
+        self.interrupciones = []
+        self.ignoradas = 0
+
+    @contextlib.contextmanager
+    def vigilar(self, pipeline):
+        """
+        Permite interrumpir pipeline (un PipelineTTS hablando) mientras dura el bloque
+        """
+        self._pipeline = pipeline
+        try:
+            yield self
+        finally:
+            self._pipeline = None
+
+    def manejador_voz(self, mensaje):
+        """
+        Handler para ObserveSpeechRecognise (o para encadenar desde otro handler de voz)
+        """
+        if mensaje.isSuccess and len(mensaje.text.strip()) >= self.min_caracteres:
+            self.interrumpir(VOZ)
+
+    def manejador_cabeza(self, mensaje):
+        """
+        Handler para ObserveHeadRacket
+        """
+        self.interrumpir(CABEZA)
+
+    def interrumpir(self, motivo: str) -> bool:
+        pipeline = self._pipeline
+        evento = time.perf_counter()
+        if pipeline is None:
+            return False
+        # Lo que se oye justo al empezar una frase suele ser el altavoz del propio robot
+        inicio_frase = getattr(pipeline, "inicio_reproduccion", None)
+        if motivo == VOZ and inicio_frase is not None and evento - inicio_frase < self.gracia_s:
+            self.ignoradas += 1
+            return False
+        # Una sola interrupción por respuesta
+        self._pipeline = None
+        registro = {"motivo": motivo}
+        self.interrupciones.append(registro)
+        # Primero la orden al robot, que es lo que se oye; luego lo que aún no ha sonado
+        tarea = asyncio.get_running_loop().create_task(self._detener(registro, evento))
+        self._tareas.add(tarea)
+        tarea.add_done_callback(self._tareas.discard)
+        pipeline.cancelar()
+        registro["cancelacion_ms"] = (time.perf_counter() - evento) * 1000
+        return True
+
+    async def _detener(self, registro: dict, evento: float):
+        registro["orden_ms"] = (time.perf_counter() - evento) * 1000
+        try:
+            registro["exito"] = bool(await self._detener_audio())
+        except Exception as e:
+            registro["exito"] = False
+            print(f"Error al parar el audio del robot: {e}")
+        registro["silencio_ms"] = (time.perf_counter() - evento) * 1000
+        print(f"Respuesta interrumpida ({registro['motivo']}): StopAllAudio a los {registro['orden_ms']:.1f} ms, "
+              f"confirmado a los {registro['silencio_ms']:.0f} ms")
+
+    def iniciar(self, observar_voz: bool = True, observar_cabeza: bool = True, observador_voz=None,
+                observador_cabeza=None):
+        """
+        Arranca los observadores del SDK (o los que se pasen). Con observar_voz=False el
+        reconocimiento de voz lo lleva otro (p.ej. ChatVoz) y llama a manejador_voz.
+        """
+        from mini.apis import api_observe
+        if observar_voz:
+            observador = observador_voz or api_observe.ObserveSpeechRecognise()
+            observador.set_handler(self.manejador_voz)
+            self._observadores.append(observador)
+        if observar_cabeza:
+            observador = observador_cabeza or api_observe.ObserveHeadRacket()
+            observador.set_handler(self.manejador_cabeza)
+            self._observadores.append(observador)
+        for observador in self._observadores:
+            observador.start()
+
+    async def detener(self):
+        for observador in self._observadores:
+            observador.stop()
+        self._observadores.clear()
+        if self._tareas:
+            await asyncio.gather(*self._tareas, return_exceptions=True)
+
+    def metricas(self) -> dict:
+        def resumen(clave):
+            valores = sorted(r[clave] for r in self.interrupciones if clave in r)
+            if not valores:
+                return {}
+            return {"p50_ms": round(percentil(valores, 50), 2), "max_ms": round(valores[-1], 2)}
+
+        return {
+            "interrupciones": len(self.interrupciones),
+            "ignoradas_en_gracia": self.ignoradas,
+            "por_motivo": {m: sum(r["motivo"] == m for r in self.interrupciones) for m in (VOZ, CABEZA)},
+            "orden": resumen("orden_ms"),
+            "cancelacion": resumen("cancelacion_ms"),
+            "silencio": resumen("silencio_ms"),
+        }
+
+
+async def _benchmark(respuestas: int, latencia_comando: float, duracion_frase: float):
+    import random
+    from mini.pb2.codemao_speechrecognise_pb2 import SpeechRecogniseResponse
+    from mini.pb2.codemao_observeheadracket_pb2 import ObserveHeadRacketResponse
+    from tts_streaming import PipelineTTS
+
+    frases = [f"Esta es la frase número {i} de una respuesta larga de Gemini. " for i in range(8)]
+    sintetizadas = []
+    liberadas = []
+
+    def sintetizar(texto):
+        time.sleep(0.1)
+        sintetizadas.append(texto)
+        return texto.encode()
+
+    eco = SpeechRecogniseResponse(isSuccess=True, text="esta es la frase")
+
+    async def reproducir(url):
+        # El micrófono oye el principio de cada frase del propio robot: no debe cortarla
+        asyncio.get_running_loop().call_later(0.1, controlador.manejador_voz, eco)
+        # El robot tarda duracion_frase en decir cada frase
+        await asyncio.sleep(duracion_frase)
+
+    async def detener_audio():
+        await asyncio.sleep(latencia_comando)
+        return True
+
+    controlador = ControladorInterrupcion(detener_audio)
+    rng = random.Random(1)
+    restante = []
+    for i in range(respuestas):
+        pipeline = PipelineTTS(sintetizar, lambda audio, indice: f"audio_{indice}", reproducir, liberadas.append)
+        with controlador.vigilar(pipeline):
+            espera = rng.uniform(0.5, 2.5)
+            if i % 2:
+                mensaje = ObserveHeadRacketResponse()
+                evento = lambda: controlador.manejador_cabeza(mensaje)
+            else:
+                mensaje = SpeechRecogniseResponse(isSuccess=True, text="espera, para")
+                evento = lambda: controlador.manejador_voz(mensaje)
+            asyncio.get_running_loop().call_later(espera, evento)
+            metricas = await pipeline.hablar(lambda: frases)
+        if not metricas.get("interrumpido"):
+            print(f"Respuesta {i + 1}: el usuario habló a los {espera:.2f}s, dentro de la gracia de una frase")
+            continue
+        # Sin barge-in el usuario habría tenido que esperar al final de la respuesta
+        restante.append(len(frases) * duracion_frase + 0.1 - espera)
+        print(f"Respuesta {i + 1}: interrumpida a los {espera:.2f}s tras {metricas['frases']} frases generadas, "
+              f"{metricas.get('frases_descartadas', 0)} descartadas")
+    await controlador.detener()
+
+    print(f"{controlador.metricas()}")
+    print(f"Sin interrupción el robot habría seguido hablando {sum(restante) / len(restante):.1f}s de media")
+    print(f"Frases sintetizadas: {len(sintetizadas)} de {respuestas * len(frases)}; audios liberados: {len(liberadas)}")
+
+
+def benchmark(respuestas: int = 6, latencia_comando: float = 0.03, duracion_frase: float = 0.8):
+    asyncio.run(_benchmark(respuestas, latencia_comando, duracion_frase))
+
+
+if __name__ == '__main__':
+    benchmark()
@@ -0,0 +1,197 @@
+import threading
+import time
+from functools import partial
+
+# Estimación barata de tokens: ~4 caracteres por token en español con el tokenizador de Gemini
+CARACTERES_POR_TOKEN = 4
+
+PROMPT_RESUMEN = ("Resume en español, en pocas frases y sin perder nombres, datos ni preferencias del "
+                  "usuario, la siguiente conversación. Incluye el resumen anterior si lo hay.\n\n")
+PROMPT_LIMITE = "El resumen no puede pasar de {} caracteres.\n\n"
+
+
+def estimar_tokens(texto: str) -> int:
+    return len(texto) // CARACTERES_POR_TOKEN + 1
+
+
+def recortar_resumen(resumen: str, max_caracteres: int) -> str:
+    """
+    Deja el resumen en max_caracteres quedándose con las frases completas del principio
+    (o, si la primera ya no cabe, hasta la última palabra completa)
+    """
+    resumen = resumen.strip()
+    if len(resumen) <= max_caracteres:
+        return resumen
+    recorte = resumen[:max_caracteres + 1]
+    fin = max(recorte.rfind(separador) for separador in (". ", "! ", "? ", "\n"))
+    if fin > 0:
+        return recorte[:fin + 1].strip()
+    fin = recorte.rfind(" ")
+    return (recorte[:fin] if fin > 0 else recorte[:max_caracteres]).strip()
+
+
+def resumir_con_gemini(resumen_previo: str, turnos: list, max_caracteres: int = None) -> str:
+    """
+    Pide a Gemini que condense el resumen anterior y los turnos antiguos en uno nuevo
+    (de como mucho max_caracteres, si se indica)
+    """
+    from gemini_pool import obtener_pool
+    texto = PROMPT_RESUMEN
+    if max_caracteres:
+        texto += PROMPT_LIMITE.format(max_caracteres)
+    if resumen_previo:
+        texto += f"Resumen anterior: {resumen_previo}\n\n"
+    texto += "\n".join(f"{rol}: {contenido}" for rol, contenido in turnos)
+    return obtener_pool().enviar(texto).text
+
+
+class MemoriaConversacion:
+    """
+    Historial de chat con presupuesto de tokens en lugar de número de mensajes
+
+    Cuando el historial supera presupuesto_tokens, los turnos más antiguos se funden
+    en un resumen (con resumir(resumen_previo, turnos) -> str) hasta dejarlo por debajo
+    de objetivo (fracción del presupuesto). Así el tamaño del prompt queda acotado
+    por muy larga que sea la sesión. Con agregar(..., compactar=False) el intercambio
+    se añade al momento y la compactación (que llama a Gemini) se hace aparte con compactar().
+    """
+
+    def __init__(self, presupuesto_tokens: int = 1500, objetivo: float = 0.6, resumir=None,
+                 max_tokens_resumen: int = 300):
+        self.presupuesto_tokens = presupuesto_tokens
+        self.objetivo = objetivo
+        self.max_tokens_resumen = max_tokens_resumen
+        self._resumir = resumir or partial(resumir_con_gemini,
+                                           max_caracteres=max_tokens_resumen * CARACTERES_POR_TOKEN)
+        self._turnos = []
+        # Una sola compactación a la vez (una que venció su timeout puede seguir en su hilo)
+        self._compactando = threading.Lock()
+        self.resumen = ""
+        self.compactaciones = 0
+        self.tiempo_compactando = 0.0
+
+    def __len__(self):
+        return len(self._turnos)
+
+    def __bool__(self):
+        return bool(self._turnos or self.resumen)
+
+    def tokens(self) -> int:
+        return estimar_tokens(self.resumen) + sum(estimar_tokens(t) for _, t in self._turnos)
+
+    def agregar(self, mensaje: str, respuesta: str, compactar: bool = True):
+        """
+        Añade un intercambio usuario/modelo y compacta si se pasa del presupuesto
+        """
+        self._turnos.extend([("user", mensaje), ("model", respuesta)])
+        if compactar:
+            self.compactar()
+
+    def historial(self) -> list:
+        """
+        Historial en el formato de genai (start_chat(history=...))
+        """
+        historial = []
+        if self.resumen:
+            historial.append({"role": "user", "parts": [f"Resumen de la conversación hasta ahora: {self.resumen}"]})
+            historial.append({"role": "model", "parts": ["Entendido."]})
+        historial.extend({"role": rol, "parts": [texto]} for rol, texto in self._turnos)
+        return historial
+
+    def compactar(self):
+        """
+        Funde los turnos más antiguos en el resumen si el historial se pasa del presupuesto
+        (bloqueante: puede llamar a Gemini)
+        """
+        if self.tokens() <= self.presupuesto_tokens or not self._compactando.acquire(blocking=False):
+            return
+        try:
+            self._compactar()
+        finally:
+            self._compactando.release()
+
+    def _compactar(self):
+        inicio = time.perf_counter()
+        limite = self.presupuesto_tokens * self.objetivo
+        # Retirar pares completos (usuario + modelo) desde el principio, dejando al menos el último
+        quitar = 0
+        restantes = self.tokens()
+        while restantes > limite and quitar < len(self._turnos) - 2:
+            restantes -= sum(estimar_tokens(t) for _, t in self._turnos[quitar:quitar + 2])
+            quitar += 2
+        if not quitar:
+            return
+        antiguos = self._turnos[:quitar]
+
+        try:
+            resumen = self._resumir(self.resumen, antiguos)
+        except Exception as e:
+            print(f"No se pudo resumir el historial: {e}")
+            resumen = self.resumen
+
+        # El resumen también tiene su propio tope para no crecer sin fin
+        self.resumen = recortar_resumen(resumen, self.max_tokens_resumen * CARACTERES_POR_TOKEN)
+        # En el sitio: lo que se haya añadido mientras se resumía se conserva
+        del self._turnos[:quitar]
+        self.compactaciones += 1
+        self.tiempo_compactando += time.perf_counter() - inicio
+
+
+def benchmark(turnos: int = 200):
+    """
+    Bytes de prompt y latencia por turno en una conversación sintética larga,
+    con historial completo, con los últimos 10 mensajes y con la memoria por tokens
+    """
+    from fakes import ModeloGeminiFalso
+    from gemini_pool import PoolGemini
+
+    # La latencia del modelo falso crece con el tamaño del prompt, como la de Gemini
+    def fabrica(nombre):
+        modelo = ModeloGeminiFalso(nombre, respuesta=lambda m: "Claro. " + "Esta es una respuesta larga. " * 12)
+        generar = modelo.generate_content
+
+        def generate_content(mensaje, stream=False, historial=None):
+            prompt = sum(len(str(p)) for h in (historial or []) for p in h["parts"]) + len(str(mensaje))
+            time.sleep(prompt / 2_000_000)
+            return generar(mensaje, stream=stream, historial=historial)
+
+        modelo.generate_content = generate_content
+        return modelo
+
+    def resumen_falso(previo, antiguos):
+        return (previo + " " + " ".join(t[:40] for _, t in antiguos))[-800:]
+
+    def medir(nombre, historial, agregar):
+        modelo = fabrica("gemini-2.0-flash")
+        pool = PoolGemini(fabrica_modelo=lambda nombre_modelo: modelo)
+        latencias = []
+        for i in range(turnos):
+            mensaje = f"Pregunta número {i} sobre el robot y sus sensores"
+            inicio = time.perf_counter()
+            respuesta = pool.enviar(mensaje, historial=historial()).text
+            agregar(mensaje, respuesta)
+            latencias.append(time.perf_counter() - inicio)
+        bytes_prompt = modelo.bytes_prompt
+        print(f"{nombre}: prompt final {bytes_prompt[-1]} B, máximo {max(bytes_prompt)} B, "
+              f"latencia media {sum(latencias) / len(latencias) * 1000:.2f} ms, "
+              f"último turno {latencias[-1] * 1000:.2f} ms")
+
+    completo = []
+    medir("Historial completo", lambda: completo,
+          lambda m, r: completo.extend([{"role": "user", "parts": [m]}, {"role": "model", "parts": [r]}]))
+
+    ultimos = []
+
+    def agregar_ultimos(m, r):
+        ultimos.extend([{"role": "user", "parts": [m]}, {"role": "model", "parts": [r]}])
+        del ultimos[:-10]
+
+    medir("Últimos 10 mensajes", lambda: ultimos, agregar_ultimos)
+
+    memoria = MemoriaConversacion(resumir=resumen_falso)
+    medir("Memoria por tokens", memoria.historial, memoria.agregar)
+    print(f"  compactaciones: {memoria.compactaciones}, tokens actuales: {memoria.tokens()}")
+
+
+if __name__ == '__main__':
+    benchmark()
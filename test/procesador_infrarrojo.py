@@ -0,0 +1,218 @@
+import time
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+# Eventos del procesador
+CERCA = "cerca"
+LEJOS = "lejos"
+
+
+class ProcesadorInfrarrojo:
+    """
+    Procesa el flujo de distancias del infrarrojo por lotes en lugar de muestra a muestra
+
+    Las muestras van a un buffer circular de NumPy y cada lote (o cada max_espera_s si
+    llegan despacio) se calculan de golpe la mediana y la media de la ventana que acaba en
+    cada muestra, y una vez por lote la velocidad (pendiente por mínimos cuadrados, en
+    unidades/s) de las últimas ventana_velocidad muestras, que necesita más historia que
+    la mediana para no ser solo ruido. Los eventos CERCA/LEJOS usan la mediana con
+    histéresis (se entra por debajo de umbral_cerca y se sale por encima de umbral_lejos)
+    y antirrebote: la condición tiene que mantenerse rebote_s antes de avisar. Así un pico
+    suelto o el ruido alrededor del umbral no disparan nada.
+
+    Se usa como handler del observador: observer.set_handler(procesador.manejador).
+    """
+
+    def __init__(self, al_evento=None, umbral_cerca: float = 500, umbral_lejos: float = 600,
+                 ventana: int = 16, ventana_velocidad: int = 256, lote: int = 32, rebote_s: float = 0.3,
+                 max_espera_s: float = 0.1, capacidad: int = 4096):
+        if umbral_lejos < umbral_cerca:
+            raise ValueError("umbral_lejos no puede ser menor que umbral_cerca")
+        if capacidad < max(ventana + lote, ventana_velocidad):
+            raise ValueError("La capacidad no alcanza para las ventanas y el lote")
+        self.al_evento = al_evento
+        self.umbral_cerca = umbral_cerca
+        self.umbral_lejos = umbral_lejos
+        self.ventana = ventana
+        self.ventana_velocidad = ventana_velocidad
+        self.lote = lote
+        self.rebote_s = rebote_s
+        self.max_espera_s = max_espera_s
+        self.capacidad = capacidad
+        self._distancias = np.zeros(capacidad, dtype=np.float64)
+        self._instantes = np.zeros(capacidad, dtype=np.float64)
+        self._escritas = 0
+        self._procesadas = 0
+        self.estado = LEJOS
+        self._candidato_desde = None
+        self.mediana = self.media = self.velocidad = None
+        # Métricas
+        self.lotes = 0
+        self.eventos = []
+
+    def manejador(self, mensaje):
+        """
+        Handler para set_handler de ObserveInfraredDistance
+        """
+        self.agregar(mensaje.distance)
+
+    def agregar(self, distancia: float, instante: float = None):
+        posicion = self._escritas % self.capacidad
+        self._distancias[posicion] = distancia
+        self._instantes[posicion] = time.monotonic() if instante is None else instante
+        self._escritas += 1
+        pendientes = self._escritas - self._procesadas
+        if pendientes >= self.lote or \
+                self._instantes[posicion] - self._instantes[self._procesadas % self.capacidad] >= self.max_espera_s:
+            self.procesar()
+
+    def agregar_lote(self, distancias, instantes):
+        """
+        Añade muchas muestras de una vez (p.ej. de una grabación) procesando por lotes
+        """
+        distancias = np.asarray(distancias, dtype=np.float64)
+        instantes = np.asarray(instantes, dtype=np.float64)
+        for inicio in range(0, len(distancias), self.lote):
+            fin = min(inicio + self.lote, len(distancias))
+            posiciones = np.arange(self._escritas, self._escritas + fin - inicio) % self.capacidad
+            self._distancias[posiciones] = distancias[inicio:fin]
+            self._instantes[posiciones] = instantes[inicio:fin]
+            self._escritas += fin - inicio
+            self.procesar()
+
+    def _ultimas(self, n: int):
+        posiciones = np.arange(self._escritas - n, self._escritas) % self.capacidad
+        return self._distancias[posiciones], self._instantes[posiciones]
+
+    def procesar(self):
+        """
+        Calcula las estadísticas de las muestras pendientes y dispara los eventos que toquen
+        """
+        nuevas = self._escritas - self._procesadas
+        if nuevas <= 0:
+            return
+        self._procesadas = self._escritas
+        self.lotes += 1
+        # Cada muestra nueva con las ventana-1 anteriores; al principio del flujo se repite
+        # la primera muestra para que haya una ventana por muestra nueva
+        n = min(nuevas + self.ventana - 1, self._escritas)
+        distancias, instantes = self._ultimas(n)
+        distancias = np.pad(distancias, (nuevas + self.ventana - 1 - n, 0), mode="edge")
+        ventanas_d = sliding_window_view(distancias, self.ventana)
+        medianas = np.median(ventanas_d, axis=1)
+        medias = ventanas_d.mean(axis=1)
+        self.mediana, self.media = float(medianas[-1]), float(medias[-1])
+        d_velocidad, t_velocidad = self._ultimas(min(self.ventana_velocidad, self._escritas))
+        t_centrado = t_velocidad - t_velocidad.mean()
+        varianza_t = float(t_centrado @ t_centrado)
+        self.velocidad = float(t_centrado @ (d_velocidad - d_velocidad.mean())) / varianza_t if varianza_t else 0.0
+
+        # Solo se recorren en Python las muestras en las que la mediana pide el otro estado
+        cambio = medianas < self.umbral_cerca if self.estado == LEJOS else medianas > self.umbral_lejos
+        if not cambio.any():
+            self._candidato_desde = None
+            return
+        instantes_nuevos = instantes[-nuevas:]
+        for i in range(nuevas):
+            if not cambio[i]:
+                self._candidato_desde = None
+                continue
+            if self._candidato_desde is None:
+                self._candidato_desde = instantes_nuevos[i]
+            if instantes_nuevos[i] - self._candidato_desde >= self.rebote_s:
+                self._disparar(instantes_nuevos[i], medianas[i], medias[i])
+                cambio[i + 1:] = medianas[i + 1:] < self.umbral_cerca if self.estado == LEJOS \
+                    else medianas[i + 1:] > self.umbral_lejos
+
+    def _disparar(self, instante, mediana, media):
+        self.estado = CERCA if self.estado == LEJOS else LEJOS
+        self._candidato_desde = None
+        evento = {"tipo": self.estado, "instante": float(instante), "mediana": float(mediana),
+                  "media": float(media), "velocidad": self.velocidad}
+        self.eventos.append(evento)
+        if self.al_evento is not None:
+            try:
+                self.al_evento(evento)
+            except Exception as e:
+                print(f"Error en el manejador de eventos del infrarrojo: {e}")
+
+    def metricas(self) -> dict:
+        return {
+            "muestras": self._escritas,
+            "lotes": self.lotes,
+            "eventos": len(self.eventos),
+            "estado": self.estado,
+            "mediana": self.mediana,
+            "velocidad": self.velocidad,
+        }
+
+
+def flujo_sintetico(segundos: float = 20.0, frecuencia: int = 1000, semilla: int = 1):
+    """
+    Distancias simuladas: alguien se acerca y se aleja varias veces, con ruido y picos sueltos
+    """
+    rng = np.random.default_rng(semilla)
+    instantes = np.arange(0, segundos, 1 / frecuencia)
+    distancias = 550 + 250 * np.cos(2 * np.pi * instantes / 5.0)
+    distancias += rng.normal(0, 30, len(instantes))
+    picos = rng.random(len(instantes)) < 0.01
+    distancias[picos] = rng.uniform(50, 1200, picos.sum())
+    return np.clip(distancias, 0, None), instantes
+
+
+def _leer_grabacion(ruta: str):
+    from grabador_eventos import ReproductorEventos
+    reproductor = ReproductorEventos(ruta)
+    muestras = [(instante, m.distance) for instante, m in reproductor
+                if type(m).__name__ == "ObserveInfraredDistanceResponse"]
+    reproductor.cerrar()
+    instantes, distancias = zip(*muestras) if muestras else ((), ())
+    return np.array(distancias, dtype=np.float64), np.array(instantes, dtype=np.float64)
+
+
+def benchmark(ruta_grabacion: str = None, segundos: float = 20.0, frecuencia: int = 1000):
+    if ruta_grabacion:
+        distancias, instantes = _leer_grabacion(ruta_grabacion)
+        print(f"Grabación {ruta_grabacion}: {len(distancias)} muestras")
+    else:
+        distancias, instantes = flujo_sintetico(segundos, frecuencia)
+        print(f"Flujo sintético: {len(distancias)} muestras a {frecuencia} Hz")
+
+    # Como demo_infrared: el handler decide con cada muestra cruda
+    inicio = time.perf_counter()
+    disparos = 0
+    cerca = False
+    for d in distancias.tolist():
+        if d < 500 and not cerca:
+            disparos += 1
+        cerca = d < 500
+    crudo = time.perf_counter() - inicio
+    print(f"Muestra a muestra: {len(distancias)} llamadas, {disparos} disparos de TTS, "
+          f"{len(distancias) / crudo:,.0f} muestras/s")
+
+    # Con el procesador, muestra a muestra como llegarían del observador
+    procesador = ProcesadorInfrarrojo()
+    inicio = time.perf_counter()
+    for d, t in zip(distancias.tolist(), instantes.tolist()):
+        procesador.agregar(d, t)
+    procesador.procesar()
+    duracion = time.perf_counter() - inicio
+    print(f"Procesador (agregar): {procesador.lotes} lotes, {len(procesador.eventos)} eventos, "
+          f"{len(distancias) / duracion:,.0f} muestras/s")
+    for evento in procesador.eventos[:6]:
+        print(f"  {evento['instante']:7.3f}s {evento['tipo']:5} mediana {evento['mediana']:.0f} "
+              f"velocidad {evento['velocidad']:.0f}/s")
+
+    # Con el procesador, todo el flujo de golpe (grabaciones)
+    procesador = ProcesadorInfrarrojo()
+    inicio = time.perf_counter()
+    procesador.agregar_lote(distancias, instantes)
+    duracion = time.perf_counter() - inicio
+    print(f"Procesador (agregar_lote): {len(procesador.eventos)} eventos, "
+          f"{len(distancias) / duracion:,.0f} muestras/s")
+
+
+if __name__ == '__main__':
+    import sys
+    benchmark(sys.argv[1] if len(sys.argv) > 1 else None)
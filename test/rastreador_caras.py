@@ -0,0 +1,261 @@
+import asyncio
+import inspect
+import time
+
+# Eventos del rastreador
+LLEGADA = "llegada"
+SALIDA = "salida"
+
+# Nombre con el que el robot devuelve las caras no registradas
+DESCONOCIDO = "stranger"
+
+
+async def consultar_sdk() -> list:
+    """
+    Caras registradas en el robot con GetRegisterFaces
+    """
+    from mini.apis.api_sence import GetRegisterFaces
+    from mini import MiniApiResultType
+    result_type, response = await GetRegisterFaces().execute()
+    if result_type != MiniApiResultType.Success or not response or not response.isSuccess:
+        raise RuntimeError(f"GetRegisterFaces falló: {result_type}")
+    return [{"id": c.id, "name": c.name, "gender": c.gender, "age": c.age} for c in response.faceInfos]
+
+
+class IndiceCaras:
+    """
+    Caché de las caras registradas en el robot, por id
+
+    La lista se pide una vez y vale ttl segundos o hasta invalidar() (p.ej. tras registrar
+    una cara nueva); varias consultas a la vez comparten la misma petición al robot. Un id
+    que no está en la caché fuerza como mucho un refresco cada min_refresco_s.
+    """
+
+    def __init__(self, consultar=None, ttl: float = 300, min_refresco_s: float = 10):
+        self._consultar = consultar or consultar_sdk
+        self.ttl = ttl
+        self.min_refresco_s = min_refresco_s
+        self._caras = {}
+        self._actualizado = None
+        self._en_curso = None
+        # Métricas
+        self.consultas = 0
+        self.aciertos = 0
+
+    def invalidar(self):
+        self._actualizado = None
+
+    def _caducado(self) -> bool:
+        return self._actualizado is None or time.monotonic() - self._actualizado > self.ttl
+
+    async def _refrescar(self):
+        if self._en_curso is None:
+            self._en_curso = asyncio.ensure_future(self._consultar())
+            self.consultas += 1
+        en_curso = self._en_curso
+        try:
+            caras = await en_curso
+        except Exception as e:
+            print(f"Error al pedir las caras registradas: {e}")
+            return
+        finally:
+            if self._en_curso is en_curso:
+                self._en_curso = None
+        self._caras = {c["id"]: c for c in caras}
+        self._actualizado = time.monotonic()
+
+    async def caras(self) -> dict:
+        if self._caducado():
+            await self._refrescar()
+        else:
+            self.aciertos += 1
+        return self._caras
+
+    async def por_id(self, id_cara: int):
+        cara = (await self.caras()).get(id_cara)
+        if cara is None and self._actualizado is not None and \
+                time.monotonic() - self._actualizado >= self.min_refresco_s:
+            await self._refrescar()
+            cara = self._caras.get(id_cara)
+        return cara
+
+
+class RastreadorCaras:
+    """
+    Convierte el flujo de FaceRecogniseTaskResponse en llegadas y salidas de personas
+
+    El handler del observador solo apunta cuándo se ha visto cada identidad (id de la cara
+    registrada, o DESCONOCIDO para todos los extraños): las detecciones repetidas de la
+    misma persona se funden en una sola presencia y solo se avisa con LLEGADA la primera
+    vez y con SALIDA cuando lleva ventana_s sin verse, así que un fotograma perdido no
+    produce otro saludo. al_evento(evento) puede ser una función o una corrutina.
+    """
+
+    def __init__(self, al_evento=None, ventana_s: float = 5.0, indice: IndiceCaras = None,
+                 intervalo_barrido: float = 0.5):
+        self.al_evento = al_evento
+        self.ventana_s = ventana_s
+        self.indice = indice
+        self.intervalo_barrido = intervalo_barrido
+        self.presentes = {}
+        self._observador = None
+        self._tarea_barrido = None
+        self._tareas = set()
+        # Métricas
+        self.reconocimientos = 0
+        self.eventos = []
+
+    def manejador(self, mensaje):
+        """
+        Handler para set_handler de ObserveFaceRecognise
+        """
+        if not mensaje.isSuccess:
+            return
+        self.registrar([{"id": c.id, "name": c.name} for c in mensaje.faceInfos])
+
+    def registrar(self, caras: list, instante: float = None):
+        instante = time.monotonic() if instante is None else instante
+        for cara in caras:
+            self.reconocimientos += 1
+            clave = DESCONOCIDO if cara["name"] == DESCONOCIDO else cara["id"]
+            presencia = self.presentes.get(clave)
+            if presencia is None:
+                presencia = {"id": clave, "nombre": cara["name"], "desde": instante, "vista": instante,
+                             "reconocimientos": 0}
+                self.presentes[clave] = presencia
+                self._emitir(LLEGADA, presencia, instante)
+            presencia["vista"] = instante
+            presencia["reconocimientos"] += 1
+        self.barrer(instante)
+
+    def barrer(self, instante: float = None):
+        """
+        Da por ido a quien lleve ventana_s sin reconocerse
+        """
+        instante = time.monotonic() if instante is None else instante
+        for clave, presencia in list(self.presentes.items()):
+            if instante - presencia["vista"] > self.ventana_s:
+                del self.presentes[clave]
+                self._emitir(SALIDA, presencia, instante)
+
+    def _emitir(self, tipo: str, presencia: dict, instante: float):
+        evento = {"tipo": tipo, "id": presencia["id"], "nombre": presencia["nombre"], "instante": instante}
+        if tipo == SALIDA:
+            evento["duracion_s"] = presencia["vista"] - presencia["desde"]
+            evento["reconocimientos"] = presencia["reconocimientos"]
+        self.eventos.append(evento)
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            loop = None
+        if loop is None:
+            if self.al_evento is not None:
+                self.al_evento(evento)
+            return
+        tarea = loop.create_task(self._entregar(evento))
+        self._tareas.add(tarea)
+        tarea.add_done_callback(self._tareas.discard)
+
+    async def _entregar(self, evento: dict):
+        # Completa la cara con el índice (género, edad) sin bloquear el handler del SDK
+        if self.indice is not None and evento["id"] != DESCONOCIDO:
+            evento["cara"] = await self.indice.por_id(evento["id"])
+        if self.al_evento is None:
+            return
+        try:
+            resultado = self.al_evento(evento)
+            if inspect.isawaitable(resultado):
+                await resultado
+        except Exception as e:
+            print(f"Error en el manejador de caras: {e}")
+
+    async def _barrer_periodicamente(self):
+        while True:
+            await asyncio.sleep(self.intervalo_barrido)
+            self.barrer()
+
+    def iniciar(self, observador=None):
+        """
+        Arranca el observador de reconocimiento de caras (ObserveFaceRecognise si no se pasa otro)
+        """
+        if observador is None:
+            from mini.apis.api_observe import ObserveFaceRecognise
+            observador = ObserveFaceRecognise()
+        self._observador = observador
+        observador.set_handler(self.manejador)
+        observador.start()
+        self._tarea_barrido = asyncio.create_task(self._barrer_periodicamente())
+
+    async def detener(self):
+        if self._observador is not None:
+            self._observador.stop()
+            self._observador = None
+        if self._tarea_barrido:
+            self._tarea_barrido.cancel()
+            self._tarea_barrido = None
+        if self._tareas:
+            await asyncio.gather(*self._tareas, return_exceptions=True)
+
+    def metricas(self) -> dict:
+        return {
+            "reconocimientos": self.reconocimientos,
+            "llegadas": sum(e["tipo"] == LLEGADA for e in self.eventos),
+            "salidas": sum(e["tipo"] == SALIDA for e in self.eventos),
+            "presentes": [p["nombre"] for p in self.presentes.values()],
+        }
+
+
+def escena_sintetica(segundos: float = 60, frecuencia: float = 5, semilla: int = 1) -> list:
+    """
+    (instante, caras) de una cámara a frecuencia Hz: tres personas entran y salen del
+    plano y el reconocimiento falla en algunos fotogramas (caras vacío)
+    """
+    import random
+    rng = random.Random(semilla)
+    visitas = [({"id": 1, "name": "Ana"}, 2, 20), ({"id": 2, "name": "Luis"}, 10, 35),
+               ({"id": 1, "name": "Ana"}, 40, 55), ({"id": -1, "name": DESCONOCIDO}, 25, 30)]
+    escena = []
+    for i in range(int(segundos * frecuencia)):
+        instante = i / frecuencia
+        escena.append((instante, [cara for cara, desde, hasta in visitas
+                                  if desde <= instante < hasta and rng.random() > 0.3]))
+    return escena
+
+
+async def _benchmark(latencia_consulta: float):
+    escena = escena_sintetica()
+    saludos = sum(len(caras) for _, caras in escena)
+    print(f"Como demo_face_recognize: {saludos} saludos por TTS y {saludos} GetRegisterFaces")
+
+    async def consultar():
+        await asyncio.sleep(latencia_consulta)
+        return [{"id": 1, "name": "Ana", "gender": 0, "age": 30}, {"id": 2, "name": "Luis", "gender": 1, "age": 40}]
+
+    indice = IndiceCaras(consultar)
+    saludados = []
+    rastreador = RastreadorCaras(lambda e: saludados.append(e) if e["tipo"] == LLEGADA else None, indice=indice)
+    inicio = time.perf_counter()
+    for instante, caras in escena:
+        # Sin caras el SDK no avisa: ahí solo actúa el barrido periódico
+        if caras:
+            rastreador.registrar(caras, instante)
+        else:
+            rastreador.barrer(instante)
+    rastreador.barrer(escena[-1][0] + rastreador.ventana_s + 1)
+    await rastreador.detener()
+    duracion = time.perf_counter() - inicio
+    print(f"Rastreador: {rastreador.metricas()} en {duracion * 1000:.0f} ms")
+    for evento in rastreador.eventos:
+        extra = f" ({evento['duracion_s']:.1f}s, {evento['reconocimientos']} reconocimientos)" \
+            if evento["tipo"] == SALIDA else ""
+        print(f"  {evento['instante']:5.1f}s {evento['tipo']:7} {evento['nombre']}{extra}")
+    busquedas = sum(e["id"] != DESCONOCIDO for e in rastreador.eventos)
+    print(f"Saludos: {len(saludados)}; GetRegisterFaces: {indice.consultas} para {busquedas} búsquedas en el índice")
+
+
+def benchmark(latencia_consulta: float = 0.3):
+    asyncio.run(_benchmark(latencia_consulta))
+
+
+if __name__ == '__main__':
+    benchmark()
@@ -0,0 +1,238 @@
+import asyncio
+import time
+
+from mini.dns.dns_browser import WiFiDevice, WiFiDeviceListener
+
+# Tipos de cambio que reciben los suscriptores: (tipo, WiFiDevice)
+ENCONTRADO = "encontrado"
+ACTUALIZADO = "actualizado"
+ELIMINADO = "eliminado"
+CADUCADO = "caducado"
+
+
+def _navegador_sdk():
+    from mini.dns.dns_browser import browser
+    return browser()
+
+
+class RegistroDispositivos(WiFiDeviceListener):
+    """
+    Tabla en memoria de los robots vivos en la red, alimentada por el navegador mDNS del SDK
+
+    El escaneo no se para nunca (start_scan(0)) y se reinicia cada intervalo_reescaneo
+    segundos: zeroconf solo avisa de altas y bajas, y al reiniciar vuelven a llegar
+    todos los robots presentes, lo que sirve para refrescar su "visto". Un robot que
+    no se ve en ttl segundos se da por caducado.
+
+    get_device_by_name y get_device_list tienen la misma firma que las de MiniSdk pero
+    responden desde memoria. Los cambios se publican en las colas de suscribir().
+
+    Mientras el registro está en marcha no se debe llamar a MiniSdk.get_device_by_name:
+    el navegador del SDK es único y ese escaneo lo para al terminar.
+    """
+
+    def __init__(self, ttl: float = 90, intervalo_reescaneo: float = 30, navegador=None):
+        self.ttl = ttl
+        self.intervalo_reescaneo = intervalo_reescaneo
+        self._navegador = navegador
+        self._loop = None
+        self._tarea = None
+        # nombre -> (WiFiDevice, visto) y dirección -> nombre
+        self._dispositivos = {}
+        self._por_direccion = {}
+        self._suscriptores = set()
+        self.cambios = 0
+
+    # Callbacks del navegador: llegan desde el hilo de zeroconf
+
+    def on_device_found(self, device: WiFiDevice) -> None:
+        self._loop.call_soon_threadsafe(self._actualizar, ENCONTRADO, device)
+
+    def on_device_updated(self, device: WiFiDevice) -> None:
+        self._loop.call_soon_threadsafe(self._actualizar, ACTUALIZADO, device)
+
+    def on_device_removed(self, device: WiFiDevice) -> None:
+        self._loop.call_soon_threadsafe(self._actualizar, ELIMINADO, device)
+
+    # Estado (solo se toca desde el loop)
+
+    def _actualizar(self, tipo: str, device: WiFiDevice):
+        previo = self._dispositivos.get(device.name)
+        if tipo == ELIMINADO:
+            if previo is None:
+                return
+            self._quitar(device.name)
+        else:
+            if previo is not None:
+                self._por_direccion.pop(previo[0].address, None)
+                # Un reinicio del escaneo vuelve a "encontrar" los robots que ya teníamos
+                cambiado = (previo[0].address, previo[0].port) != (device.address, device.port)
+                tipo = ACTUALIZADO if cambiado else None
+            self._dispositivos[device.name] = (device, time.monotonic())
+            self._por_direccion[device.address] = device.name
+            if tipo is None:
+                return
+        self._notificar(tipo, device)
+
+    def _quitar(self, nombre: str):
+        device, _ = self._dispositivos.pop(nombre)
+        if self._por_direccion.get(device.address) == nombre:
+            del self._por_direccion[device.address]
+        return device
+
+    def _notificar(self, tipo: str, device: WiFiDevice):
+        self.cambios += 1
+        for cola in self._suscriptores:
+            if cola.full():
+                # Un suscriptor lento pierde los cambios más antiguos, nunca frena al registro
+                cola.get_nowait()
+            cola.put_nowait((tipo, device))
+
+    def _purgar(self):
+        limite = time.monotonic() - self.ttl
+        for nombre in [n for n, (_, visto) in self._dispositivos.items() if visto < limite]:
+            self._notificar(CADUCADO, self._quitar(nombre))
+
+    async def _mantener(self):
+        loop = asyncio.get_running_loop()
+        ultimo_escaneo = time.monotonic()
+        while True:
+            await asyncio.sleep(min(self.ttl, self.intervalo_reescaneo) / 3)
+            self._purgar()
+            if time.monotonic() - ultimo_escaneo >= self.intervalo_reescaneo:
+                await loop.run_in_executor(None, self._navegador.start_scan, 0)
+                ultimo_escaneo = time.monotonic()
+
+    # API
+
+    async def iniciar(self):
+        self._loop = asyncio.get_running_loop()
+        if self._navegador is None:
+            self._navegador = _navegador_sdk()
+        self._navegador.add_listener(self)
+        # Crear el socket de zeroconf bloquea un momento: en un hilo
+        await self._loop.run_in_executor(None, self._navegador.start_scan, 0)
+        self._tarea = asyncio.create_task(self._mantener())
+
+    async def detener(self):
+        if self._tarea:
+            self._tarea.cancel()
+            try:
+                await self._tarea
+            except asyncio.CancelledError:
+                pass
+            self._tarea = None
+        self._navegador.remove_listener(self)
+        await asyncio.get_running_loop().run_in_executor(None, self._navegador.stop_scan)
+
+    async def __aenter__(self):
+        await self.iniciar()
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.detener()
+
+    def buscar(self, sufijo: str):
+        """
+        Robot vivo cuyo nombre termina en sufijo (como el SDK), o None. No espera.
+        """
+        for nombre, (device, _) in self._dispositivos.items():
+            if nombre.endswith(sufijo):
+                return device
+        return None
+
+    def por_direccion(self, direccion: str):
+        nombre = self._por_direccion.get(direccion)
+        return self._dispositivos[nombre][0] if nombre else None
+
+    def dispositivos(self) -> tuple:
+        return tuple(device for device, _ in self._dispositivos.values())
+
+    async def get_device_by_name(self, name: str, timeout: int = 0):
+        """
+        Como MiniSdk.get_device_by_name: inmediato si el robot ya está en la tabla,
+        si no espera hasta timeout segundos a que aparezca
+        """
+        device = self.buscar(name)
+        if device is not None or not timeout:
+            return device
+        cola = self.suscribir()
+        try:
+            async def esperar():
+                while True:
+                    tipo, device = await cola.get()
+                    if tipo in (ENCONTRADO, ACTUALIZADO) and device.name.endswith(name):
+                        return device
+            return await asyncio.wait_for(esperar(), timeout)
+        except asyncio.TimeoutError:
+            return None
+        finally:
+            self.cancelar_suscripcion(cola)
+
+    async def get_device_list(self, timeout: int = 0) -> tuple:
+        """
+        Como MiniSdk.get_device_list, pero sin esperar el timeout si ya hay robots
+        """
+        if not self._dispositivos and timeout:
+            await self.get_device_by_name("", timeout)
+        return self.dispositivos()
+
+    def suscribir(self, max_cambios: int = 100) -> asyncio.Queue:
+        """
+        Cola que recibe (tipo, WiFiDevice) con cada alta, cambio, baja o caducidad
+        """
+        cola = asyncio.Queue(maxsize=max_cambios)
+        self._suscriptores.add(cola)
+        return cola
+
+    def cancelar_suscripcion(self, cola: asyncio.Queue):
+        self._suscriptores.discard(cola)
+
+
+_registro = None
+
+
+def obtener_registro() -> RegistroDispositivos:
+    global _registro
+    if _registro is None:
+        _registro = RegistroDispositivos()
+    return _registro
+
+
+async def _benchmark(robots: int, busquedas: int):
+    from fakes import NavegadorFalso
+
+    navegador = NavegadorFalso(latencia_descubrimiento=0.5)
+    for i in range(robots):
+        navegador.agregar(f"Mini_AA{20000 + i}", f"10.0.0.{i + 10}")
+
+    async with RegistroDispositivos(ttl=2, intervalo_reescaneo=0.6, navegador=navegador) as registro:
+        cambios = registro.suscribir()
+
+        inicio = time.perf_counter()
+        primero = await registro.get_device_by_name("20000", 10)
+        print(f"Primer robot descubierto en {(time.perf_counter() - inicio) * 1000:.0f} ms: {primero.name}")
+
+        inicio = time.perf_counter()
+        for i in range(busquedas):
+            await registro.get_device_by_name(f"{20000 + i % robots}")
+        duracion = time.perf_counter() - inicio
+        print(f"{busquedas} búsquedas desde memoria: {duracion / busquedas * 1e6:.1f} µs de media "
+              f"(el SDK escanea hasta 10 s por búsqueda)")
+
+        # Un robot se apaga sin despedirse: caduca tras ttl segundos
+        navegador.quitar(f"Mini_AA{20000 + robots - 1}", avisar=False)
+        await asyncio.sleep(3)
+        eventos = []
+        while not cambios.empty():
+            eventos.append(cambios.get_nowait())
+        print(f"Robots vivos: {len(registro.dispositivos())}/{robots}, "
+              f"cambios: {[(t, d.name) for t, d in eventos if t != ENCONTRADO]}")
+
+
+def benchmark(robots: int = 5, busquedas: int = 10000):
+    asyncio.run(_benchmark(robots, busquedas))
+
+
+if __name__ == '__main__':
+    benchmark()
@@ -0,0 +1,273 @@
+import hashlib
+import re
+import secrets
+import threading
+import time
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit
+
+RUTA_AUDIO = "/audio/"
+PATRON_RUTA_AUDIO = re.compile(r"^/audio/([A-Za-z0-9_-]+)\.([a-z0-9]+)$")
+PATRON_RANGO = re.compile(r"^bytes=(\d*)-(\d*)$")
+# Tipo MIME de cada extensión que puede tener un audio del almacén
+TIPOS_AUDIO = {"mp3": "audio/mpeg", "wav": "audio/wav"}
+
+
+class AlmacenAudio:
+    """
+    Audios sintetizados en memoria bajo claves aleatorias de corta duración
+
+    Sustituye a guardar el mp3 en el directorio de trabajo y servir ese directorio:
+    solo se puede pedir un audio conociendo su clave y las claves caducan solas.
+    Cada audio guarda su extensión (ver TIPOS_AUDIO), que es la que debe llevar su URL.
+    """
+
+    def __init__(self, ttl: float = 300, extension: str = "mp3"):
+        self.ttl = ttl
+        self.extension = extension
+        self._audios = {}
+        self._lock = threading.Lock()
+
+    def guardar(self, audio: bytes, ttl: float = None, extension: str = None) -> str:
+        extension = extension or self.extension
+        if extension not in TIPOS_AUDIO:
+            raise ValueError(f"Extensión de audio no soportada: {extension}")
+        clave = secrets.token_urlsafe(16)
+        etag = '"' + hashlib.sha1(audio).hexdigest() + '"'
+        with self._lock:
+            self._purgar()
+            self._audios[clave] = (audio, etag, extension, time.monotonic() + (ttl or self.ttl))
+        return clave
+
+    def obtener(self, clave: str):
+        """
+        Devuelve (audio, etag, extension) o None si no existe o ha caducado
+        """
+        with self._lock:
+            entrada = self._audios.get(clave)
+            if entrada is None:
+                return None
+            audio, etag, extension, expira = entrada
+            if expira < time.monotonic():
+                del self._audios[clave]
+                return None
+            return audio, etag, extension
+
+    def eliminar(self, clave: str):
+        with self._lock:
+            self._audios.pop(clave, None)
+
+    def __len__(self):
+        return len(self._audios)
+
+    def _purgar(self):
+        ahora = time.monotonic()
+        for clave in [c for c, (_, _, _, expira) in self._audios.items() if expira < ahora]:
+            del self._audios[clave]
+
+
+def url_audio(host: str, puerto: int, clave: str, extension: str = "mp3") -> str:
+    return f"http://{host}:{puerto}{RUTA_AUDIO}{clave}.{extension}"
+
+
+def clave_de_url(url: str) -> str:
+    return url.rsplit("/", 1)[-1].split(".", 1)[0]
+
+
+def _rango(cabecera: str, tamano: int):
+    """
+    Interpreta una cabecera Range de un solo intervalo: (inicio, fin) inclusivo,
+    None si no hay cabecera o no se entiende, o False si no es satisfacible
+    """
+    coincidencia = PATRON_RANGO.match(cabecera.strip()) if cabecera else None
+    if not coincidencia or coincidencia.groups() == ("", ""):
+        return None
+    inicio, fin = coincidencia.groups()
+    if inicio == "":
+        # bytes=-N: los últimos N bytes
+        n = int(fin)
+        if n == 0:
+            return False
+        return max(tamano - n, 0), tamano - 1
+    inicio = int(inicio)
+    fin = min(int(fin), tamano - 1) if fin else tamano - 1
+    if inicio >= tamano or fin < inicio:
+        return False
+    return inicio, fin
+
+
+class ServidorAudioHTTP(ThreadingHTTPServer):
+    """
+    Servidor HTTP con un hilo por conexión para los audios del almacén
+
+    Guarda un registro de cada petición (tiempos incluidos) en self.registro.
+    """
+    daemon_threads = True
+
+    def __init__(self, direccion, almacen: AlmacenAudio, mostrar_log: bool = False, max_registro: int = 1000):
+        super().__init__(direccion, ManejadorAudio)
+        self.almacen = almacen
+        self.mostrar_log = mostrar_log
+        self.registro = deque(maxlen=max_registro)
+
+    def registrar(self, entrada: dict):
+        self.registro.append(entrada)
+        if self.mostrar_log:
+            print(f"[HTTP] {entrada['cliente']} {entrada['metodo']} {entrada['clave']} {entrada['estado']} "
+                  f"{entrada['bytes']} B {entrada['duracion_s'] * 1000:.1f} ms")
+
+    def tiempos_clave(self, clave: str) -> list:
+        """
+        Peticiones registradas para un audio (p.ej. para medir la descarga del robot)
+        """
+        return [e for e in list(self.registro) if e["clave"] == clave]
+
+
+class ManejadorAudio(BaseHTTPRequestHandler):
+    """
+    Sirve únicamente los audios del almacén del servidor (self.server.almacen)
+
+    HTTP/1.1 con conexiones persistentes, peticiones Range de un intervalo y GET
+    condicional con ETag (If-None-Match).
+    """
+    protocol_version = "HTTP/1.1"
+    # Cierra las conexiones inactivas para no acumular hilos
+    timeout = 30
+
+    def _responder(self, con_cuerpo: bool):
+        inicio = time.perf_counter()
+        coincidencia = PATRON_RUTA_AUDIO.match(urlsplit(self.path).path)
+        clave = coincidencia.group(1) if coincidencia else None
+        entrada = self.server.almacen.obtener(clave) if clave else None
+        enviados = 0
+
+        # La extensión de la URL tiene que ser la del audio guardado
+        if entrada is None or entrada[2] != coincidencia.group(2):
+            estado = 404
+            self.send_error(estado)
+        else:
+            audio, etag, extension = entrada
+            rango = _rango(self.headers.get("Range"), len(audio))
+            if etag in (self.headers.get("If-None-Match") or ""):
+                estado = 304
+                self.send_response(estado)
+                self.send_header("ETag", etag)
+                self.end_headers()
+            elif rango is False:
+                estado = 416
+                self.send_response(estado)
+                self.send_header("Content-Range", f"bytes */{len(audio)}")
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+            else:
+                inicio_rango, fin_rango = rango or (0, len(audio) - 1)
+                cuerpo = memoryview(audio)[inicio_rango:fin_rango + 1]
+                estado = 206 if rango else 200
+                self.send_response(estado)
+                self.send_header("Content-Type", TIPOS_AUDIO[extension])
+                self.send_header("Content-Length", str(len(cuerpo)))
+                self.send_header("Accept-Ranges", "bytes")
+                self.send_header("ETag", etag)
+                self.send_header("Cache-Control", "private, max-age=60")
+                if rango:
+                    self.send_header("Content-Range", f"bytes {inicio_rango}-{fin_rango}/{len(audio)}")
+                self.end_headers()
+                if con_cuerpo:
+                    self.wfile.write(cuerpo)
+                    enviados = len(cuerpo)
+
+        self.server.registrar({
+            "cliente": self.client_address[0],
+            "metodo": self.command,
+            "clave": clave,
+            "estado": estado,
+            "bytes": enviados,
+            "inicio": time.time(),
+            "duracion_s": time.perf_counter() - inicio,
+        })
+
+    def do_GET(self):
+        self._responder(True)
+
+    def do_HEAD(self):
+        self._responder(False)
+
+    def log_message(self, format, *args):
+        # Silenciar mensajes de log del servidor (los tiempos quedan en server.registro)
+        pass
+
+
+def benchmark(clientes: int = 8, peticiones: int = 50, tamano: int = 64 * 1024):
+    """
+    Carga local: varios clientes (robots) descargando audios a la vez mientras un
+    cliente lento tarda un segundo en mandar su petición
+    """
+    import http.client
+    import socket
+    from http.server import HTTPServer, SimpleHTTPRequestHandler
+    from trazas import percentil
+
+    class ManejadorAntiguo(SimpleHTTPRequestHandler):
+        # Equivalente al servidor anterior: un solo hilo, HTTP/1.0, sin rangos
+        def do_GET(self):
+            entrada = self.server.almacen.obtener(self.path.rsplit("/", 1)[-1][:-4])
+            self.send_response(200)
+            self.send_header("Content-Length", str(len(entrada[0])))
+            self.end_headers()
+            self.wfile.write(entrada[0])
+
+        def log_message(self, format, *args):
+            pass
+
+    def medir(nombre, servidor, persistente):
+        servidor.almacen = almacen
+        threading.Thread(target=servidor.serve_forever, daemon=True).start()
+        puerto = servidor.server_address[1]
+
+        def cliente_lento():
+            with socket.create_connection(("127.0.0.1", puerto)) as s:
+                s.sendall(b"GET /audio/")
+                time.sleep(1.0)
+                s.sendall(f"{claves[0]}.mp3 HTTP/1.0\r\n\r\n".encode())
+                s.recv(1024)
+
+        latencias = []
+
+        def cliente(i):
+            conexion = http.client.HTTPConnection("127.0.0.1", puerto, timeout=10)
+            for j in range(peticiones):
+                if not persistente:
+                    conexion = http.client.HTTPConnection("127.0.0.1", puerto, timeout=10)
+                inicio = time.perf_counter()
+                conexion.request("GET", f"/audio/{claves[(i + j) % len(claves)]}.mp3")
+                conexion.getresponse().read()
+                latencias.append(time.perf_counter() - inicio)
+            conexion.close()
+
+        lento = threading.Thread(target=cliente_lento)
+        lento.start()
+        time.sleep(0.05)
+        hilos = [threading.Thread(target=cliente, args=(i,)) for i in range(clientes)]
+        inicio = time.perf_counter()
+        for h in hilos:
+            h.start()
+        for h in hilos:
+            h.join()
+        total = time.perf_counter() - inicio
+        lento.join()
+        servidor.shutdown()
+        servidor.server_close()
+
+        latencias.sort()
+        print(f"{nombre}: {len(latencias) / total:.0f} peticiones/s, p50 {percentil(latencias, 50) * 1000:.1f} ms, "
+              f"p95 {percentil(latencias, 95) * 1000:.1f} ms, máx {latencias[-1] * 1000:.1f} ms")
+
+    almacen = AlmacenAudio()
+    claves = [almacen.guardar(secrets.token_bytes(tamano)) for _ in range(8)]
+    medir("HTTPServer de un hilo", HTTPServer(("127.0.0.1", 0), ManejadorAntiguo), False)
+    medir("ServidorAudioHTTP", ServidorAudioHTTP(("127.0.0.1", 0), almacen), True)
+
+
+if __name__ == '__main__':
+    benchmark()
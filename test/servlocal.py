@@ -1,15 +1,25 @@
 import asyncio
+import contextlib
+import functools
 import os
 import threading
 import time
 import uuid
-from http.server import SimpleHTTPRequestHandler, HTTPServer
-from gtts import gTTS
 import google.generativeai as genai
 import mini.mini_sdk as MiniSdk
-from mini.apis.api_sound import PlayAudio
-from mini import AudioStorageType, MiniApiResultType
 from dotenv import load_dotenv
+from gemini_pool import obtener_pool
+from cache_respuestas import obtener_cache_respuestas
+from tts_streaming import PipelineTTS
+from tts_cache import obtener_cache
+from servidor_audio import AlmacenAudio, ServidorAudioHTTP, url_audio, clave_de_url
+from codificador_audio import obtener_codificador
+from ejecutor_async import ejecutar, leer_entrada, obtener_ejecutor, MonitorLag, TIMEOUT_GEMINI, TIMEOUT_TTS
+from trazas import Trazador, TURNO_NULO
+from comandos_robot import play_audio, stop_all_audio, TIMEOUT_REPRODUCCION
+from supervisor_conexion import SupervisorConexion, ConexionMiniSdk
+from chat_voz import ChatVoz
+from interrupcion import ControladorInterrupcion
 
 # Cargar variables de entorno desde keys.env
 load_dotenv("keys.env")
@@ -24,16 +34,14 @@ SERVER_HOST = "0.0.0.0"
 server_thread = None
 http_server = None
 local_ip = None
-
-
-# Handler clase HTTP
-class AudioHandler(SimpleHTTPRequestHandler):
-    def __init__(self, *args, **kwargs):
-        super().__init__(*args, directory=os.getcwd(), **kwargs)
-
-    def log_message(self, format, *args):
-        # Silenciar mensajes de log del servidor
-        pass
+supervisor = None  # Conexión con el robot vigilada (latido y reconexión automática)
+interrupcion = None  # Barge-in: hablar o tocarle la cabeza corta la respuesta (modo voz)
+MODO_STREAMING = True  # Hablar la respuesta por frases mientras Gemini sigue generando
+MODO_VOZ = False  # Hablarle al robot (ObserveSpeechRecognise) en lugar de escribir los mensajes
+# Audios servidos al robot desde memoria (no se escribe ni se expone ningún directorio)
+almacen_audio = AlmacenAudio()
+# Tiempos de cada etapa por turno (python trazas.py para ver los percentiles)
+trazador = Trazador()
 
 
 def ObtenerRespuestaChatbot(mensaje: str) -> str:
@@ -41,17 +49,9 @@ def ObtenerRespuestaChatbot(mensaje: str) -> str:
     Obtiene una respuesta del chatbot
     """
     try:
-        # Configurar modelo
-        model = genai.GenerativeModel('gemini-2.0-flash')
-
-        # Crear chat
-        chat = model.start_chat(history=[])
-
-        # Obtener respuesta
-        response = chat.send_message(mensaje)
-
-        # Extraer texto de la respuesta
-        return response.text
+        # Las preguntas repetidas se responden desde la caché sin llamar a Gemini
+        return obtener_cache_respuestas().obtener_o_calcular(
+            mensaje, lambda: obtener_pool().enviar(mensaje).text)
 
     except Exception as e:
         print(f"Error al comunicarse con Gemini: {e}")
@@ -82,7 +82,8 @@ def StartHTTPServer():
     global http_server, server_thread
 
     try:
-        http_server = HTTPServer((SERVER_HOST, SERVER_PORT), AudioHandler)
+        # Un hilo por conexión, HTTP/1.1 persistente, Range y ETag
+        http_server = ServidorAudioHTTP((SERVER_HOST, SERVER_PORT), almacen_audio)
         server_thread = threading.Thread(target=http_server.serve_forever)
         server_thread.daemon = True
         server_thread.start()
@@ -101,107 +102,221 @@ def StopHTTPServer():
         print("Servidor HTTP detenido")
 
 
-async def GenerarReproducirTTS(texto: str):
+async def GenerarReproducirTTS(texto: str, turno=TURNO_NULO):
     """
-    Genera archivo de audio TTS y lo manda al robot usando servidor local
+    Genera audio TTS y lo manda al robot usando servidor local
     """
     try:
-        timestamp = int(time.time())
-        audio_filename = f"respuesta_{timestamp}.mp3"
+        # Convertir texto a audio (si ya estaba en caché no se vuelve a sintetizar)
+        with turno.etapa("tts"):
+            audio = await ejecutar(SintetizarCacheado, texto, timeout=TIMEOUT_TTS)
 
-        # Convertir texto a audio
-        tts = gTTS(text=texto, lang='es')
-        tts.save(audio_filename)
+        # Recodificar, publicar el audio en memoria y construir URL usando la IP local
+        with turno.etapa("publicacion"):
+            audio_url = await ejecutar(PublicarAudio, audio, timeout=TIMEOUT_TTS)
+        print(f"URL del audio: {audio_url}")
 
-        # Verificar si el archivo existe
-        if not os.path.exists(audio_filename):
-            raise FileNotFoundError(f"El archivo no fue generado en la ruta: {audio_filename}")
-        print(f"Archivo de audio generado exitosamente: {audio_filename}")
+        try:
+            # Reproducir el audio en el robot
+            with turno.etapa("play_audio"):
+                await ReproducirURL(audio_url)
+        finally:
+            LiberarAudio(audio_url, turno)
 
-        # Construir URL usando la IP local
-        global local_ip
-        audio_url = f"http://{local_ip}:{SERVER_PORT}/{audio_filename}"
-        print(f"URL del audio: {audio_url}")
+    except Exception as e:
+        print(f"Error durante la generación o reproducción de TTS: {e}")
 
-        # Reproducir el audio en el robot
-        for intento in range(1, 4):
-            print(f"Intento {intento} de reproducir audio...")
-
-            # Reproducir el archivo de audio en el robot
-            block = PlayAudio(
-                url=audio_url,
-                storage_type=AudioStorageType.NET_PUBLIC,
-                volume=1.0
-            )
-            result_type, response = await block.execute()
-
-            if result_type == MiniApiResultType.Success and response.isSuccess:
-                print("Audio reproducido exitosamente")
-                break
-            else:
-                print(f"Error al reproducir audio: {response.resultCode}")
-                if intento < 3:
-                    print("Reintentando en 2 segundos...")
-                    await asyncio.sleep(2)
 
-        # Eliminar el archivo después de reproducirlo
-        os.remove(audio_filename)
+async def ReproducirURL(audio_url: str) -> bool:
+    """
+    Reproduce en el robot el audio servido en la URL, con reintentos
+    """
+    for intento in range(1, 4):
+        print(f"Intento {intento} de reproducir audio...")
+
+        # Reproducir el archivo de audio en el robot. Si la conexión cae a mitad,
+        # el supervisor reconecta y vuelve a mandar el PlayAudio
+        try:
+            exito, detalle = await supervisor.ejecutar(play_audio(audio_url), idempotente=True,
+                                                       timeout=TIMEOUT_REPRODUCCION)
+        except Exception as e:
+            exito, detalle = False, str(e)
+
+        if exito:
+            print("Audio reproducido exitosamente")
+            return True
+        else:
+            print(f"Error al reproducir audio: {detalle}")
+            if intento < 3:
+                print("Reintentando en 2 segundos...")
+                await asyncio.sleep(2)
+    return False
+
+
+def SintetizarCacheado(texto: str) -> bytes:
+    """
+    Devuelve el audio desde la caché TTS compartida, sintetizándolo si falta
+    """
+    _, audio = obtener_cache().obtener_o_sintetizar(texto)
+    return audio
+
 
+def PublicarAudio(audio: bytes, indice: int = 0) -> str:
+    """
+    Recodifica el audio para el robot, lo guarda en el almacén en memoria y devuelve su URL
+    (bloqueante: la caché TTS se queda con el original)
+    """
+    audio, extension = obtener_codificador().codificar(audio)
+    clave = almacen_audio.guardar(audio, extension=extension)
+    return url_audio(local_ip, SERVER_PORT, clave, extension)
+
+
+def LiberarAudio(audio_url: str, turno=TURNO_NULO):
+    """
+    Retira del almacén un audio ya reproducido, anotando en el turno lo que tardó
+    el robot en descargarlo según el registro del servidor
+    """
+    clave = clave_de_url(audio_url)
+    if http_server:
+        for peticion in http_server.tiempos_clave(clave):
+            turno.registrar("descarga_robot", peticion["duracion_s"])
+    almacen_audio.eliminar(clave)
+
+
+async def GenerarReproducirSecuencial(mensaje: str, turno=TURNO_NULO):
+    """
+    Pide la respuesta completa a Gemini y después la sintetiza y la reproduce
+    """
+    # Respuesta del chatbot (en un hilo: el loop del robot sigue atendido)
+    try:
+        with turno.etapa("gemini"):
+            respuesta = await ejecutar(ObtenerRespuestaChatbot, mensaje, timeout=TIMEOUT_GEMINI)
+    except asyncio.TimeoutError:
+        print("Gemini no respondió a tiempo")
+        turno.atributos["error"] = "timeout_gemini"
+        return
+    print(f"Respuesta de Gemini: {respuesta}")
+
+    # Generar y reproducir TTS
+    await GenerarReproducirTTS(respuesta, turno)
+
+
+async def GenerarReproducirStreaming(mensaje: str, turno=TURNO_NULO):
+    """
+    Pide la respuesta a Gemini en streaming y la reproduce frase a frase:
+    mientras suena la primera frase se genera y sintetiza la siguiente.
+    Si hay control de interrupciones, el usuario puede cortarla a mitad
+    """
+    pipeline = PipelineTTS(SintetizarCacheado, PublicarAudio, ReproducirURL,
+                           functools.partial(LiberarAudio, turno=turno),
+                           ejecutor=obtener_ejecutor(), timeout_sintesis=TIMEOUT_TTS,
+                           timeout_generacion=TIMEOUT_GEMINI)
+    cache = obtener_cache_respuestas()
+    try:
+        # Una pregunta repetida se habla directamente desde la caché de respuestas
+        respuesta = cache.obtener(mensaje)
+        with interrupcion.vigilar(pipeline) if interrupcion else contextlib.nullcontext():
+            if respuesta is not None:
+                metricas = await pipeline.hablar(lambda: [respuesta], turno)
+            else:
+                metricas = await pipeline.hablar(lambda: obtener_pool().enviar(mensaje, stream=True), turno)
+        if metricas.get("interrumpido"):
+            # Una respuesta cortada no se guarda en la caché: estaría incompleta
+            turno.atributos["interrumpido"] = True
+            print(f"Respuesta interrumpida tras {metricas['frases']} frases")
+            return
+        if respuesta is None and metricas["texto"].strip():
+            # Un stream vacío (p.ej. bloqueado) no se guarda: se repetiría el silencio todo el TTL
+            cache.guardar(mensaje, metricas["texto"], metricas["generacion_s"])
+        print(f"Respuesta de Gemini: {metricas['texto']}")
+        print(f"Tiempo hasta el primer audio: {metricas.get('primer_audio_s', 0):.2f}s "
+              f"({metricas['frases']} frases, total {metricas['total_s']:.2f}s)")
     except Exception as e:
-        print(f"Error durante la generación o reproducción de TTS: {e}")
+        print(f"Error durante la respuesta en streaming: {e}")
+        await GenerarReproducirTTS("Ha ocurrido un error al procesar tu mensaje.", turno)
+
+
+async def DetenerAudio() -> bool:
+    """
+    StopAllAudio para cortar la respuesta cuando el usuario interrumpe
+    """
+    exito, detalle = await supervisor.ejecutar(stop_all_audio(), idempotente=True, timeout=5)
+    if not exito:
+        print(f"StopAllAudio falló: {detalle}")
+    return exito
+
+
+async def ResponderVoz(mensaje: str):
+    """
+    Turno del modo voz: la frase reconocida va directa a Gemini y se contesta en streaming
+    """
+    with trazador.turno("http_local", streaming=True, entrada="voz") as turno:
+        await GenerarReproducirStreaming(mensaje, turno)
 
 
 async def _run():
     try:
-        global local_ip
+        global local_ip, supervisor, interrupcion
         local_ip = GetIPLocal()
         print(f"IP local: {local_ip}")
 
         # Iniciar servidor HTTP
         StartHTTPServer()
 
+        # Buscar el robot, conectar y entrar en modo programa; si la WiFi se cae durante
+        # la sesión, el supervisor lo detecta por el latido y repite todo esto solo
         print("Buscando el robot...")
-        device = await MiniSdk.get_device_by_name("20256", 10)
-        if device:
-            print("Robot encontrado, conectando...")
-            is_connected = await MiniSdk.connect(device)
-            if not is_connected:
-                print("No se pudo conectar al robot")
-                StopHTTPServer()
-                return
-
-            print("Entrando en modo programa...")
-            success = await MiniSdk.enter_program()
-            if not success:
-                print("No se pudo entrar en modo programa")
-                StopHTTPServer()
-                return
+        supervisor = SupervisorConexion(ConexionMiniSdk("20256", 10))
+        if await supervisor.iniciar():
+            print("Robot conectado y en modo programa")
 
             # # Prueba de audio
             # print("Realizando prueba de audio...")
             # await GenerarReproducirTTS(
             #     "Prueba de audio. Si escuchas este mensaje, la configuración está funcionando correctamente.")
 
+            # Crear el modelo antes del primer mensaje
+            await ejecutar(obtener_pool().calentar)
+
+            # Medir el retraso del loop durante la sesión
+            monitor_lag = MonitorLag()
+            monitor_lag.iniciar()
+
             print("Iniciando interacción con Gemini...")
-            while True:
-                mensaje = input("Escribe un mensaje para Gemini (o 'salir' para terminar): ")
+            if MODO_VOZ:
+                print("Habla con el robot (di 'salir' para terminar)")
+                interrupcion = ControladorInterrupcion(DetenerAudio)
+                # La voz la escucha ChatVoz y se la pasa; la cabeza la vigila el controlador
+                interrupcion.iniciar(observar_voz=False)
+                chat_voz = ChatVoz(ResponderVoz, interrupcion=interrupcion)
+                await chat_voz.ejecutar()
+                await interrupcion.detener()
+                print(f"Conversación por voz: {chat_voz.metricas()}")
+                print(f"Interrupciones: {interrupcion.metricas()}")
+            while not MODO_VOZ:
+                inicio_entrada = time.perf_counter()
+                mensaje = await leer_entrada("Escribe un mensaje para Gemini (o 'salir' para terminar): ")
                 if mensaje.lower() == 'salir':
                     break
 
-                # Respuesta del chatbot
-                respuesta = ObtenerRespuestaChatbot(mensaje)
-                print(f"Respuesta de Gemini: {respuesta}")
+                with trazador.turno("http_local", streaming=MODO_STREAMING) as turno:
+                    turno.registrar("entrada", time.perf_counter() - inicio_entrada)
 
-                # Generar y reproducir TTS
-                await GenerarReproducirTTS(respuesta)
+                    if MODO_STREAMING:
+                        # Respuesta hablada por frases según llega
+                        await GenerarReproducirStreaming(mensaje, turno)
+                    else:
+                        await GenerarReproducirSecuencial(mensaje, turno)
 
-            print("Saliendo del modo programa...")
-            await MiniSdk.quit_program()
+            print(f"Caché de respuestas: {obtener_cache_respuestas().estadisticas()}")
+            await monitor_lag.detener()
+            print(f"Retraso del loop: {monitor_lag.informe()}")
 
-            print("Liberando recursos...")
-            await MiniSdk.release()
+            print(f"Conexión: {supervisor.metricas()}")
+            print("Saliendo del modo programa y liberando recursos...")
+            await supervisor.detener()
         else:
-            print("No se encontró el robot")
+            print("No se pudo conectar con el robot")
 
         # Detener el servidor HTTP
         StopHTTPServer()
@@ -0,0 +1,280 @@
+import asyncio
+import random
+import time
+
+from comandos_robot import ConexionSdk, Comando
+
+# Estados de la conexión supervisada
+DESCONECTADO = "desconectado"
+CONECTANDO = "conectando"
+CONECTADO = "conectado"
+
+
+class ConexionPerdida(Exception):
+    """
+    Se perdió la conexión con el robot durante un comando que no se puede repetir
+    """
+
+
+class ConexionMiniSdk(ConexionSdk):
+    """
+    Conexión con el robot por MiniSdk en este proceso, con latido y reconexión
+
+    Cada conectar() vuelve a buscar el robot (caché de dispositivos y, si falla, escaneo),
+    por si ha cambiado de IP al volver a la WiFi.
+    """
+
+    def __init__(self, sufijo: str, timeout_busqueda: int = 10):
+        super().__init__({})
+        self.sufijo = sufijo
+        self.timeout_busqueda = timeout_busqueda
+
+    async def conectar(self) -> bool:
+        import mini.mini_sdk as MiniSdk
+        from cache_dispositivos import obtener_cache_dispositivos
+        dispositivo = await obtener_cache_dispositivos().buscar(self.sufijo, self.timeout_busqueda)
+        if dispositivo is None:
+            return False
+        return await MiniSdk.connect(dispositivo)
+
+    async def latido(self) -> bool:
+        # Leer el infrarrojo no mueve ni hace hablar al robot
+        from mini.apis.api_sence import GetInfraredDistance
+        from mini import MiniApiResultType
+        result_type, _ = await GetInfraredDistance().execute()
+        return result_type == MiniApiResultType.Success
+
+    async def ejecutar(self, comando: Comando):
+        exito, detalle = await super().ejecutar(comando)
+        if detalle.startswith("Timeout"):
+            # El SDK devuelve Timeout también cuando el mensaje no se pudo enviar
+            raise ConnectionError(f"Sin respuesta del robot a {comando!r}")
+        return exito, detalle
+
+    async def soltar(self):
+        """
+        Libera el websocket roto para poder abrir uno nuevo
+        """
+        import mini.mini_sdk as MiniSdk
+        await MiniSdk.release()
+
+
+class SupervisorConexion:
+    """
+    Mantiene viva la conexión con un robot: latido, reconexión y reanudación
+
+    Cada intervalo_latido segundos se hace un latido con timeout_latido; tras
+    fallos_para_caer fallos seguidos (o cuando un comando falla y el latido también)
+    la conexión se da por caída y se reconecta con backoff exponencial con jitter,
+    volviendo a entrar en modo programa. Los comandos marcados como idempotentes que
+    estaban en curso se repiten al recuperar la conexión; los demás lanzan ConexionPerdida.
+    """
+
+    def __init__(self, conexion, intervalo_latido: float = 2.0, timeout_latido: float = 1.5,
+                 fallos_para_caer: int = 2, backoff_inicial: float = 0.5, backoff_max: float = 10.0,
+                 max_reintentos_comando: int = 3):
+        self.conexion = conexion
+        self.intervalo_latido = intervalo_latido
+        self.timeout_latido = timeout_latido
+        self.fallos_para_caer = fallos_para_caer
+        self.backoff_inicial = backoff_inicial
+        self.backoff_max = backoff_max
+        self.max_reintentos_comando = max_reintentos_comando
+        self.estado = DESCONECTADO
+        # Cada reconexión incrementa la generación: así se sabe si un fallo es de la conexión actual
+        self.generacion = 0
+        self.recuperaciones = []
+        self.repetidos = 0
+        self._conectado = asyncio.Event()
+        self._tarea_latido = None
+        self._tarea_recuperacion = None
+        self._ultimo_latido_ok = time.monotonic()
+
+    async def _abrir(self) -> bool:
+        return await self.conexion.conectar() and await self.conexion.entrar_programa()
+
+    async def _conectar_con_reintentos(self, max_intentos: int = None) -> bool:
+        self.estado = CONECTANDO
+        espera = self.backoff_inicial
+        intento = 0
+        while max_intentos is None or intento < max_intentos:
+            intento += 1
+            try:
+                if await self._abrir():
+                    self.generacion += 1
+                    self.estado = CONECTADO
+                    self._ultimo_latido_ok = time.monotonic()
+                    self._conectado.set()
+                    return True
+            except Exception as e:
+                print(f"Error al conectar con el robot (intento {intento}): {e}")
+            try:
+                await self.conexion.soltar()
+            except Exception:
+                pass
+            # Jitter completo: varios robots (o procesos) no reintentan todos a la vez
+            await asyncio.sleep(random.uniform(0, espera))
+            espera = min(espera * 2, self.backoff_max)
+        self.estado = DESCONECTADO
+        return False
+
+    async def iniciar(self, max_intentos: int = 3) -> bool:
+        """
+        Conecta y entra en modo programa; después el latido corre en segundo plano
+        """
+        if not await self._conectar_con_reintentos(max_intentos):
+            return False
+        self._tarea_latido = asyncio.create_task(self._latir())
+        return True
+
+    async def detener(self):
+        for tarea in (self._tarea_latido, self._tarea_recuperacion):
+            if tarea:
+                tarea.cancel()
+                try:
+                    await tarea
+                except asyncio.CancelledError:
+                    pass
+        self._tarea_latido = self._tarea_recuperacion = None
+        if self.estado == CONECTADO:
+            try:
+                await self.conexion.cerrar()
+            except Exception as e:
+                print(f"Error al cerrar la conexión: {e}")
+        self.estado = DESCONECTADO
+        self._conectado.clear()
+
+    async def _latido_ok(self) -> bool:
+        try:
+            ok = await asyncio.wait_for(self.conexion.latido(), self.timeout_latido)
+        except (Exception, asyncio.TimeoutError):
+            ok = False
+        if ok:
+            self._ultimo_latido_ok = time.monotonic()
+        return ok
+
+    async def _latir(self):
+        fallos = 0
+        while True:
+            await asyncio.sleep(self.intervalo_latido)
+            if self.estado != CONECTADO:
+                continue
+            if await self._latido_ok():
+                fallos = 0
+                continue
+            fallos += 1
+            if fallos >= self.fallos_para_caer:
+                fallos = 0
+                self._caida(self.generacion)
+
+    def _caida(self, generacion: int):
+        """
+        Marca la conexión de esa generación como caída y lanza la recuperación (una sola vez)
+        """
+        if generacion != self.generacion or self.estado != CONECTADO:
+            return
+        print("Conexión con el robot perdida, reconectando...")
+        self.estado = CONECTANDO
+        self._conectado.clear()
+        self._tarea_recuperacion = asyncio.create_task(self._recuperar())
+
+    async def _recuperar(self):
+        inicio = time.monotonic()
+        sin_latido = inicio - self._ultimo_latido_ok
+        try:
+            await self.conexion.soltar()
+        except Exception:
+            pass
+        await self._conectar_con_reintentos()
+        duracion = time.monotonic() - inicio
+        self.recuperaciones.append({"deteccion_s": sin_latido, "recuperacion_s": duracion})
+        print(f"Robot reconectado en {duracion:.2f}s (caída detectada tras {sin_latido:.2f}s sin latido)")
+
+    async def esperar_conexion(self, timeout: float = None) -> bool:
+        try:
+            await asyncio.wait_for(self._conectado.wait(), timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+
+    async def ejecutar(self, comando: Comando, idempotente: bool = False, timeout: float = 15):
+        """
+        Ejecuta un bloque en el robot esperando a que haya conexión
+
+        Si la conexión cae durante el comando, se repite tras reconectar cuando es
+        idempotente (hasta max_reintentos_comando veces); si no, lanza ConexionPerdida.
+        """
+        intentos = 0
+        while True:
+            await self._conectado.wait()
+            generacion = self.generacion
+            try:
+                return await asyncio.wait_for(self.conexion.ejecutar(comando), timeout)
+            except (Exception, asyncio.TimeoutError) as e:
+                # Un fallo del comando solo es una caída si el robot tampoco responde al latido
+                if self.generacion == generacion and self.estado == CONECTADO and not await self._latido_ok():
+                    self._caida(generacion)
+                if self.estado == CONECTADO and self.generacion == generacion:
+                    raise
+                intentos += 1
+                if not idempotente or intentos > self.max_reintentos_comando:
+                    raise ConexionPerdida(f"{comando!r} interrumpido por la caída de la conexión") from e
+                self.repetidos += 1
+
+    def metricas(self) -> dict:
+        recuperaciones = [r["recuperacion_s"] for r in self.recuperaciones]
+        return {
+            "estado": self.estado,
+            "reconexiones": len(self.recuperaciones),
+            "recuperacion_media_s": round(sum(recuperaciones) / len(recuperaciones), 3) if recuperaciones else 0.0,
+            "recuperacion_max_s": round(max(recuperaciones), 3) if recuperaciones else 0.0,
+            "comandos_repetidos": self.repetidos,
+        }
+
+
+async def _benchmark(caidas: int, duracion_caida: float):
+    from fakes import ConexionRobotFalso, ServidorRobotFalso
+    from comandos_robot import play_action
+
+    robot = await ServidorRobotFalso("Mini_AA20256", latencia_comando=0.2, latencia_conexion=0.05,
+                                     latencia_programa=0.1).iniciar()
+    conexion = ConexionRobotFalso({"address": "127.0.0.1", "port": robot.puerto})
+    supervisor = SupervisorConexion(conexion, intervalo_latido=0.2, timeout_latido=0.2,
+                                    backoff_inicial=0.1, backoff_max=1.0)
+    await supervisor.iniciar()
+
+    completados = 0
+    perdidos = 0
+
+    async def trabajo():
+        nonlocal completados, perdidos
+        while True:
+            # Los gestos se pueden repetir sin problema; una frase a medias también
+            try:
+                await supervisor.ejecutar(play_action("018"), idempotente=True)
+                completados += 1
+            except ConexionPerdida:
+                perdidos += 1
+
+    tarea = asyncio.create_task(trabajo())
+    for _ in range(caidas):
+        await asyncio.sleep(1.0)
+        inicio = time.monotonic()
+        await robot.caer(duracion_caida)
+        await supervisor.esperar_conexion()
+        print(f"Caída de {duracion_caida:.1f}s -> servicio restablecido a los {time.monotonic() - inicio:.2f}s")
+    await asyncio.sleep(0.5)
+    tarea.cancel()
+
+    print(f"Comandos completados: {completados}, perdidos: {perdidos}")
+    print(f"Supervisor: {supervisor.metricas()}")
+    await supervisor.detener()
+    await robot.detener()
+
+
+def benchmark(caidas: int = 3, duracion_caida: float = 1.0):
+    asyncio.run(_benchmark(caidas, duracion_caida))
+
+
+if __name__ == '__main__':
+    benchmark()
@@ -0,0 +1,142 @@
+import json
+import math
+import sys
+import threading
+import time
+import uuid
+from collections import defaultdict
+from contextlib import contextmanager, nullcontext
+
+RUTA_TRAZAS = "trazas.jsonl"
+PERCENTILES = (50, 95, 99)
+
+
+class Turno:
+    """
+    Tramos (etapas) de un turno de chat: entrada, gemini, tts, publicación, descarga, reproducción...
+
+    Se puede usar desde hilos (las etapas del pipeline se ejecutan en el pool).
+    """
+
+    def __init__(self, backend: str, **atributos):
+        self.id = uuid.uuid4().hex[:12]
+        self.backend = backend
+        self.atributos = atributos
+        self.inicio = time.time()
+        self._origen = time.perf_counter()
+        self.etapas = []
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def etapa(self, nombre: str):
+        inicio = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.registrar(nombre, time.perf_counter() - inicio, inicio - self._origen)
+
+    def registrar(self, nombre: str, duracion: float, desplazamiento: float = None):
+        if desplazamiento is None:
+            desplazamiento = time.perf_counter() - self._origen - duracion
+        with self._lock:
+            self.etapas.append({"etapa": nombre, "inicio_s": round(desplazamiento, 6), "duracion_s": round(duracion, 6)})
+
+    def a_dict(self) -> dict:
+        return {
+            "turno": self.id,
+            "backend": self.backend,
+            "inicio": self.inicio,
+            "duracion_s": round(time.perf_counter() - self._origen, 6),
+            "etapas": self.etapas,
+            **self.atributos,
+        }
+
+
+class _TurnoNulo:
+    """
+    Turno que no registra nada, para llamadas fuera de un turno (p.ej. la prueba de audio)
+    """
+
+    @property
+    def atributos(self) -> dict:
+        # Un diccionario nuevo cada vez: lo que se escriba se tira
+        return {}
+
+    def etapa(self, nombre: str):
+        return nullcontext()
+
+    def registrar(self, nombre: str, duracion: float, desplazamiento: float = None):
+        pass
+
+
+TURNO_NULO = _TurnoNulo()
+
+
+class Trazador:
+    """
+    Escribe un JSON por turno en un archivo JSONL
+    """
+
+    def __init__(self, ruta: str = RUTA_TRAZAS):
+        self.ruta = ruta
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def turno(self, backend: str, **atributos):
+        turno = Turno(backend, **atributos)
+        try:
+            yield turno
+        except BaseException as e:
+            turno.atributos["error"] = repr(e)
+            raise
+        finally:
+            linea = json.dumps(turno.a_dict(), ensure_ascii=False)
+            with self._lock, open(self.ruta, "a", encoding="utf-8") as f:
+                f.write(linea + "\n")
+
+
+def percentil(valores: list, p: float) -> float:
+    """
+    Percentil por rango más cercano sobre una lista ya ordenada
+    """
+    if not valores:
+        return 0.0
+    indice = max(math.ceil(p / 100 * len(valores)) - 1, 0)
+    return valores[min(indice, len(valores) - 1)]
+
+
+def informe(ruta: str = RUTA_TRAZAS) -> dict:
+    """
+    Agrupa las duraciones por backend y etapa: {backend: {etapa: [duraciones ordenadas]}}
+
+    La etapa "turno" es la duración total de cada turno.
+    """
+    datos = defaultdict(lambda: defaultdict(list))
+    with open(ruta, encoding="utf-8") as f:
+        for linea in f:
+            if not linea.strip():
+                continue
+            turno = json.loads(linea)
+            backend = turno.get("backend", "?")
+            datos[backend]["turno"].append(turno["duracion_s"])
+            for etapa in turno["etapas"]:
+                datos[backend][etapa["etapa"]].append(etapa["duracion_s"])
+    for etapas in datos.values():
+        for duraciones in etapas.values():
+            duraciones.sort()
+    return datos
+
+
+def imprimir_informe(ruta: str = RUTA_TRAZAS):
+    datos = informe(ruta)
+    cabecera = f"{'etapa':<18}{'n':>6}" + "".join(f"{'p' + str(p) + ' ms':>12}" for p in PERCENTILES)
+    for backend, etapas in sorted(datos.items()):
+        print(f"\n== {backend} ({len(etapas['turno'])} turnos)")
+        print(cabecera)
+        for etapa, duraciones in sorted(etapas.items(), key=lambda e: -percentil(e[1], 50)):
+            columnas = "".join(f"{percentil(duraciones, p) * 1000:>12.1f}" for p in PERCENTILES)
+            print(f"{etapa:<18}{len(duraciones):>6}{columnas}")
+
+
+if __name__ == '__main__':
+    imprimir_informe(sys.argv[1] if len(sys.argv) > 1 else RUTA_TRAZAS)
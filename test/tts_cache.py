@@ -0,0 +1,168 @@
+import hashlib
+import io
+import os
+import threading
+from collections import OrderedDict
+
+DIRECTORIO_CACHE = "cache_tts"
+
+
+def sintetizar_gtts(texto: str, idioma: str = 'es') -> bytes:
+    """
+    Convierte texto a mp3 con gTTS, en memoria
+    """
+    from gtts import gTTS
+    buffer = io.BytesIO()
+    gTTS(text=texto, lang=idioma).write_to_fp(buffer)
+    return buffer.getvalue()
+
+
+class CacheTTS:
+    """
+    Caché de audios TTS direccionada por contenido, en memoria y en disco
+
+    La clave es el hash de (texto, idioma, motor, voz). Cada nivel tiene su límite de
+    bytes y expulsa primero el audio usado hace más tiempo (LRU). En disco cada audio
+    es un archivo <clave>.mp3 dentro de directorio, que se puede servir tal cual.
+    """
+
+    def __init__(self, directorio: str = DIRECTORIO_CACHE, max_bytes_disco: int = 200 * 1024 * 1024,
+                 max_bytes_memoria: int = 16 * 1024 * 1024, sintetizar=sintetizar_gtts):
+        self.directorio = directorio
+        self.sintetizar = sintetizar
+        self.max_bytes_disco = max_bytes_disco
+        self.max_bytes_memoria = max_bytes_memoria
+        self._memoria = OrderedDict()
+        self._bytes_memoria = 0
+        self._disco = OrderedDict()
+        self._bytes_disco = 0
+        self._lock = threading.Lock()
+        self.aciertos_memoria = 0
+        self.aciertos_disco = 0
+        self.fallos = 0
+
+        os.makedirs(directorio, exist_ok=True)
+        # Reconstruir el orden LRU del disco a partir de la fecha de modificación
+        archivos = []
+        for nombre in os.listdir(directorio):
+            if nombre.endswith(".mp3"):
+                ruta = os.path.join(directorio, nombre)
+                archivos.append((os.path.getmtime(ruta), nombre[:-4], os.path.getsize(ruta)))
+        for _, clave, tamano in sorted(archivos):
+            self._disco[clave] = tamano
+            self._bytes_disco += tamano
+
+    @staticmethod
+    def clave(texto: str, idioma: str = 'es', motor: str = 'gtts', voz: str = '') -> str:
+        contenido = "\x1f".join((motor, voz, idioma, texto))
+        return hashlib.sha256(contenido.encode("utf-8")).hexdigest()
+
+    def ruta(self, clave: str) -> str:
+        return os.path.join(self.directorio, f"{clave}.mp3")
+
+    def obtener(self, clave: str):
+        """
+        Devuelve el audio guardado o None
+        """
+        with self._lock:
+            audio = self._memoria.get(clave)
+            if audio is not None:
+                self._memoria.move_to_end(clave)
+                self._tocar_disco(clave)
+                self.aciertos_memoria += 1
+                return audio
+
+            if clave in self._disco:
+                try:
+                    with open(self.ruta(clave), "rb") as f:
+                        audio = f.read()
+                except OSError:
+                    self._quitar_disco(clave)
+                else:
+                    self._tocar_disco(clave)
+                    self._guardar_memoria(clave, audio)
+                    self.aciertos_disco += 1
+                    return audio
+
+            self.fallos += 1
+            return None
+
+    def guardar(self, clave: str, audio: bytes):
+        with self._lock:
+            self._guardar_memoria(clave, audio)
+            if clave not in self._disco:
+                temporal = f"{self.ruta(clave)}.tmp"
+                with open(temporal, "wb") as f:
+                    f.write(audio)
+                os.replace(temporal, self.ruta(clave))
+                self._disco[clave] = len(audio)
+                self._bytes_disco += len(audio)
+                self._expulsar_disco()
+
+    def obtener_o_sintetizar(self, texto: str, sintetizar=None, idioma: str = 'es', motor: str = 'gtts',
+                             voz: str = ''):
+        """
+        Devuelve (clave, audio), sintetizando solo si el audio no estaba en caché
+        """
+        clave = self.clave(texto, idioma, motor, voz)
+        audio = self.obtener(clave)
+        if audio is None:
+            audio = (sintetizar or self.sintetizar)(texto, idioma)
+            self.guardar(clave, audio)
+        return clave, audio
+
+    def estadisticas(self) -> dict:
+        consultas = self.aciertos_memoria + self.aciertos_disco + self.fallos
+        return {
+            "aciertos_memoria": self.aciertos_memoria,
+            "aciertos_disco": self.aciertos_disco,
+            "fallos": self.fallos,
+            "tasa_aciertos": (consultas - self.fallos) / consultas if consultas else 0.0,
+            "bytes_memoria": self._bytes_memoria,
+            "bytes_disco": self._bytes_disco,
+        }
+
+    def _guardar_memoria(self, clave: str, audio: bytes):
+        if len(audio) > self.max_bytes_memoria:
+            return
+        anterior = self._memoria.pop(clave, None)
+        if anterior is not None:
+            self._bytes_memoria -= len(anterior)
+        self._memoria[clave] = audio
+        self._bytes_memoria += len(audio)
+        while self._bytes_memoria > self.max_bytes_memoria:
+            _, expulsado = self._memoria.popitem(last=False)
+            self._bytes_memoria -= len(expulsado)
+
+    def _tocar_disco(self, clave: str):
+        if clave in self._disco:
+            self._disco.move_to_end(clave)
+            try:
+                os.utime(self.ruta(clave))
+            except OSError:
+                pass
+
+    def _quitar_disco(self, clave: str):
+        self._bytes_disco -= self._disco.pop(clave, 0)
+
+    def _expulsar_disco(self):
+        while self._bytes_disco > self.max_bytes_disco and len(self._disco) > 1:
+            clave = next(iter(self._disco))
+            self._quitar_disco(clave)
+            try:
+                os.remove(self.ruta(clave))
+            except OSError:
+                pass
+
+
+_cache = None
+
+
+def obtener_cache() -> CacheTTS:
+    """
+    Caché compartida por los scripts de chat
+    """
+    global _cache
+    if _cache is None:
+        _cache = CacheTTS()
+    return _cache
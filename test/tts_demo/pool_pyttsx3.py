@@ -0,0 +1,202 @@
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+# trazas.py está en el directorio de encima (test/), con los demás scripts
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from trazas import percentil
+
+# Voz por defecto: la primera cuyo id o nombre contenga esto (si no hay ninguna, la primera)
+VOZ = "spanish"
+
+# Estado de cada proceso del pool: un motor ya iniciado con la voz elegida
+_motor = None
+
+
+def crear_motor_pyttsx3(voz: str = VOZ, velocidad: int = None):
+    """
+    pyttsx3.init() con la voz y la velocidad ya puestas (lo caro: se hace una vez por proceso)
+    """
+    import pyttsx3
+    motor = pyttsx3.init()
+    voces = motor.getProperty('voices')
+    elegida = next((v for v in voces if voz and (voz.lower() in v.id.lower() or voz.lower() in (v.name or "").lower())),
+                   voces[0] if voces else None)
+    if elegida is not None:
+        motor.setProperty('voice', elegida.id)
+    if velocidad:
+        motor.setProperty('rate', velocidad)
+    return motor
+
+
+def _guardar(motor, texto: str) -> bytes:
+    # pyttsx3 solo sabe escribir a fichero: se usa uno temporal y se devuelven los bytes (WAV)
+    descriptor, ruta = tempfile.mkstemp(suffix=".wav")
+    os.close(descriptor)
+    try:
+        motor.save_to_file(texto, ruta)
+        motor.runAndWait()
+        with open(ruta, "rb") as f:
+            return f.read()
+    finally:
+        os.remove(ruta)
+
+
+def _iniciar_trabajador(crear_motor, voz: str, velocidad: int):
+    global _motor
+    _motor = crear_motor(voz, velocidad)
+
+
+def _sintetizar_en_trabajador(texto: str) -> bytes:
+    return _guardar(_motor, texto)
+
+
+def _preparado() -> int:
+    return os.getpid()
+
+
+def sintetizar_por_llamada(texto: str, crear_motor=crear_motor_pyttsx3, voz: str = VOZ) -> bytes:
+    """
+    Como generate_audio_with_pyttsx3 antes del pool: motor nuevo en cada llamada
+    """
+    return _guardar(crear_motor(voz, None), texto)
+
+
+class PoolPyttsx3:
+    """
+    Procesos con un motor de pyttsx3 ya iniciado cada uno, para sintetizar sin internet
+
+    pyttsx3.init(), la búsqueda de la voz y el arranque del motor se pagan una vez por
+    proceso y no en cada frase; varias frases se sintetizan a la vez en procesos
+    distintos (runAndWait bloquea el suyo). sintetizar(texto) -> bytes WAV es bloqueante,
+    así que vale como sintetizar de PipelineTTS.
+    """
+
+    def __init__(self, procesos: int = 2, voz: str = VOZ, velocidad: int = None, crear_motor=crear_motor_pyttsx3):
+        self.procesos = procesos
+        self._ejecutor = ProcessPoolExecutor(
+            max_workers=procesos, mp_context=multiprocessing.get_context("spawn"),
+            initializer=_iniciar_trabajador, initargs=(crear_motor, voz, velocidad))
+        # Métricas
+        self.frases = 0
+        self.latencias = []
+
+    def calentar(self):
+        """
+        Arranca todos los procesos (y sus motores) antes de la primera frase
+        """
+        futuros = [self._ejecutor.submit(_preparado) for _ in range(self.procesos)]
+        return {f.result() for f in futuros}
+
+    def enviar(self, texto: str):
+        """
+        Encola la frase y devuelve el futuro con sus bytes
+        """
+        inicio = time.perf_counter()
+        futuro = self._ejecutor.submit(_sintetizar_en_trabajador, texto)
+
+        def medir(f):
+            if f.exception() is None:
+                self.frases += 1
+                self.latencias.append(time.perf_counter() - inicio)
+        futuro.add_done_callback(medir)
+        return futuro
+
+    def sintetizar(self, texto: str) -> bytes:
+        return self.enviar(texto).result()
+
+    def sintetizar_varias(self, textos: list) -> list:
+        futuros = [self.enviar(texto) for texto in textos]
+        return [f.result() for f in futuros]
+
+    def cerrar(self):
+        self._ejecutor.shutdown(wait=True, cancel_futures=True)
+
+    def metricas(self) -> dict:
+        latencias = sorted(self.latencias)
+        return {
+            "procesos": self.procesos,
+            "frases": self.frases,
+            "latencia_p50_s": round(percentil(latencias, 50), 3),
+            "latencia_max_s": round(latencias[-1], 3) if latencias else 0.0,
+        }
+
+
+_pool = None
+
+
+def obtener_pool_pyttsx3() -> PoolPyttsx3:
+    global _pool
+    if _pool is None:
+        _pool = PoolPyttsx3()
+    return _pool
+
+
+class _MotorSimulado:
+    """
+    Motor con los tiempos de pyttsx3 para medir el pool donde no hay voces instaladas
+    """
+    ARRANQUE_S = 0.4
+    SEGUNDOS_POR_CARACTER = 0.004
+
+    def __init__(self):
+        time.sleep(self.ARRANQUE_S)
+        self._pendiente = None
+
+    def save_to_file(self, texto, ruta):
+        self._pendiente = (texto, ruta)
+
+    def runAndWait(self):
+        texto, ruta = self._pendiente
+        time.sleep(len(texto) * self.SEGUNDOS_POR_CARACTER)
+        with open(ruta, "wb") as f:
+            f.write(b"RIFF" + bytes(len(texto) * 100))
+
+
+def crear_motor_simulado(voz: str = VOZ, velocidad: int = None):
+    return _MotorSimulado()
+
+
+def benchmark(frases: int = 12, procesos: int = 3):
+    textos = [f"Frase número {i}: hola, soy AlphaMini y hablo sin conexión a internet." for i in range(frases)]
+    crear_motor = crear_motor_pyttsx3
+    try:
+        crear_motor_pyttsx3()
+    except Exception as e:
+        print(f"pyttsx3 no disponible aquí ({e!r}): se usa un motor simulado "
+              f"(arranque {_MotorSimulado.ARRANQUE_S}s, {_MotorSimulado.SEGUNDOS_POR_CARACTER * 1000:.0f} ms por carácter)")
+        crear_motor = crear_motor_simulado
+
+    latencias = []
+    inicio = time.perf_counter()
+    for texto in textos:
+        inicio_frase = time.perf_counter()
+        sintetizar_por_llamada(texto, crear_motor)
+        latencias.append(time.perf_counter() - inicio_frase)
+    duracion = time.perf_counter() - inicio
+    print(f"Motor nuevo en cada llamada: {frases / duracion:.2f} frases/s, "
+          f"latencia p50 {percentil(sorted(latencias), 50):.3f}s")
+
+    for n in (1, procesos):
+        pool = PoolPyttsx3(procesos=n, crear_motor=crear_motor)
+        inicio = time.perf_counter()
+        pool.calentar()
+        arranque = time.perf_counter() - inicio
+        # Una a una (latencia de una frase suelta)
+        for texto in textos[:4]:
+            pool.sintetizar(texto)
+        sueltas = pool.metricas()["latencia_p50_s"]
+        pool.latencias.clear()
+        inicio = time.perf_counter()
+        audios = pool.sintetizar_varias(textos)
+        duracion = time.perf_counter() - inicio
+        print(f"Pool de {n} procesos (arranque {arranque:.2f}s, una vez): {frases / duracion:.2f} frases/s, "
+              f"frase suelta {sueltas:.3f}s, {pool.metricas()}, {sum(map(len, audios)) // 1024} KiB")
+        pool.cerrar()
+
+
+if __name__ == '__main__':
+    benchmark()
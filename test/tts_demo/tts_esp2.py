@@ -14,7 +14,7 @@ from mini.mini_sdk import (
 )
 from mini.apis.api_sound import PlayAudio
 from mini import AudioStorageType, MiniApiResultType
-import pyttsx3  # Biblioteca de TTS
+from pool_pyttsx3 import obtener_pool_pyttsx3  # Motores de pyttsx3 ya iniciados
 
 # Función para generar el archivo de audio usando pyttsx3
 def generate_audio_with_pyttsx3(text: str, output_file: str):
@@ -24,14 +24,12 @@ def generate_audio_with_pyttsx3(text: str, output_file: str):
         text (str): Texto a convertir en audio.
         output_file (str): Ruta del archivo de salida.
     """
-    engine = pyttsx3.init()
-
-    voices = engine.getProperty('voices')
-    engine.setProperty('voice', voices[0].id)  # Selecciona la primera voz disponible
+    # El motor y la voz ya están listos en los procesos del pool
+    audio = obtener_pool_pyttsx3().sintetizar(text)
 
     # Guardar el archivo de audio
-    engine.save_to_file(text, output_file)
-    engine.runAndWait()
+    with open(output_file, "wb") as f:
+        f.write(audio)
 
 # Función para subir el archivo al repositorio de GitHub Pages
 def copy_file_to_github_pages(audio_path: str):
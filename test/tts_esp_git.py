@@ -6,6 +6,7 @@ import git
 import mini.mini_sdk as MiniSdk
 from mini.apis.api_sound import PlayAudio
 from mini import AudioStorageType, MiniApiResultType
+from cache_dispositivos import obtener_cache_dispositivos
 
 
 
@@ -89,7 +90,7 @@ def copiarARepo(audio_path: str):
 async def _run():
     try:
         print("Buscando el robot...")
-        device = await MiniSdk.get_device_by_name("20256", 10)
+        device = await obtener_cache_dispositivos().buscar("20256", 10)
         if device:
             print("Robot encontrado, conectando...")
             is_connected = await MiniSdk.connect(device)
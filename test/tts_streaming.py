@@ -0,0 +1,228 @@
+import asyncio
+import re
+import threading
+import time
+
+from trazas import TURNO_NULO
+
+# Corte de frase: signo de fin seguido de espacio (el texto de Gemini llega por fragmentos)
+PATRON_FIN_FRASE = re.compile(r'(?<=[.!?…;:])\s+')
+
+
+class DivisorFrases:
+    """
+    Acumula fragmentos de texto y devuelve las frases completas según van cerrándose
+    """
+
+    def __init__(self, min_caracteres: int = 20):
+        # Las frases muy cortas se juntan con la siguiente para no pedir audios diminutos
+        self.min_caracteres = min_caracteres
+        self._pendiente = ""
+
+    def alimentar(self, texto: str) -> list:
+        self._pendiente += texto
+        partes = PATRON_FIN_FRASE.split(self._pendiente)
+        self._pendiente = partes.pop()
+
+        frases = []
+        actual = ""
+        for parte in partes:
+            actual = f"{actual} {parte}" if actual else parte
+            if len(actual) >= self.min_caracteres:
+                frases.append(actual.strip())
+                actual = ""
+        if actual:
+            self._pendiente = f"{actual} {self._pendiente}"
+        return frases
+
+    def terminar(self) -> list:
+        resto = self._pendiente.strip()
+        self._pendiente = ""
+        return [resto] if resto else []
+
+
+def _texto_fragmento(fragmento) -> str:
+    if isinstance(fragmento, str):
+        return fragmento
+    try:
+        return fragmento.text
+    except (AttributeError, ValueError):
+        # genai lanza ValueError en fragmentos sin texto (p.ej. bloqueados por seguridad)
+        return ""
+
+
+class PipelineTTS:
+    """
+    Habla una respuesta de Gemini por frases: genera, sintetiza y reproduce solapados
+
+    sintetizar(texto) -> audio y publicar(audio, indice) -> url son bloqueantes y se
+    ejecutan en hilos; reproducir(url) es una corrutina que termina cuando el robot
+    acaba de reproducir; liberar(url) se llama después de reproducir cada frase.
+    Los hilos salen de ejecutor (por defecto el del loop), cada frase tiene
+    timeout_sintesis segundos para estar lista y Gemini timeout_generacion segundos
+    para abrir el stream y para mandar cada fragmento. cancelar() corta la respuesta en curso
+    (para cuando el usuario interrumpe al robot); inicio_reproduccion es el instante
+    (perf_counter) en que empezó a sonar la última frase, o None si aún no ha sonado ninguna.
+    """
+
+    def __init__(self, sintetizar, publicar, reproducir, liberar=None, max_pendientes: int = 3,
+                 min_caracteres: int = 20, ejecutor=None, timeout_sintesis: float = None,
+                 timeout_generacion: float = None):
+        self._sintetizar = sintetizar
+        self._publicar = publicar
+        self._reproducir = reproducir
+        self._liberar = liberar
+        self._max_pendientes = max_pendientes
+        self._min_caracteres = min_caracteres
+        self._ejecutor = ejecutor
+        self._timeout_sintesis = timeout_sintesis
+        self._timeout_generacion = timeout_generacion
+        self._cancelacion = threading.Event()
+        self._tareas = ()
+        self.inicio_reproduccion = None
+
+    def _preparar_audio(self, texto: str, indice: int, turno, cancelacion: threading.Event):
+        # En un hilo no se puede parar la síntesis a medias, pero sí no publicar lo que ya no va a sonar
+        if cancelacion.is_set():
+            return None
+        with turno.etapa("tts"):
+            audio = self._sintetizar(texto)
+        if cancelacion.is_set():
+            return None
+        with turno.etapa("publicacion"):
+            url = self._publicar(audio, indice)
+        if cancelacion.is_set() and self._liberar:
+            self._liberar(url)
+            return None
+        return url
+
+    def cancelar(self) -> bool:
+        """
+        Interrumpe la respuesta en curso: deja de reproducir y descarta las frases
+        pendientes y las síntesis en marcha. Devuelve False si no había nada que cortar.
+        """
+        activas = [t for t in self._tareas if not t.done()]
+        if not activas:
+            return False
+        self._cancelacion.set()
+        for tarea in activas:
+            tarea.cancel()
+        return True
+
+    async def hablar(self, generar, turno=TURNO_NULO) -> dict:
+        """
+        generar() devuelve el iterable de fragmentos (p.ej. send_message(..., stream=True))
+
+        Devuelve las métricas del turno, incluido el tiempo hasta el primer audio. Si se
+        pasa un turno de trazas.Trazador, se registran en él las etapas de cada frase.
+        Si se corta con cancelar(), las métricas llevan interrumpido=True.
+        """
+        loop = asyncio.get_running_loop()
+        inicio = time.perf_counter()
+        metricas = {"frases": 0, "texto": ""}
+        cancelacion = self._cancelacion = threading.Event()
+        self.inicio_reproduccion = None
+        # Cada elemento es la tarea que prepara el audio de una frase, en orden
+        cola_audio = asyncio.Queue(maxsize=self._max_pendientes)
+        tareas_audio = []
+        reproducidas = set()
+
+        def marcar(nombre):
+            metricas.setdefault(nombre, time.perf_counter() - inicio)
+
+        async def productor():
+            divisor = DivisorFrases(self._min_caracteres)
+            fin = object()
+            try:
+                iterador = iter(await asyncio.wait_for(loop.run_in_executor(self._ejecutor, generar),
+                                                       self._timeout_generacion))
+                # Lo que tarda Gemini es hasta el último fragmento recibido, sin las esperas de la cola de audio
+                ultimo_fragmento = time.perf_counter()
+                while True:
+                    fragmento = await asyncio.wait_for(loop.run_in_executor(self._ejecutor, next, iterador, fin),
+                                                       self._timeout_generacion)
+                    if fragmento is fin:
+                        break
+                    ultimo_fragmento = time.perf_counter()
+                    texto = _texto_fragmento(fragmento)
+                    marcar("primer_texto_s")
+                    metricas["texto"] += texto
+                    for frase in divisor.alimentar(texto):
+                        await encolar(frase)
+                metricas["generacion_s"] = ultimo_fragmento - inicio
+                for frase in divisor.terminar():
+                    await encolar(frase)
+            except Exception:
+                # Dejar que el reproductor termine lo ya encolado antes de propagar el error
+                await cola_audio.put(None)
+                raise
+            await cola_audio.put(None)
+
+        async def encolar(frase):
+            indice = metricas["frases"]
+            metricas["frases"] += 1
+            marcar("primera_frase_s")
+            tarea = loop.run_in_executor(self._ejecutor, self._preparar_audio, frase, indice, turno, cancelacion)
+            tareas_audio.append(tarea)
+            await cola_audio.put(tarea)
+
+        async def reproductor():
+            while True:
+                tarea = await cola_audio.get()
+                if tarea is None:
+                    break
+                reproducidas.add(tarea)
+                url = await asyncio.wait_for(tarea, self._timeout_sintesis)
+                if url is None:
+                    continue
+                marcar("primer_audio_s")
+                self.inicio_reproduccion = time.perf_counter()
+                try:
+                    with turno.etapa("play_audio"):
+                        await self._reproducir(url)
+                finally:
+                    if self._liberar:
+                        self._liberar(url)
+
+        def descartar_pendientes():
+            metricas["interrumpido"] = True
+            metricas["frases_descartadas"] = len(tareas_audio) - len(reproducidas)
+            for tarea in tareas_audio:
+                if tarea in reproducidas:
+                    continue
+                if not tarea.done():
+                    tarea.cancel()
+                elif not tarea.cancelled() and tarea.exception() is None and tarea.result() and self._liberar:
+                    self._liberar(tarea.result())
+
+        tarea_productor = asyncio.create_task(productor())
+        tarea_reproductor = asyncio.create_task(reproductor())
+        self._tareas = (tarea_productor, tarea_reproductor)
+        try:
+            await tarea_reproductor
+        except asyncio.CancelledError:
+            tarea_productor.cancel()
+            if not cancelacion.is_set():
+                # Cancelaron a quien llamó a hablar(): no dejar el reproductor suelto
+                tarea_reproductor.cancel()
+                raise
+            descartar_pendientes()
+        except BaseException:
+            tarea_productor.cancel()
+            raise
+        else:
+            try:
+                await tarea_productor
+            except asyncio.CancelledError:
+                if not cancelacion.is_set():
+                    raise
+                descartar_pendientes()
+        finally:
+            self._tareas = ()
+
+        metricas["total_s"] = time.perf_counter() - inicio
+        if "generacion_s" in metricas:
+            turno.registrar("gemini", metricas["generacion_s"], 0.0)
+        if "primer_audio_s" in metricas:
+            turno.registrar("primer_audio", metricas["primer_audio_s"], 0.0)
+        return metricas
@@ -0,0 +1,235 @@
+import asyncio
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+# Clasificador de caras de OpenCV (viene con opencv-contrib-python)
+CASCADA = "haarcascade_frontalface_default.xml"
+
+# Estado de cada proceso del pool: el clasificador se carga una sola vez por proceso
+_clasificador = None
+
+
+def _detectar_lote(imagenes: list, parametros: dict) -> list:
+    """
+    Detecta caras en un lote de imágenes (arrays BGR o bytes JPEG/PNG); se ejecuta en el pool
+    """
+    global _clasificador
+    import cv2
+    if _clasificador is None:
+        _clasificador = cv2.CascadeClassifier(os.path.join(cv2.data.haarcascades, CASCADA))
+    resultados = []
+    for imagen in imagenes:
+        if isinstance(imagen, (bytes, bytearray)):
+            imagen = cv2.imdecode(np.frombuffer(imagen, dtype=np.uint8), cv2.IMREAD_COLOR)
+        if imagen is None:
+            resultados.append(None)
+            continue
+        gris = cv2.cvtColor(imagen, cv2.COLOR_BGR2GRAY) if imagen.ndim == 3 else imagen
+        # Reducir antes de detectar: las caras a 2 m siguen teniendo bastantes píxeles
+        factor = 1.0
+        if gris.shape[1] > parametros["ancho_max"]:
+            factor = gris.shape[1] / parametros["ancho_max"]
+            gris = cv2.resize(gris, (parametros["ancho_max"], int(gris.shape[0] / factor)),
+                              interpolation=cv2.INTER_AREA)
+        gris = cv2.equalizeHist(gris)
+        cajas = _clasificador.detectMultiScale(gris, scaleFactor=parametros["escala"],
+                                               minNeighbors=parametros["vecinos"],
+                                               minSize=parametros["tamano_min"])
+        resultados.append([tuple(int(v * factor) for v in caja) for caja in cajas])
+    return resultados
+
+
+def respuesta_face_detect(cajas):
+    """
+    FaceDetectResponse como la que devuelve FaceDetect en el robot
+    """
+    from mini.pb2.codemao_facedetect_pb2 import FaceDetectResponse
+    respuesta = FaceDetectResponse()
+    respuesta.isSuccess = cajas is not None
+    respuesta.count = len(cajas) if cajas else 0
+    respuesta.resultCode = 0 if cajas is not None else -1
+    return respuesta
+
+
+class MotorVision:
+    """
+    Detección de caras en el ordenador con OpenCV, repartida en un pool de procesos
+
+    Las peticiones sueltas se agrupan: se espera hasta espera_lote_s (o a tener
+    tamano_lote imágenes) y el lote entero va a un proceso, así el coste de pasar las
+    imágenes entre procesos se reparte. Cada proceso carga el clasificador una vez.
+    """
+
+    def __init__(self, procesos: int = None, tamano_lote: int = 8, espera_lote_s: float = 0.01,
+                 escala: float = 1.1, vecinos: int = 5, tamano_min: tuple = (40, 40), ancho_max: int = 640):
+        self.procesos = procesos or max(1, (os.cpu_count() or 2) - 1)
+        self.tamano_lote = tamano_lote
+        self.espera_lote_s = espera_lote_s
+        self.parametros = {"escala": escala, "vecinos": vecinos, "tamano_min": tamano_min, "ancho_max": ancho_max}
+        self._ejecutor = ProcessPoolExecutor(max_workers=self.procesos,
+                                             mp_context=multiprocessing.get_context("spawn"))
+        self._pendientes = []
+        self._temporizador = None
+        # Métricas
+        self.imagenes = 0
+        self.lotes = 0
+
+    async def calentar(self):
+        """
+        Arranca los procesos y carga el clasificador en todos antes de la primera petición
+        """
+        loop = asyncio.get_running_loop()
+        vacia = np.zeros((8, 8), dtype=np.uint8)
+        await asyncio.gather(*(loop.run_in_executor(self._ejecutor, _detectar_lote, [vacia], self.parametros)
+                               for _ in range(self.procesos)))
+
+    def _enviar_lote(self):
+        if self._temporizador is not None:
+            self._temporizador.cancel()
+            self._temporizador = None
+        lote, self._pendientes = self._pendientes, []
+        if not lote:
+            return
+        self.lotes += 1
+        futuro = asyncio.get_running_loop().run_in_executor(
+            self._ejecutor, _detectar_lote, [imagen for imagen, _ in lote], self.parametros)
+
+        def repartir(f):
+            try:
+                resultados = f.result()
+            except Exception as e:
+                for _, pendiente in lote:
+                    if not pendiente.done():
+                        pendiente.set_exception(e)
+                return
+            for (_, pendiente), cajas in zip(lote, resultados):
+                if not pendiente.done():
+                    pendiente.set_result(cajas)
+        futuro.add_done_callback(repartir)
+
+    async def detectar_cajas(self, imagen):
+        """
+        Rectángulos (x, y, ancho, alto) de las caras de la imagen, o None si no se pudo leer
+        """
+        loop = asyncio.get_running_loop()
+        pendiente = loop.create_future()
+        self._pendientes.append((imagen, pendiente))
+        self.imagenes += 1
+        if len(self._pendientes) >= self.tamano_lote:
+            self._enviar_lote()
+        elif self._temporizador is None:
+            self._temporizador = loop.call_later(self.espera_lote_s, self._enviar_lote)
+        return await pendiente
+
+    async def detectar(self, imagen):
+        """
+        Como FaceDetect().execute() pero en el ordenador: devuelve una FaceDetectResponse
+        """
+        return respuesta_face_detect(await self.detectar_cajas(imagen))
+
+    async def detectar_lote(self, imagenes: list) -> list:
+        return await asyncio.gather(*(self.detectar(imagen) for imagen in imagenes))
+
+    def cerrar(self):
+        self._ejecutor.shutdown(wait=True, cancel_futures=True)
+
+
+class FaceDetectHost:
+    """
+    Sustituto de mini.apis.api_sence.FaceDetect que detecta en el ordenador
+
+    execute() devuelve (MiniApiResultType, FaceDetectResponse) igual que el bloque del
+    robot; la imagen la da obtener_imagen() (p.ej. una foto de CapturaFotos).
+    """
+
+    def __init__(self, motor: MotorVision, obtener_imagen, timeout: float = 10):
+        self.motor = motor
+        self.obtener_imagen = obtener_imagen
+        self.timeout = timeout
+
+    async def execute(self):
+        from mini import MiniApiResultType
+        try:
+            imagen = await asyncio.wait_for(self.obtener_imagen(), self.timeout)
+            return MiniApiResultType.Success, await self.motor.detectar(imagen)
+        except asyncio.TimeoutError:
+            return MiniApiResultType.Timeout, None
+        except Exception as e:
+            print(f"Error en la detección de caras: {e}")
+            return MiniApiResultType.Success, respuesta_face_detect(None)
+
+
+def _cargar_imagenes(directorio: str) -> list:
+    extensiones = (".jpg", ".jpeg", ".png", ".bmp")
+    imagenes = []
+    for nombre in sorted(os.listdir(directorio)):
+        if nombre.lower().endswith(extensiones):
+            with open(os.path.join(directorio, nombre), "rb") as f:
+                imagenes.append(f.read())
+    return imagenes
+
+
+async def _benchmark(directorio: str, repeticiones: int):
+    from trazas import percentil
+    if directorio is None:
+        import tempfile
+        from captura_fotos import _fotos_sinteticas
+        directorio = tempfile.mkdtemp(prefix="vision_host_")
+        _fotos_sinteticas(directorio, 16)
+    imagenes = _cargar_imagenes(directorio) * repeticiones
+    print(f"{len(imagenes)} imágenes de {directorio}")
+
+    motor = MotorVision()
+    await motor.calentar()
+
+    # Una a una en este proceso
+    secuencial = []
+    cajas_secuencial = 0
+    parametros = motor.parametros
+    _detectar_lote([np.zeros((8, 8), dtype=np.uint8)], parametros)
+    for imagen in imagenes:
+        inicio = time.perf_counter()
+        cajas_secuencial += len(_detectar_lote([imagen], parametros)[0] or [])
+        secuencial.append(time.perf_counter() - inicio)
+    print(f"Una a una: {len(imagenes) / sum(secuencial):.1f} imágenes/s, "
+          f"{percentil(sorted(secuencial), 50) * 1000:.1f} ms por imagen (p50), {cajas_secuencial} caras")
+
+    # Peticiones sueltas de una en una, como haría FaceDetectHost
+    sueltas = []
+    for imagen in imagenes[:16]:
+        inicio = time.perf_counter()
+        await motor.detectar(imagen)
+        sueltas.append(time.perf_counter() - inicio)
+    print(f"Pool, petición suelta: {percentil(sorted(sueltas), 50) * 1000:.1f} ms por imagen (p50)")
+
+    latencias = []
+
+    async def medir(imagen):
+        inicio = time.perf_counter()
+        respuesta = await motor.detectar(imagen)
+        latencias.append(time.perf_counter() - inicio)
+        return respuesta
+
+    inicio = time.perf_counter()
+    respuestas = await asyncio.gather(*(medir(imagen) for imagen in imagenes))
+    duracion = time.perf_counter() - inicio
+    latencias.sort()
+    print(f"Pool de {motor.procesos} procesos, lotes de {motor.tamano_lote}: {len(imagenes) / duracion:.1f} imágenes/s "
+          f"en {motor.lotes} lotes, latencia p50 en ráfaga {percentil(latencias, 50) * 1000:.0f} ms, "
+          f"{sum(r.count for r in respuestas)} caras")
+    print(f"Respuesta: {type(respuestas[0]).__name__}(count={respuestas[0].count}, "
+          f"isSuccess={respuestas[0].isSuccess})")
+    motor.cerrar()
+
+
+def benchmark(directorio: str = None, repeticiones: int = 4):
+    asyncio.run(_benchmark(directorio, repeticiones))
+
+
+if __name__ == '__main__':
+    import sys
+    benchmark(sys.argv[1] if len(sys.argv) > 1 else None)